@@ -0,0 +1,22 @@
+from typing import Any
+
+import orjson  # 외부 라이브러리
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+def _default(obj: Any) -> Any:
+    # model_construct 로 만든 응답 모델은 검증/덤프 없이 필드 dict 를 그대로 직렬화
+    # (alias / custom serializer 가 없는 단순 응답 모델에만 사용)
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONResponse(Response):
+    """orjson 으로 인코딩하는 JSON 응답 (response_model 재검증을 거치지 않음)"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
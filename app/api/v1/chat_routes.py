@@ -1,17 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Optional
+import json
 
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+
+from app.api.responses import ORJSONResponse
+from app.core.cursor import InvalidCursorError
+from app.core.telemetry import stage
 from app.models.request import SendMessageRequest
 from app.models.response import ChatHistoryResponse, ChatMessageResponse
 from app.services.chat_service import ChatService
-from app.repositories.chat_repository import ChatRepository  # ChatService 초기화용
+from app.services.idempotency_service import IdempotencyConflictError, IdempotencyInProgressError
+from app.services.llm_guard import LLMTimeoutError, LLMUnavailableError
+from app.services.quota_service import QuotaExceededError
 
 router = APIRouter()
 
 
 # 의존성 주입 (Dependency Injection)
-def get_chat_service(repo: ChatRepository = Depends(ChatRepository)) -> ChatService:
-    return ChatService(repo)
+def get_chat_service(request: Request) -> ChatService:
+    # app lifespan 에서 생성된 프로세스 공유 서비스 (저장소, 체인 포함)
+    return request.app.state.chat_service
+
+
+def quota_exceeded(error: QuotaExceededError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after_s)},
+    )
+
+
+def llm_unavailable(error: LLMUnavailableError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after_s)},
+    )
 
 
 @router.post("/send_message", response_model=ChatMessageResponse)
@@ -21,20 +46,76 @@ async def send_message(
 ):
     """사용자 메시지를 보내고 AI 응답을 받습니다."""
     try:
-        return await chat_service.handle_user_message(request)
+        with stage("api.send_message"):
+            return await chat_service.handle_user_message(request)
+    except QuotaExceededError as e:
+        raise quota_exceeded(e)
+    except LLMUnavailableError as e:
+        raise llm_unavailable(e)
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except IdempotencyInProgressError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after_s)},
+        )
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
+@router.post("/send_message/stream")
+async def send_message_stream(
+        request: SendMessageRequest,
+        chat_service: ChatService = Depends(get_chat_service)
+):
+    """사용자 메시지를 보내고 AI 응답을 Server-Sent Events 로 스트리밍합니다."""
+    # 스트림이 시작되면 상태 코드를 바꿀 수 없으므로 한도 초과는 미리 429, LLM 회로 차단은 503 으로 응답
+    try:
+        with stage("quota.check"):
+            await chat_service.check_user_quota(request.user_id)
+        chat_service.check_llm_available()
+    except QuotaExceededError as e:
+        raise quota_exceeded(e)
+    except LLMUnavailableError as e:
+        raise llm_unavailable(e)
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            with stage("api.send_message_stream"):
+                # 한도는 위에서 검사했으므로 스트림에서 다시 조회하지 않음
+                async for event in chat_service.stream_user_message(request, quota_checked=True):
+                    yield f"event: {event.event}\ndata: {event.model_dump_json()}\n\n"
+        except Exception as e:
+            # 스트리밍 응답은 이미 200 으로 시작되었으므로 에러도 이벤트로 전달
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/history/{user_id}", response_model=ChatHistoryResponse)
 async def get_chat_history(
     user_id: str,
-    cursor: Optional[str] = Query(default=None, description="커서 기반 페이지네이션을 위한 커서 값"),
+    cursor: Optional[str] = Query(default=None, description="이전 응답의 cursor 값 (서명된 불투명 문자열)"),
     limit: int = Query(default=4, gt=0, le=100, description="반환할 채팅 기록의 최대 개수 (1-100)"),
+    session_id: Optional[str] = Query(default=None, description="특정 세션의 기록만 조회"),
+    start: Optional[int] = Query(default=None, ge=0, description="조회 시작 시각 (Unix timestamp, 초)"),
+    end: Optional[int] = Query(default=None, ge=0, description="조회 종료 시각 (Unix timestamp, 초)"),
     chat_service: ChatService = Depends(get_chat_service)
 ):
     """세션 ID에 해당하는 채팅 기록을 가져옵니다."""
     try:
-        return chat_service.get_user_history(user_id, cursor, limit)
+        with stage("api.history"):
+            history = await chat_service.get_user_history(user_id, cursor, limit, session_id, start, end)
+            # response_model 재검증 없이 바로 인코딩 (스키마는 OpenAPI 문서용으로만 사용)
+            return ORJSONResponse(history)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
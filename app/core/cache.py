@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, Tuple, TypeVar
+
+from pydantic import BaseModel
+
+from app.core.telemetry import register_metrics
+
+V = TypeVar("V")
+
+
+class CacheMetrics(BaseModel):
+    size: int
+    hits: int
+    misses: int
+    evictions: int  # 용량 초과로 밀려난 항목 수
+    expirations: int  # TTL 만료로 제거된 항목 수
+
+
+class TTLCache(Generic[V]):
+    """
+    프로세스(워커) 단위의 크기 제한 LRU + TTL 캐시.
+    저장소 호출이 executor 스레드에서 실행되므로 스레드 안전하게 동작합니다.
+    name 을 주면 hit/miss/eviction 카운터를 /metrics 에 cache_<name> 으로 노출합니다.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, name: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        if name is not None:
+            register_metrics(f"cache_{name}", self.metrics)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._items.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: V, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def metrics(self) -> CacheMetrics:
+        with self._lock:
+            return CacheMetrics(
+                size=len(self._items),
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+            )
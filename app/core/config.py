@@ -9,16 +9,95 @@ logger = logging.getLogger(__name__)
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file='.env', extra='ignore')
 
+    APP_ENV: str = "local"  # "local" | "dev" | "test" | 운영 환경 이름 (Docker 이미지는 "production")
     AWS_REGION: str = "ap-northeast-2"  # 기본값, .env 파일에서 오버라이드 가능
     DYNAMODB_SESSION_METADATA_TABLE: str = "SessionMetadata"
     DYNAMODB_MESSAGE_TABLE: str = "Message"
     DYNAMODB_ACTIVE_SESSION_TABLE: str = "ActiveSession"
     DYNAMODB_LANGCHAIN_TABLE: str = "LangChainSession"
+    DYNAMODB_RESPONSE_CACHE_TABLE: str = "ResponseCache"
+    DYNAMODB_USER_TOKEN_USAGE_TABLE: str = "UserTokenUsage"
+    DYNAMODB_IDEMPOTENCY_TABLE: str = "IdempotencyRecord"
+    DYNAMODB_CONTEXT_SNAPSHOT_TABLE: str = "ContextSnapshot"
     ACTIVE_SESSION_TTL_SECONDS: int = 10  # 활성 세션 TTL, .env 파일에서 오버라이드 가능
     SESSION_SUMMARY_WINDOW: int = 2
+    CONTEXT_SNAPSHOT_ENABLED: bool = False  # 세션 요약을 사용자별 스냅샷 아이템 하나(GetItem)로 조회 (ContextSnapshot 테이블 필요)
+    LONG_TERM_MEMORY_MODE: str = "recency"  # "recency" | "retrieval" | "shadow" (최근 요약 사용, 질문과 관련된 요약 검색 결과는 지표로만 비교)
+    MEMORY_RETRIEVAL_TOP_K: int = 3  # 질문과 관련된 세션 요약을 최대 몇 개까지 넣을지 (토큰 예산은 CONTEXT_SUMMARY_TOKEN_BUDGET)
+    MEMORY_RETRIEVAL_MIN_SIMILARITY: float = 0.1  # 코사인 유사도가 이 미만인 요약은 넣지 않음
+    MEMORY_INDEX_MAX_SESSIONS: int = 200  # 사용자별 인덱스에 넣을 최근 세션 수
+    MEMORY_INDEX_MAX_USERS: int = 500  # 워커에 캐시할 사용자 인덱스 수 (최대 메모리 ~ 사용자 수 x 세션 수 x 차원 x 4 bytes)
+    MEMORY_INDEX_TTL_SECONDS: float = 60.0  # summary lambda 가 새로 만든 요약은 TTL 만큼 늦게 검색될 수 있음
+    SUMMARY_EMBEDDING_MODEL: str = "hashing"  # "hashing"(로컬 글자 3-gram) 또는 OpenAI 임베딩 모델 (summary lambda 와 같은 값)
+    SUMMARY_EMBEDDING_DIMENSIONS: int = 256
     GET_MESSAGE_HISTORY_WINDOW: int = 10
+    HISTORY_CURSOR_SECRET: str = ""  # /history 커서 서명 키, 모든 워커/인스턴스가 같은 값을 사용 (local/dev/test 외에는 필수)
+    HISTORY_CURSOR_TTL_SECONDS: int = 3600  # 발급 후 커서를 사용할 수 있는 시간
+    HISTORY_MAX_QUERY_PAGES: int = 10  # 한 페이지를 채우기 위해 수행할 최대 Query 횟수
+    HISTORY_PREFETCH_ENABLED: bool = True  # 다음 페이지를 미리 조회하여 캐시
+    HISTORY_PREFETCH_TTL_SECONDS: float = 5.0
+    HISTORY_PREFETCH_MAX_PAGES: int = 1000
+    CONTEXT_TOKEN_BUDGET: int = 1500  # 프롬프트(질문 + 세션 요약 + 최근 대화)에 쓸 최대 토큰 수
+    CONTEXT_SUMMARY_TOKEN_BUDGET: int = 400  # 그 중 이전 세션 요약에 쓸 최대 토큰 수
+    CONTEXT_TOKENIZER_ENCODING: str = "o200k_base"  # gpt-4o 계열 tiktoken 인코딩
     TOKEN_LIMIT_PER_SESSION: int = 200  # 세션당 토큰 제한, .env 파일에서 오버라이드 가능
+    ACTIVE_SESSION_UPSERT_MAX_ATTEMPTS: int = 3  # 동시 세션 교체 충돌 시 재시도 횟수
+    SESSION_EXPIRY_SCHEDULER_ENABLED: bool = False  # TTL 삭제를 기다리지 않고 만료 시각에 활성 세션을 직접 종료
+    SESSION_EXPIRY_GRACE_SECONDS: float = 1.0  # 만료 시각 이후 종료까지 기다리는 시간 (워커 간 시계 오차 대비)
+    SESSION_EXPIRY_MAX_CONCURRENCY: int = 16  # 동시에 종료 처리할 세션 수
+    SESSION_CACHE_ENABLED: bool = True  # 워커 단위 ActiveSession / SessionMetadata 캐시
+    SESSION_CACHE_MAX_USERS: int = 10000
+    ACTIVE_SESSION_CACHE_TTL_SECONDS: float = 5.0
+    SESSION_METADATA_CACHE_TTL_SECONDS: float = 30.0  # 요약은 summary lambda 가 갱신하므로 TTL 만큼 늦게 반영될 수 있음
+    USER_QUOTA_ENABLED: bool = False  # 사용자별 토큰 한도 검사 (UserTokenUsage 테이블 필요)
+    USER_DAILY_TOKEN_LIMIT: int = 100_000  # 최근 24시간 토큰 한도, 0 이면 제한 없음
+    USER_MONTHLY_TOKEN_LIMIT: int = 1_000_000  # 최근 30일 토큰 한도, 0 이면 제한 없음
+    USER_QUOTA_CACHE_TTL_SECONDS: float = 30.0  # 다른 워커의 사용량이 반영되기까지의 최대 지연
+    USER_QUOTA_CACHE_MAX_USERS: int = 10000
+    USER_QUOTA_FLUSH_INTERVAL_SECONDS: float = 1.0  # 로컬 사용량을 DynamoDB 에 ADD 로 반영하는 주기
+    IDEMPOTENCY_RECORD_ENABLED: bool = False  # idempotency_key 를 DynamoDB 에 기록하여 워커 간에도 중복 처리 방지
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # 완료된 응답을 재사용할 기간
+    IDEMPOTENCY_LEASE_SECONDS: int = 120  # 처리 중 기록의 최대 유지 시간 (LLM 응답 시간보다 길게)
+    IDEMPOTENCY_WAIT_TIMEOUT_SECONDS: float = 60.0  # 다른 워커가 처리 중일 때 결과를 기다리는 최대 시간
+    IDEMPOTENCY_POLL_INTERVAL_SECONDS: float = 0.2
+    IDEMPOTENCY_COALESCE_BY_CONTENT: bool = False  # idempotency_key 가 없어도 같은 내용의 동시 요청을 한 번만 처리 ("네" 같은 짧은 메시지도 합쳐짐)
+    RESPONSE_CACHE_ENABLED: bool = False  # 같은 컨텍스트의 (거의) 같은 질문에 저장된 응답 재사용
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_CONTEXTS: int = 10000  # 로컬 캐시에 유지할 컨텍스트(fingerprint) 수
+    RESPONSE_CACHE_MAX_ENTRIES_PER_CONTEXT: int = 256
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.9  # 임베딩 코사인 유사도가 이 이상이면 히트
+    RESPONSE_CACHE_SHARED_ENABLED: bool = False  # DynamoDB 를 워커/인스턴스 간 공유 캐시로 사용 (정확 일치만)
     OPENAI_API_KEY: str = ""  # .env 파일에서 오버라이드 가능
+    OPENAI_MAX_CONNECTIONS: int = 100  # OpenAI HTTP 커넥션 풀 크기
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_WARMUP_ON_STARTUP: bool = True  # 앱 시작 시 LangChain 체인 미리 초기화
+    LLM_GUARD_ENABLED: bool = True  # LLM 호출 동시성 제한, 타임아웃, 회로 차단(circuit breaker)
+    LLM_MAX_CONCURRENCY: int = 64  # 워커당 동시 LLM 호출 수 (OPENAI_MAX_CONNECTIONS 이하로 설정)
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 5.0  # 동시 호출 수가 가득 찼을 때 기다리는 최대 시간, 넘으면 503
+    LLM_TIMEOUT_SECONDS: float = 60.0  # 응답 전체(스트리밍은 마지막 청크까지)의 최대 시간, 넘으면 504
+    LLM_FIRST_TOKEN_TIMEOUT_SECONDS: float = 20.0  # 스트리밍 첫 청크까지의 최대 시간
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5  # 연속 실패가 이만큼이면 회로를 열고 LLM 호출 없이 503
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0  # 회로를 연 뒤 시험 호출 하나를 허용하기까지의 시간
+    LLM_HEDGE_ENABLED: bool = False  # 응답이 p95 보다 늦으면 같은 요청을 한 번 더 보내 먼저 온 응답 사용 (비용 증가)
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # 지연 시간 표본이 이만큼 모이기 전에는 hedge 하지 않음
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 0.2
+    DYNAMODB_EXECUTOR_MAX_WORKERS: int = 16  # boto3 동기 호출을 offload 할 스레드 수
+    DYNAMODB_MAX_POOL_CONNECTIONS: int = 16  # botocore 커넥션 풀 크기, executor 스레드 수 이상으로 설정
+    DYNAMODB_TCP_KEEPALIVE: bool = True
+    DYNAMODB_CONNECT_TIMEOUT_SECONDS: float = 2.0
+    DYNAMODB_READ_TIMEOUT_SECONDS: float = 5.0
+    DYNAMODB_MAX_RETRY_ATTEMPTS: int = 3
+    DYNAMODB_RETRY_MODE: str = "adaptive"  # "legacy" | "standard" | "adaptive"
+    DYNAMODB_RETURN_CONSUMED_CAPACITY: bool = True  # 모든 요청의 소비 용량을 /metrics 로 집계
+    OTEL_TRACES_EXPORTER: str = "none"  # "none" | "console" | "otlp" (OTEL_EXPORTER_OTLP_ENDPOINT 로 전송)
+    OTEL_SERVICE_NAME: str = "p-dynamo-api"
+    METRICS_ENDPOINT_ENABLED: bool = True  # Prometheus /metrics (prometheus_client 필요)
+    MESSAGE_WRITE_BEHIND_ENABLED: bool = True  # 메시지를 버퍼링 후 BatchWriteItem 으로 저장
+    MESSAGE_WRITER_FLUSH_INTERVAL_SECONDS: float = 0.2
+    MESSAGE_WRITER_MAX_QUEUE_SIZE: int = 1000  # 버퍼가 이 크기를 넘으면 put 이 flush 를 기다림
+    MESSAGE_WRITER_MAX_RETRIES: int = 5  # UnprocessedItems 재시도 횟수
+    MESSAGE_WRITER_RETRY_BACKOFF_SECONDS: float = 0.05
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -0,0 +1,79 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CURSOR_VERSION = 1
+_SIGNATURE_BYTES = 16
+# 서명 키 없이(프로세스마다 임의의 키로) 실행할 수 있는 환경
+_LOCAL_ENVIRONMENTS = ("local", "dev", "test")
+
+
+class InvalidCursorError(ValueError):
+    """위조/손상되었거나, 만료되었거나, 다른 조회 조건에서 발급된 커서"""
+
+
+@lru_cache(maxsize=1)
+def _get_secret() -> bytes:
+    if settings.HISTORY_CURSOR_SECRET:
+        return settings.HISTORY_CURSOR_SECRET.encode()
+    if settings.APP_ENV not in _LOCAL_ENVIRONMENTS:
+        # 임의의 키를 쓰면 다른 워커/인스턴스, 재시작/배포 후에 모든 커서가 400 이 되므로 시작하지 않음
+        raise RuntimeError(f"HISTORY_CURSOR_SECRET must be set when APP_ENV is {settings.APP_ENV!r}.")
+    # 로컬 개발용: 프로세스마다 임의로 생성 (다른 워커/재시작 후에는 커서가 무효가 됨)
+    logger.warning("HISTORY_CURSOR_SECRET is not set; cursors are only valid within this process.")
+    return os.urandom(32)
+
+
+def check_cursor_secret() -> None:
+    """앱 시작 시 호출: 운영 환경에서 커서 서명 키가 없으면 RuntimeError"""
+    _get_secret()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(body: bytes) -> bytes:
+    return hmac.new(_get_secret(), body, hashlib.sha256).digest()[:_SIGNATURE_BYTES]
+
+
+def encode_cursor(payload: Dict[str, Any], ttl_seconds: int = settings.HISTORY_CURSOR_TTL_SECONDS) -> str:
+    """payload 를 ttl_seconds 동안 유효한, 서명된 불투명(opaque) 커서 문자열로 변환"""
+    body = json.dumps(
+        {"v": CURSOR_VERSION, "exp": int(time.time()) + ttl_seconds, **payload}, separators=(",", ":"), sort_keys=True
+    ).encode()
+    return f"{_b64encode(body)}.{_b64encode(_sign(body))}"
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """서명과 만료 시각을 검증하고 payload 를 반환, 유효하지 않으면 InvalidCursorError"""
+    try:
+        encoded_body, encoded_signature = cursor.split(".", 1)
+        body = _b64decode(encoded_body)
+        signature = _b64decode(encoded_signature)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Malformed cursor.") from e
+
+    if not hmac.compare_digest(signature, _sign(body)):
+        raise InvalidCursorError("Cursor signature mismatch.")
+
+    payload = json.loads(body)
+    if payload.pop("v", None) != CURSOR_VERSION:
+        raise InvalidCursorError("Unsupported cursor version.")
+    if payload.pop("exp", 0) <= time.time():
+        raise InvalidCursorError("Cursor has expired.")
+    return payload
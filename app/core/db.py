@@ -1,9 +1,29 @@
 import boto3
+from botocore.config import Config
+
 from app.core.config import settings
+from app.core.telemetry import instrument_dynamodb_client
+
+
+def get_dynamodb_config() -> Config:
+    """DynamoDB 클라이언트 설정 (커넥션 풀, keep-alive, 재시도)"""
+    return Config(
+        region_name=settings.AWS_REGION,
+        max_pool_connections=settings.DYNAMODB_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=settings.DYNAMODB_TCP_KEEPALIVE,
+        connect_timeout=settings.DYNAMODB_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=settings.DYNAMODB_READ_TIMEOUT_SECONDS,
+        retries={
+            'max_attempts': settings.DYNAMODB_MAX_RETRY_ATTEMPTS,
+            'mode': settings.DYNAMODB_RETRY_MODE,
+        },
+    )
 
 
 def get_dynamodb_resource():
     """DynamoDB 리소스 객체 반환"""
-    return boto3.resource('dynamodb', region_name=settings.AWS_REGION)
-
+    dynamodb = boto3.resource('dynamodb', region_name=settings.AWS_REGION, config=get_dynamodb_config())
+    if settings.DYNAMODB_RETURN_CONSUMED_CAPACITY:
+        instrument_dynamodb_client(dynamodb.meta.client)
+    return dynamodb
 
@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+# 신규 sort_key: "{session_id}#{epoch_ms:013d}-{seq:04d}-{node}"
+# 기존 sort_key: "{session_id}#{epoch_s:010d}"
+# 두 형식 모두 문자열 비교만으로 시간순 정렬됩니다. 같은 초라면 기존 키("…#1700000000")가
+# 신규 키("…#1700000000123-…")의 접두사이므로 항상 앞에 옵니다.
+SORT_KEY_SEPARATOR = "#"
+_MAX_SEQUENCE = 9999
+# 10자리 초 단위 타임스탬프의 최댓값 (열린 구간 조회 시 상한으로 사용)
+MAX_EPOCH_SECONDS = 9_999_999_999
+# '-' 뒤에 오는 어떤 seq/node 보다도 큰 문자 (between 상한 계산용)
+_UPPER_SENTINEL = "~"
+
+
+class MessageKeyGenerator:
+    """
+    프로세스 내에서 단조 증가하는 메시지 ID 생성기.
+    같은 밀리초에 생성된 메시지는 seq 로 구분하고, node 로 워커/인스턴스 간 충돌을 막습니다.
+    """
+
+    def __init__(self, node: Optional[str] = None):
+        self.node = node or os.urandom(2).hex()
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def next_id(self) -> Tuple[int, str]:
+        """(created_at_ms, message_id) 반환"""
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # 같은 밀리초이거나 시계가 뒤로 간 경우에도 이전 ID 보다 뒤에 정렬되도록 함
+                self._sequence += 1
+                if self._sequence > _MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return self._last_ms, f"{self._last_ms:013d}-{self._sequence:04d}-{self.node}"
+
+
+message_key_generator = MessageKeyGenerator()
+
+
+def make_message_sort_key(session_id: str, message_id: str) -> str:
+    return f"{session_id}{SORT_KEY_SEPARATOR}{message_id}"
+
+
+def session_sort_key_prefix(session_id: str) -> str:
+    return f"{session_id}{SORT_KEY_SEPARATOR}"
+
+
+def sort_key_time_range(session_id: str, start_time_s: int, end_time_s: int) -> Tuple[str, str]:
+    """
+    [start_time_s, end_time_s] 초 구간에 해당하는 between 하한/상한.
+    하한은 시작 초의 기존 키와 같고, 상한은 끝 초의 마지막 밀리초에 생성된 신규 키보다 큽니다.
+    """
+    prefix = session_sort_key_prefix(session_id)
+    return f"{prefix}{start_time_s:010d}", f"{prefix}{end_time_s:010d}999-{_UPPER_SENTINEL}"
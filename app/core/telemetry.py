@@ -0,0 +1,241 @@
+import asyncio
+import contextvars
+import logging
+import time
+from concurrent.futures import Executor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# prometheus_client / opentelemetry 는 선택 의존성: 설치되어 있지 않으면 해당 export 만 비활성화
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover - 선택 의존성
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover - 선택 의존성
+    trace = None
+
+# 지연 시간 히스토그램 버킷 (초): DynamoDB 수 ms ~ LLM 수십 초
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# ReturnConsumedCapacity 를 지원하는 DynamoDB 작업
+CAPACITY_OPERATIONS = (
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan",
+    "BatchGetItem", "BatchWriteItem", "TransactGetItems", "TransactWriteItems",
+)
+
+if prometheus_client is not None:
+    STAGE_LATENCY = prometheus_client.Histogram(
+        "chat_stage_duration_seconds", "Latency of each hot-path stage",
+        ["stage", "outcome"], buckets=LATENCY_BUCKETS,
+    )
+    DYNAMODB_CONSUMED_CAPACITY = prometheus_client.Counter(
+        "dynamodb_consumed_capacity_units", "DynamoDB capacity units reported by ReturnConsumedCapacity",
+        ["table", "operation"],
+    )
+    LLM_TOKENS = prometheus_client.Counter(
+        "llm_tokens", "Tokens reported by the LLM usage_metadata", ["kind"],
+    )
+    CONTEXT_TOKENS = prometheus_client.Counter(
+        "context_tokens", "Prompt tokens sent and candidate tokens saved by the context builder", ["kind"],
+    )
+else:
+    STAGE_LATENCY = DYNAMODB_CONSUMED_CAPACITY = LLM_TOKENS = CONTEXT_TOKENS = None
+
+_tracer = None
+# 컴포넌트 이름 -> metrics() (pydantic 모델을 반환), /metrics 를 수집할 때마다 호출
+_metrics_sources: Dict[str, Callable[[], Any]] = {}
+
+T = TypeVar("T")
+
+
+def setup_telemetry() -> None:
+    """
+    OpenTelemetry tracer 설정 (앱 시작 시 한 번 호출).
+    OTEL_TRACES_EXPORTER 가 "console" 이면 표준 출력, "otlp" 이면 OTEL_EXPORTER_OTLP_ENDPOINT 의 collector 로 보냅니다.
+    """
+    global _tracer
+    if trace is None or settings.OTEL_TRACES_EXPORTER == "none":
+        return
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+        if settings.OTEL_TRACES_EXPORTER == "otlp":
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            exporter = OTLPSpanExporter()  # endpoint 는 OTEL_EXPORTER_OTLP_ENDPOINT 환경 변수에서 읽음
+        else:
+            exporter = ConsoleSpanExporter()
+    except ImportError as e:
+        logger.warning(f"OpenTelemetry SDK/exporter is not installed, tracing disabled: {e}")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("app")
+
+
+def shutdown_telemetry() -> None:
+    """남은 span 을 내보내고 종료 (앱 종료 시 호출)"""
+    global _tracer
+    if _tracer is not None:
+        trace.get_tracer_provider().shutdown()
+        _tracer = None
+
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[Optional[Any]]:
+    """
+    hot path 한 단계의 소요 시간 측정.
+    Prometheus 히스토그램에 기록하고, tracing 이 켜져 있으면 같은 이름의 span 을 만듭니다.
+    동기/비동기 코드 모두에서 `with stage(...)` 로 사용할 수 있으며, span 을 반환하므로 속성을 추가할 수 있습니다.
+    """
+    span_cm = _tracer.start_as_current_span(name, attributes=attributes) if _tracer is not None else nullcontext()
+    outcome = "ok"
+    started_at = time.perf_counter()
+    with span_cm as span:
+        try:
+            yield span
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            duration = time.perf_counter() - started_at
+            if STAGE_LATENCY is not None:
+                STAGE_LATENCY.labels(stage=name, outcome=outcome).observe(duration)
+            logger.debug(f"stage={name} outcome={outcome} duration_ms={duration * 1000:.1f}")
+
+
+def observe(name: str, seconds: float, outcome: str = "ok") -> None:
+    """span 없이 이미 측정한 시간만 기록 (예: executor 대기 시간)"""
+    if STAGE_LATENCY is not None:
+        STAGE_LATENCY.labels(stage=name, outcome=outcome).observe(seconds)
+
+
+async def run_in_executor(executor: Executor, name: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    동기 함수를 executor 에서 stage(name) 으로 측정하며 실행.
+    현재 context(요청 span)를 스레드로 넘겨 DynamoDB span 이 요청 span 아래에 기록되도록 하고,
+    스레드를 기다린 시간은 "executor_wait" 로 따로 기록합니다.
+    """
+    queued_at = time.perf_counter()
+
+    def call() -> T:
+        observe("executor_wait", time.perf_counter() - queued_at)
+        with stage(name):
+            return func(*args, **kwargs)
+
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(context.run, call))
+
+
+def set_attributes(span: Optional[Any], **attributes: Any) -> None:
+    if span is not None:
+        span.set_attributes({key: value for key, value in attributes.items() if value is not None})
+
+
+def record_llm_usage(span: Optional[Any], usage_metadata: Optional[Dict[str, Any]]) -> None:
+    """LLM 응답의 usage_metadata 토큰 수를 span 속성과 Prometheus 카운터에 기록"""
+    if not usage_metadata:
+        return
+    set_attributes(
+        span,
+        **{
+            "llm.input_tokens": usage_metadata.get("input_tokens"),
+            "llm.output_tokens": usage_metadata.get("output_tokens"),
+            "llm.total_tokens": usage_metadata.get("total_tokens"),
+        },
+    )
+    if LLM_TOKENS is not None:
+        for kind in ("input", "output"):
+            LLM_TOKENS.labels(kind=kind).inc(usage_metadata.get(f"{kind}_tokens", 0))
+
+
+def record_context_tokens(prompt_tokens: int, saved_tokens: int) -> None:
+    """토큰 예산에 맞춘 프롬프트 토큰 수와, 예산 때문에 넣지 않은(절약한) 토큰 수를 Prometheus 카운터에 기록"""
+    if CONTEXT_TOKENS is not None:
+        CONTEXT_TOKENS.labels(kind="prompt").inc(prompt_tokens)
+        CONTEXT_TOKENS.labels(kind="saved").inc(saved_tokens)
+
+
+def _add_return_consumed_capacity(params: Dict[str, Any], **kwargs) -> None:
+    params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _record_consumed_capacity(parsed: Dict[str, Any], model: Any, **kwargs) -> None:
+    consumed = parsed.get("ConsumedCapacity") if isinstance(parsed, dict) else None
+    if not consumed:
+        return
+    # 단일 아이템/Query 는 dict, Batch/Transact 작업은 테이블별 list
+    for capacity in consumed if isinstance(consumed, list) else [consumed]:
+        units = capacity.get("CapacityUnits", 0)
+        if DYNAMODB_CONSUMED_CAPACITY is not None:
+            DYNAMODB_CONSUMED_CAPACITY.labels(table=capacity.get("TableName", ""), operation=model.name).inc(units)
+        if trace is not None:
+            set_attributes(trace.get_current_span(), **{"dynamodb.consumed_capacity": units})
+
+
+def instrument_dynamodb_client(client: Any) -> None:
+    """
+    모든 DynamoDB 요청에 ReturnConsumedCapacity=TOTAL 을 붙이고, 응답의 ConsumedCapacity 를 기록하도록
+    botocore 이벤트 훅 등록 (저장소 코드 수정 없이 모든 호출에 적용)
+    """
+    events = client.meta.events
+    for operation in CAPACITY_OPERATIONS:
+        events.register(f"before-parameter-build.dynamodb.{operation}", _add_return_consumed_capacity)
+        events.register(f"after-call.dynamodb.{operation}", _record_consumed_capacity)
+
+
+def register_metrics(component: str, metrics: Callable[[], Any]) -> None:
+    """
+    컴포넌트의 metrics() 값을 /metrics 에 노출 (같은 이름으로 다시 등록하면 마지막 것만 유효).
+    숫자 필드는 app_<component>_<field> gauge, 문자열 필드는 value 라벨이 붙은 값 1 의 gauge 가 됩니다.
+    """
+    _metrics_sources[component] = metrics
+
+
+class _ComponentMetricsCollector:
+    """register_metrics 로 등록된 컴포넌트 지표를 수집 시점에 읽어 오는 Prometheus collector"""
+
+    def collect(self) -> Iterator[Any]:
+        from prometheus_client.core import GaugeMetricFamily
+
+        for component, metrics in list(_metrics_sources.items()):
+            try:
+                values = metrics().model_dump()
+            except Exception as e:
+                logger.warning(f"Error collecting metrics of {component}: {e}")
+                continue
+            for field, value in values.items():
+                name = f"app_{component}_{field}"
+                if isinstance(value, (bool, int, float)):
+                    family = GaugeMetricFamily(name, f"{component} {field}", value=float(value))
+                elif isinstance(value, str):
+                    family = GaugeMetricFamily(name, f"{component} {field}", labels=["value"])
+                    family.add_metric([value], 1.0)
+                else:
+                    continue  # None 등
+                yield family
+
+
+if prometheus_client is not None:
+    prometheus_client.REGISTRY.register(_ComponentMetricsCollector())
+
+
+def metrics_payload() -> Optional[tuple]:
+    """(본문, content-type), prometheus_client 가 없으면 None"""
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
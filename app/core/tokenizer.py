@@ -0,0 +1,23 @@
+from functools import lru_cache
+
+from app.core.config import settings
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """gpt-4o 계열 토크나이저. 인코딩 파일을 받을 수 없는 환경이면 None"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(settings.CONTEXT_TOKENIZER_ENCODING)
+    except Exception as e:
+        print(f"Tokenizer unavailable, falling back to estimated token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """로컬 토크나이저로 토큰 수 계산 (없으면 추정치: ASCII 4글자당 1토큰, 그 외 글자당 1토큰)"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for ch in text if ch.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
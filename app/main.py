@@ -1,10 +1,55 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Response, status
 from app.api.v1 import chat_routes
+from app.core.config import settings
+from app.core.cursor import check_cursor_secret
+from app.core.db import get_dynamodb_resource
+from app.core.telemetry import metrics_payload, setup_telemetry, shutdown_telemetry
+from app.repositories.chat_repository import ChatRepository
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.chat_service import ChatService, warm_up_chain
+from app.services.quota_service import QuotaService
+from app.services.session_expiry_scheduler import SessionExpiryScheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_cursor_secret()
+    setup_telemetry()
+    # DynamoDB 리소스/테이블 핸들과 LLM 체인은 프로세스 당 한 번만 생성하여 모든 요청이 공유
+    chat_repo = AsyncChatRepository(ChatRepository(get_dynamodb_resource()))
+    chat_repo.start()
+    app.state.chat_repo = chat_repo
+    quota_service = None
+    if settings.USER_QUOTA_ENABLED:
+        quota_service = QuotaService(chat_repo)
+        quota_service.start()
+    session_expiry_scheduler = None
+    if settings.SESSION_EXPIRY_SCHEDULER_ENABLED:
+        session_expiry_scheduler = SessionExpiryScheduler(chat_repo)
+        session_expiry_scheduler.start()
+    app.state.chat_service = ChatService(
+        chat_repo, quota_service=quota_service, session_expiry_scheduler=session_expiry_scheduler
+    )
+    if settings.LLM_WARMUP_ON_STARTUP:
+        warm_up_chain(chat_repo)
+    try:
+        yield
+    finally:
+        if session_expiry_scheduler:
+            await session_expiry_scheduler.close()
+        if quota_service:
+            await quota_service.close()
+        await chat_repo.close()
+        shutdown_telemetry()
+
 
 app = FastAPI(
     title="AI Chatbot API",
     description="Simple AI Chatbot API using FastAPI and DynamoDB",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # API 라우터 등록
@@ -13,3 +58,13 @@ app.include_router(chat_routes.router, prefix="/api/v1", tags=["Chatbot"])
 @app.get("/")
 async def root():
     return {"message": "Welcome to the AI Chatbot API!"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 수집용 단계별 지연 시간 / DynamoDB 소비 용량 / LLM 토큰 지표"""
+    payload = metrics_payload() if settings.METRICS_ENDPOINT_ENABLED else None
+    if payload is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are not enabled.")
+    body, content_type = payload
+    return Response(content=body, media_type=content_type)
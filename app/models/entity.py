@@ -11,6 +11,7 @@ class SessionMetadata(BaseModel):
     created_at: int  # Number
     finished_at: Optional[int] = None  # Number
     session_summary: Optional[str] = None
+    summary_watermark: Optional[str] = None  # 요약에 반영된 마지막 메시지의 sort_key (summary lambda 가 관리)
     token_usage: Optional[int] = 0  # Number, total tokens used in the session
 
 
@@ -23,6 +24,59 @@ class Message(BaseModel):
     created_at: int  # 메시지 발생 시각 (정렬 또는 쿼리/분석용)
     sender_type: str  # "human" or "ai"
     content: str  # 메시지 텍스트
+    token_count: Optional[int] = None  # 저장 시 계산한 토큰 수 (컨텍스트 구성 시 재사용)
+
+
+# This is the data model for the shared response cache in DynamoDB.
+# it will be saved temporally in DynamoDB (expired_at is the TTL attribute).
+class CachedResponse(BaseModel):
+    cache_key: str  # partition key, sha256(context_fingerprint + normalized prompt)
+    context_fingerprint: str
+    prompt: str  # 정규화된 사용자 질문
+    content: str  # AI 응답
+    total_tokens: int  # 원래 LLM 호출에서 사용한 토큰 수 (캐시 히트 시에도 동일하게 집계)
+    created_at: int
+    expired_at: int
+
+
+# This is the data model for the per-user token usage counters in DynamoDB.
+# it will be saved temporally in DynamoDB (expired_at is the TTL attribute).
+class UserTokenUsage(BaseModel):
+    user_id: str  # partition key
+    window: str  # sort key, "hour#YYYYMMDDHH" or "day#YYYYMMDD" (UTC)
+    tokens: int  # Number, 원자적 ADD 로 누적
+    expired_at: int
+
+
+# This is the data model for the send_message idempotency records in DynamoDB.
+# it will be saved temporally in DynamoDB (expired_at is the TTL attribute).
+class IdempotencyRecord(BaseModel):
+    idempotency_key: str  # partition key, user_id#idempotency_key
+    status: str  # "in_progress" or "completed"
+    request_hash: str  # 같은 키로 다른 내용을 보낸 경우를 구분하기 위한 요청 해시
+    owner_id: str  # 처리 중인 워커/요청 식별자, 완료/해제 시 조건으로 사용
+    lease_expires_at: int  # 이 시각이 지나도록 in_progress 이면 처리하던 워커가 죽은 것으로 간주
+    expired_at: int
+    response_content: Optional[str] = None
+    response_session_id: Optional[str] = None
+
+
+# This is the data model for the per-user context snapshot in DynamoDB.
+# it is derived from SessionMetadata and can be rebuilt at any time.
+class ContextSnapshot(BaseModel):
+    user_id: str  # partition key
+    summaries: List[SessionMetadata] = []  # 최근 window 개 세션 (최신순), 요약은 요약 토큰 예산에 맞게 잘라 둠
+    window: Optional[int] = None  # 스냅샷을 만들 때의 SESSION_SUMMARY_WINDOW
+    summary_token_budget: Optional[int] = None  # 스냅샷을 만들 때의 CONTEXT_SUMMARY_TOKEN_BUDGET
+    version: int = 0  # 스냅샷을 다시 만들 때마다 1 증가
+    metadata_version: int = 0  # SessionMetadata 가 바뀔 때마다(세션 교체, 요약 갱신) 1 증가
+    snapshot_version: Optional[int] = None  # summaries 를 만들 때 읽은 metadata_version
+    updated_at: Optional[int] = None
+
+
+class IdempotencyStatus(Enum):
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
 
 
 class SenderType(Enum):
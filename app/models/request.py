@@ -1,7 +1,10 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, Field
 
 
 class SendMessageRequest(BaseModel):
     user_id: str
     content: str
-
+    # 클라이언트가 재시도/중복 전송 시 같은 값을 보내면 한 번만 처리하고 같은 응답을 돌려줌
+    idempotency_key: Optional[str] = Field(default=None, min_length=1, max_length=128)
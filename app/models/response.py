@@ -7,6 +7,12 @@ class ChatMessageResponse(BaseModel):
     session_id: str
 
 
+class ChatStreamEvent(BaseModel):
+    event: str  # "token" (생성 중인 토큰) 또는 "done" (전체 응답)
+    content: str
+    session_id: str
+
+
 class MessageResponse(BaseModel):
     content: str
     type: str
@@ -0,0 +1,187 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.telemetry import run_in_executor
+from app.models.entity import (
+    SessionMetadata, ActiveSession, Message, CachedResponse, IdempotencyRecord, ContextSnapshot
+)
+from app.repositories.chat_repository import ChatRepository
+from app.repositories.message_writer import MessageWriter
+
+T = TypeVar("T")
+
+
+def create_dynamodb_executor() -> ThreadPoolExecutor:
+    """
+    boto3 호출은 동기 방식이므로, 이벤트 루프를 막지 않도록 크기가 제한된 스레드 풀에서 실행
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.DYNAMODB_EXECUTOR_MAX_WORKERS,
+        thread_name_prefix="dynamodb",
+    )
+
+
+class AsyncChatRepository:
+    """
+    ChatRepository 와 동일한 인터페이스를 제공하는 비동기 저장소.
+    각 호출은 제한된 executor 로 offload 되어 이벤트 루프를 블로킹하지 않습니다.
+    """
+
+    def __init__(self, repo: Optional[ChatRepository] = None, executor: Optional[ThreadPoolExecutor] = None,
+                 write_behind: bool = settings.MESSAGE_WRITE_BEHIND_ENABLED):
+        self.repo = repo or ChatRepository()
+        self._owns_executor = executor is None
+        self.executor = executor or create_dynamodb_executor()
+        # write-behind 가 켜져 있으면 put_message 는 버퍼에 넣고 BatchWriteItem 으로 모아서 저장
+        self.message_writer = MessageWriter(self.repo, self.executor) if write_behind else None
+
+    def start(self) -> None:
+        """백그라운드 작업 시작 (앱 시작 시 호출)"""
+        if self.message_writer:
+            self.message_writer.start()
+
+    async def close(self) -> None:
+        """남은 메시지를 저장하고 직접 생성한 executor 정리 (앱 종료 시 호출)"""
+        if self.message_writer:
+            await self.message_writer.stop()
+        if self._owns_executor:
+            self.executor.shutdown(wait=True)
+
+    async def _run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        return await run_in_executor(self.executor, f"dynamodb.{func.__name__}", func, *args, **kwargs)
+
+    async def get_active_session(self, user_id: str) -> Optional[ActiveSession]:
+        """사용자의 현재 활성 세션 조회"""
+        return await self._run(self.repo.get_active_session, user_id)
+
+    async def create_active_session(
+            self, user_id: str, session_id: str, created_at: int, active_session_ttl_seconds: int
+    ) -> Optional[ActiveSession]:
+        """새 활성 세션 생성 (TTL 설정)"""
+        return await self._run(
+            self.repo.create_active_session, user_id, session_id, created_at, active_session_ttl_seconds
+        )
+
+    async def update_active_session_ttl(self, user_id: str, session_id: str, current_time_s: int,
+                                        active_session_ttl_seconds: int):
+        """활성 세션의 TTL 갱신"""
+        return await self._run(
+            self.repo.update_active_session_ttl, user_id, session_id, current_time_s, active_session_ttl_seconds
+        )
+
+    async def touch_active_session(self, user_id: str, current_time_s: int, active_session_ttl_seconds: int,
+                                   token_limit: int) -> Optional[ActiveSession]:
+        """토큰 한도 이내인 활성 세션의 TTL 을 조건부로 갱신"""
+        return await self._run(
+            self.repo.touch_active_session, user_id, current_time_s, active_session_ttl_seconds, token_limit
+        )
+
+    async def rollover_active_session(self, user_id: str, session_id: str, current_time_s: int,
+                                      active_session_ttl_seconds: int, token_limit: int) -> bool:
+        """새 활성 세션과 세션 메타데이터를 하나의 트랜잭션으로 생성"""
+        return await self._run(
+            self.repo.rollover_active_session, user_id, session_id, current_time_s, active_session_ttl_seconds,
+            token_limit
+        )
+
+    async def update_active_session_token_usage(self, user_id: str, token_usage: int):
+        """활성 세션의 토큰 사용량 갱신"""
+        return await self._run(self.repo.update_active_session_token_usage, user_id, token_usage)
+
+    async def remove_active_session(self, user_id: str):
+        """활성 세션 제거"""
+        return await self._run(self.repo.remove_active_session, user_id)
+
+    async def expire_active_session(self, user_id: str, session_id: str,
+                                    current_time_s: int) -> Optional[ActiveSession]:
+        """만료된 활성 세션을 조건부로 삭제"""
+        return await self._run(self.repo.expire_active_session, user_id, session_id, current_time_s)
+
+    async def create_session_metadata(self, user_id: str, session_id: str, created_at: int) -> SessionMetadata:
+        """세션 메타데이터 생성"""
+        return await self._run(self.repo.create_session_metadata, user_id, session_id, created_at)
+
+    async def get_current_session_metadata_by_user_id(self, user_id: str, limit: int,
+                                                      consistent_read: bool = False) -> List[SessionMetadata]:
+        """사용자 ID로 세션 메타데이터 조회"""
+        return await self._run(self.repo.get_current_session_metadata_by_user_id, user_id, limit, consistent_read)
+
+    async def get_session_summary_items(self, user_id: str, max_sessions: int) -> List[Dict[str, Any]]:
+        """최근 세션들의 요약과 요약 임베딩 조회 (장기 기억 검색 인덱스 용)"""
+        return await self._run(self.repo.get_session_summary_items, user_id, max_sessions)
+
+    async def get_context_snapshot(self, user_id: str) -> Optional[ContextSnapshot]:
+        """사용자의 컨텍스트 스냅샷 조회"""
+        return await self._run(self.repo.get_context_snapshot, user_id)
+
+    async def put_context_snapshot(self, user_id: str, summaries: List[SessionMetadata], window: int,
+                                   summary_token_budget: int, metadata_version: int, current_time_s: int) -> bool:
+        """컨텍스트 스냅샷 갱신 (그 사이 SessionMetadata 가 바뀌었으면 False)"""
+        return await self._run(
+            self.repo.put_context_snapshot, user_id, summaries, window, summary_token_budget,
+            metadata_version, current_time_s,
+        )
+
+    async def put_message(self, message: Message) -> None:
+        """메시지 저장"""
+        if self.message_writer:
+            return await self.message_writer.put(message)
+        return await self._run(self.repo.put_message, message)
+
+    async def batch_put_messages(self, messages: List[Message]) -> List[Message]:
+        """메시지 일괄 저장, 처리되지 않은 메시지 반환"""
+        return await self._run(self.repo.batch_put_messages, messages)
+
+    async def get_recent_messages_of_session(self, user_id: str, session_id: str, limit: int) -> List[Message]:
+        """세션의 최근 메시지를 시간순으로 조회"""
+        return await self._run(self.repo.get_recent_messages_of_session, user_id, session_id, limit)
+
+    async def get_messages_of_user(self, user_id: str, cursor: str, limit: int, session_id: Optional[str] = None,
+                                   start_time_s: Optional[int] = None,
+                                   end_time_s: Optional[int] = None) -> Tuple[List[Message], Optional[str]]:
+        """사용자의 메시지를 최신순으로 조회 (세션/시간 범위 조건 선택)"""
+        return await self._run(self.repo.get_messages_of_user, user_id, cursor, limit,
+                               session_id, start_time_s, end_time_s)
+
+    async def get_message_items_of_user(self, user_id: str, cursor: str, limit: int, session_id: Optional[str] = None,
+                                        start_time_s: Optional[int] = None,
+                                        end_time_s: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """검증하지 않은 DynamoDB 아이템 그대로 메시지 조회 (history 응답 fast path 용)"""
+        return await self._run(self.repo.get_message_items_of_user, user_id, cursor, limit,
+                               session_id, start_time_s, end_time_s)
+
+    async def get_cached_response(self, cache_key: str) -> Optional[CachedResponse]:
+        """공유 응답 캐시 조회"""
+        return await self._run(self.repo.get_cached_response, cache_key)
+
+    async def put_cached_response(self, cached_response: CachedResponse) -> None:
+        """공유 응답 캐시 저장"""
+        await self._run(self.repo.put_cached_response, cached_response)
+
+    async def get_user_token_usage(self, user_id: str) -> Dict[str, int]:
+        """사용자의 시간/일 단위 토큰 사용량 조회"""
+        return await self._run(self.repo.get_user_token_usage, user_id)
+
+    async def add_user_token_usage(self, user_id: str, window: str, tokens: int, expired_at: int) -> None:
+        """window 의 토큰 사용량을 원자적으로 증가"""
+        await self._run(self.repo.add_user_token_usage, user_id, window, tokens, expired_at)
+
+    async def acquire_idempotency_record(self, record: IdempotencyRecord, current_time_s: int) -> bool:
+        """처리 중 기록 생성 (조건부), 이미 다른 요청이 처리 중/완료했으면 False"""
+        return await self._run(self.repo.acquire_idempotency_record, record, current_time_s)
+
+    async def get_idempotency_record(self, idempotency_key: str) -> Optional[IdempotencyRecord]:
+        """idempotency 기록 조회 (strongly consistent)"""
+        return await self._run(self.repo.get_idempotency_record, idempotency_key)
+
+    async def complete_idempotency_record(self, idempotency_key: str, owner_id: str, response_content: str,
+                                          response_session_id: str, expired_at: int) -> None:
+        """처리 결과 저장"""
+        await self._run(self.repo.complete_idempotency_record, idempotency_key, owner_id,
+                        response_content, response_session_id, expired_at)
+
+    async def delete_idempotency_record(self, idempotency_key: str, owner_id: str) -> None:
+        """처리 실패 시 기록 삭제"""
+        await self._run(self.repo.delete_idempotency_record, idempotency_key, owner_id)
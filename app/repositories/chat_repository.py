@@ -1,30 +1,72 @@
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.db import get_dynamodb_resource
-from app.models.entity import SessionMetadata, ActiveSession, Message
+from app.core.message_key import MAX_EPOCH_SECONDS, session_sort_key_prefix, sort_key_time_range
+from app.models.entity import (
+    SessionMetadata, ActiveSession, Message, CachedResponse, IdempotencyRecord, IdempotencyStatus, ContextSnapshot
+)
 
 
 class ChatRepository:
-    def __init__(self):
-        self.dynamodb = get_dynamodb_resource()
+    def __init__(self, dynamodb=None, cache_enabled: bool = settings.SESSION_CACHE_ENABLED):
+        # 프로세스 단위로 공유되는 리소스를 주입받을 수 있음 (없으면 새로 생성)
+        self.dynamodb = dynamodb or get_dynamodb_resource()
         self.session_metadata_table = self.dynamodb.Table(settings.DYNAMODB_SESSION_METADATA_TABLE)
         self.message_table = self.dynamodb.Table(settings.DYNAMODB_MESSAGE_TABLE)
         self.active_session_table = self.dynamodb.Table(settings.DYNAMODB_ACTIVE_SESSION_TABLE)
         self.langchainTable = self.dynamodb.Table(settings.DYNAMODB_LANGCHAIN_TABLE)
+        self.response_cache_table = self.dynamodb.Table(settings.DYNAMODB_RESPONSE_CACHE_TABLE)
+        self.user_token_usage_table = self.dynamodb.Table(settings.DYNAMODB_USER_TOKEN_USAGE_TABLE)
+        self.idempotency_table = self.dynamodb.Table(settings.DYNAMODB_IDEMPOTENCY_TABLE)
+        self.context_snapshot_table = self.dynamodb.Table(settings.DYNAMODB_CONTEXT_SNAPSHOT_TABLE)
+
+        # user_id 별 ActiveSession / 최근 SessionMetadata 캐시. 이 저장소의 쓰기 연산이 즉시 갱신(write-through)합니다.
+        self.active_session_cache: Optional[TTLCache[ActiveSession]] = None
+        self.session_metadata_cache: Optional[TTLCache[Tuple[int, List[SessionMetadata]]]] = None
+        if cache_enabled:
+            self.active_session_cache = TTLCache(
+                settings.SESSION_CACHE_MAX_USERS, settings.ACTIVE_SESSION_CACHE_TTL_SECONDS, name="active_session"
+            )
+            self.session_metadata_cache = TTLCache(
+                settings.SESSION_CACHE_MAX_USERS, settings.SESSION_METADATA_CACHE_TTL_SECONDS, name="session_metadata"
+            )
+
+    def _cache_active_session(self, user_id: str, active_session: Optional[ActiveSession]) -> None:
+        if self.active_session_cache is None:
+            return
+        if active_session is None:
+            self.active_session_cache.invalidate(user_id)
+        else:
+            self.active_session_cache.set(user_id, active_session)
+
+    def _invalidate_session_metadata(self, user_id: str) -> None:
+        if self.session_metadata_cache is not None:
+            self.session_metadata_cache.invalidate(user_id)
 
     def get_active_session(self, user_id: str) -> Optional[ActiveSession]:
-        """사용자의 현재 활성 세션 조회"""
+        """
+        사용자의 현재 활성 세션 조회.
+        DynamoDB TTL 은 만료된 아이템을 늦게 삭제하므로, expired_at 이 지난 세션은 없는 것으로 봅니다.
+        """
+        current_time_s = int(time.time())
+        if self.active_session_cache is not None:
+            cached = self.active_session_cache.get(user_id)
+            if cached is not None:
+                return cached if cached.expired_at > current_time_s else None
         try:
             response = self.active_session_table.get_item(Key={'user_id': user_id})
             if 'Item' not in response:
                 return None
             # 반환된 아이템을 ActiveSession 모델로 변환
-            return ActiveSession(**response['Item'])
+            active_session = ActiveSession(**response['Item'])
+            self._cache_active_session(user_id, active_session)
+            return active_session if active_session.expired_at > current_time_s else None
         except ClientError as e:
             print(f"Error getting active session: {e}")
             raise
@@ -43,15 +85,19 @@ class ChatRepository:
             'token_usage': 0,
         }
         try:
-            # 조건부 쓰기: user_id가 없어야만 생성
+            # 조건부 쓰기: user_id가 없거나 만료된 세션만 있어야 생성
             self.active_session_table.put_item(
                 Item=item,
-                ConditionExpression='attribute_not_exists(user_id)'
+                ConditionExpression='attribute_not_exists(user_id) OR expired_at <= :now',
+                ExpressionAttributeValues={':now': created_at},
             )
-            return ActiveSession(**item)
+            active_session = ActiveSession(**item)
+            self._cache_active_session(user_id, active_session)
+            return active_session
         except ClientError as e:
             if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
                 print(f"Active session for user {user_id} already exists.")
+                self._cache_active_session(user_id, None)
                 return None  # 이미 존재하면 None 반환
             print(f"Error creating active session: {e}")
             raise
@@ -60,31 +106,136 @@ class ChatRepository:
                                   active_session_ttl_seconds: int):
         """활성 세션의 TTL 갱신"""
         try:
-            self.active_session_table.update_item(
+            response = self.active_session_table.update_item(
                 Key={'user_id': user_id},
                 UpdateExpression="SET updated_at = :u_val, expired_at = :e_val",
-                ConditionExpression="session_id = :sid_val",  # 해당 session_id가 일치할 때만 업데이트
+                # 해당 session_id 가 일치하고 아직 만료되지 않았을 때만 업데이트
+                ConditionExpression="session_id = :sid_val AND expired_at > :u_val",
                 ExpressionAttributeValues={
                     ':sid_val': session_id,
                     ':u_val': current_time_s,
                     ':e_val': current_time_s + active_session_ttl_seconds
-                }
+                },
+                ReturnValues="ALL_NEW",
             )
+            self._cache_active_session(user_id, ActiveSession(**response['Attributes']))
         except ClientError as e:
+            self._cache_active_session(user_id, None)
             print(f"Error updating active session TTL: {e}")
             raise
 
+    def touch_active_session(self, user_id: str, current_time_s: int, active_session_ttl_seconds: int,
+                             token_limit: int) -> Optional[ActiveSession]:
+        """
+        토큰 한도 이내이고 만료되지 않은 활성 세션의 TTL 을 조건부로 갱신 (1 round trip).
+        세션이 없거나, 만료되었거나(TTL 삭제 전), 한도를 넘었으면 None 반환.
+        """
+        if self.active_session_cache is not None:
+            cached = self.active_session_cache.get(user_id)
+            if cached is not None and (cached.token_usage > token_limit or cached.expired_at <= current_time_s):
+                # 캐시상 한도를 넘은 세션이면 실패할 조건부 쓰기를 생략하고 바로 세션 교체 경로로 보냄.
+                # 캐시가 틀렸더라도 교체 트랜잭션의 조건식에서 걸러지므로 한도를 넘겨 사용할 수 없음
+                return None
+        try:
+            response = self.active_session_table.update_item(
+                Key={'user_id': user_id},
+                UpdateExpression="SET updated_at = :u_val, expired_at = :e_val",
+                ConditionExpression="attribute_exists(user_id) AND token_usage <= :limit AND expired_at > :u_val",
+                ExpressionAttributeValues={
+                    ':u_val': current_time_s,
+                    ':e_val': current_time_s + active_session_ttl_seconds,
+                    ':limit': token_limit,
+                },
+                ReturnValues="ALL_NEW",
+            )
+            active_session = ActiveSession(**response['Attributes'])
+            self._cache_active_session(user_id, active_session)
+            return active_session
+        except ClientError as e:
+            self._cache_active_session(user_id, None)
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return None
+            print(f"Error touching active session: {e}")
+            raise
+
+    def rollover_active_session(self, user_id: str, session_id: str, current_time_s: int,
+                                active_session_ttl_seconds: int, token_limit: int) -> bool:
+        """
+        새 활성 세션과 세션 메타데이터를 하나의 트랜잭션으로 생성.
+        기존 세션은 토큰 한도를 넘었거나 만료된 경우에만 교체되며, 조건이 맞지 않으면 False 반환.
+        """
+        active_session_item = {
+            'user_id': user_id,
+            'session_id': session_id,
+            'created_at': current_time_s,
+            'updated_at': current_time_s,
+            'expired_at': current_time_s + active_session_ttl_seconds,
+            'token_usage': 0,
+        }
+        session_metadata_item = {
+            'user_id': user_id,
+            'session_id': session_id,
+            'created_at': current_time_s,
+            'session_summary': 'session not finished yet',  # 세션이 끝나지 않았으므로 초기값 설정
+        }
+        transact_items = [
+            {
+                'Put': {
+                    'TableName': self.active_session_table.name,
+                    'Item': active_session_item,
+                    # 세션이 없거나, 토큰 한도를 넘었거나, 만료된(TTL 삭제 전) 세션만 교체
+                    'ConditionExpression': (
+                        'attribute_not_exists(user_id) OR token_usage > :limit OR expired_at <= :now'
+                    ),
+                    'ExpressionAttributeValues': {':limit': token_limit, ':now': current_time_s},
+                }
+            },
+            {
+                'Put': {
+                    'TableName': self.session_metadata_table.name,
+                    'Item': session_metadata_item,
+                    'ConditionExpression': 'attribute_not_exists(session_id)',
+                }
+            },
+        ]
+        if settings.CONTEXT_SNAPSHOT_ENABLED:
+            # 최근 세션 목록이 바뀌므로 컨텍스트 스냅샷을 같은 트랜잭션에서 stale 로 표시
+            transact_items.append(self._context_snapshot_stale_update(user_id))
+        try:
+            # resource 의 client 는 파이썬 타입을 DynamoDB 타입으로 자동 변환
+            self.dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+            self._cache_active_session(user_id, ActiveSession(**active_session_item))
+            self._invalidate_session_metadata(user_id)
+            return True
+        except ClientError as e:
+            # 캐시가 오래되었을 수 있으므로 비우고, 이후 재시도는 DynamoDB 기준으로 판단 (safety mode)
+            self._cache_active_session(user_id, None)
+            # 조건 실패 또는 동시 트랜잭션 충돌: 다른 요청이 먼저 세션을 교체함
+            if e.response['Error']['Code'] == 'TransactionCanceledException':
+                print(f"Active session rollover for user {user_id} was cancelled: {e}")
+                return False
+            print(f"Error rolling over active session: {e}")
+            raise
+
     def update_active_session_token_usage(self, user_id: str, token_usage: int):
         """활성 세션의 토큰 사용량 갱신"""
         try:
-            self.active_session_table.update_item(
+            response = self.active_session_table.update_item(
                 Key={'user_id': user_id},
                 UpdateExpression="SET token_usage = token_usage + :t_val",
+                # 응답을 만드는 동안 세션이 만료되어 삭제되었으면 빈 아이템을 만들지 않음
+                ConditionExpression="attribute_exists(user_id)",
                 ExpressionAttributeValues={
                     ':t_val': token_usage
-                }
+                },
+                ReturnValues="ALL_NEW",
             )
+            self._cache_active_session(user_id, ActiveSession(**response['Attributes']))
         except ClientError as e:
+            self._cache_active_session(user_id, None)
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                print(f"Active session for user {user_id} already expired, token usage not recorded.")
+                return
             print(f"Error updating active session token usage: {e}")
             raise
 
@@ -95,10 +246,31 @@ class ChatRepository:
                 Key={'user_id': user_id},
                 ConditionExpression='attribute_exists(user_id)'  # user_id가 존재할 때만 삭제
             )
+            self._cache_active_session(user_id, None)
         except ClientError as e:
             print(f"Error removing active session: {e}")
             raise
 
+    def expire_active_session(self, user_id: str, session_id: str, current_time_s: int) -> Optional[ActiveSession]:
+        """
+        만료 시각이 지난 활성 세션을 삭제하고 삭제된 세션 반환.
+        그 사이 세션이 연장/교체되었으면 삭제하지 않고 None 반환.
+        """
+        try:
+            response = self.active_session_table.delete_item(
+                Key={'user_id': user_id},
+                ConditionExpression='session_id = :sid AND expired_at <= :now',
+                ExpressionAttributeValues={':sid': session_id, ':now': current_time_s},
+                ReturnValues='ALL_OLD',
+            )
+            self._cache_active_session(user_id, None)
+            return ActiveSession(**response['Attributes'])
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return None
+            print(f"Error expiring active session: {e}")
+            raise
+
     def create_session_metadata(self, user_id: str, session_id: str, created_at: int) -> SessionMetadata:
         """세션 메타데이터 생성"""
 
@@ -110,25 +282,121 @@ class ChatRepository:
         }
         try:
             self.session_metadata_table.put_item(Item=item)
+            self._invalidate_session_metadata(user_id)
             return SessionMetadata(**item)
         except ClientError as e:
             print(f"Error creating session metadata: {e}")
             raise
 
-    def get_current_session_metadata_by_user_id(self, user_id: str, limit: int) -> List[SessionMetadata]:
-        """사용자 ID로 세션 메타데이터 조회"""
+    def get_current_session_metadata_by_user_id(self, user_id: str, limit: int,
+                                                consistent_read: bool = False) -> List[SessionMetadata]:
+        """사용자 ID로 세션 메타데이터 조회 (consistent_read 이면 캐시를 거치지 않고 강한 일관성 읽기)"""
+        if self.session_metadata_cache is not None and not consistent_read:
+            cached = self.session_metadata_cache.get(user_id)
+            if cached is not None and cached[0] >= limit:
+                return cached[1][:limit]
         try:
             response = self.session_metadata_table.query(
                 KeyConditionExpression='user_id = :uid',
                 ExpressionAttributeValues={':uid': user_id},
                 Limit=limit,
-                ScanIndexForward=False  # 최신 세션이 먼저 오도록 정렬
+                ScanIndexForward=False,  # 최신 세션이 먼저 오도록 정렬
+                ConsistentRead=consistent_read,
             )
-            return [SessionMetadata(**item) for item in response.get('Items', [])]
+            session_metadata = [SessionMetadata(**item) for item in response.get('Items', [])]
+            if self.session_metadata_cache is not None:
+                self.session_metadata_cache.set(user_id, (limit, session_metadata))
+            return session_metadata
         except ClientError as e:
             print(f"Error getting sessions for user {user_id}: {e}")
             raise
 
+    def get_session_summary_items(self, user_id: str, max_sessions: int) -> List[Dict[str, Any]]:
+        """
+        최근 max_sessions 개 세션의 요약과 요약 임베딩 조회 (최신순, 장기 기억 검색 인덱스 용).
+        summary_embedding 은 float32 little-endian bytes 입니다.
+        """
+        items: List[Dict[str, Any]] = []
+        query_kwargs = {
+            'KeyConditionExpression': Key('user_id').eq(user_id),
+            'ProjectionExpression': 'session_id, created_at, finished_at, session_summary, '
+                                    'summary_embedding, summary_embedding_model',
+            'ScanIndexForward': False,
+        }
+        try:
+            while len(items) < max_sessions:
+                response = self.session_metadata_table.query(Limit=max_sessions - len(items), **query_kwargs)
+                items.extend(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except ClientError as e:
+            print(f"Error getting session summaries for user {user_id}: {e}")
+            raise
+        for item in items:
+            item['user_id'] = user_id
+            if 'summary_embedding' in item:
+                item['summary_embedding'] = item['summary_embedding'].value  # boto3 Binary -> bytes
+        return items
+
+    def _context_snapshot_stale_update(self, user_id: str) -> Dict[str, Any]:
+        """SessionMetadata 변경과 같은 트랜잭션에 넣어 컨텍스트 스냅샷을 stale 로 표시하는 Update"""
+        return {
+            'Update': {
+                'TableName': self.context_snapshot_table.name,
+                'Key': {'user_id': user_id},
+                'UpdateExpression': 'ADD metadata_version :one',
+                'ExpressionAttributeValues': {':one': 1},
+            }
+        }
+
+    def get_context_snapshot(self, user_id: str) -> Optional[ContextSnapshot]:
+        """사용자의 컨텍스트 스냅샷 조회 (GetItem 1회)"""
+        try:
+            response = self.context_snapshot_table.get_item(Key={'user_id': user_id})
+            item = response.get('Item')
+            return ContextSnapshot(**item) if item else None
+        except ClientError as e:
+            print(f"Error getting context snapshot for user {user_id}: {e}")
+            raise
+
+    def put_context_snapshot(self, user_id: str, summaries: List[SessionMetadata], window: int,
+                             summary_token_budget: int, metadata_version: int, current_time_s: int) -> bool:
+        """
+        metadata_version 시점에 읽은 summaries 로 스냅샷 갱신.
+        그 사이 SessionMetadata 가 바뀌었으면(metadata_version 증가) 쓰지 않고 False 반환.
+        """
+        try:
+            self.context_snapshot_table.update_item(
+                Key={'user_id': user_id},
+                UpdateExpression=(
+                    'SET summaries = :summaries, #window = :window, summary_token_budget = :budget, '
+                    'snapshot_version = :metadata_version, updated_at = :now, '
+                    'metadata_version = if_not_exists(metadata_version, :zero) '
+                    'ADD version :one'
+                ),
+                ConditionExpression=(
+                    '(attribute_not_exists(metadata_version) AND :metadata_version = :zero) '
+                    'OR metadata_version = :metadata_version'
+                ),
+                ExpressionAttributeNames={'#window': 'window'},  # window 는 DynamoDB 예약어
+                ExpressionAttributeValues={
+                    ':summaries': [summary.model_dump(exclude_none=True) for summary in summaries],
+                    ':window': window,
+                    ':budget': summary_token_budget,
+                    ':metadata_version': metadata_version,
+                    ':now': current_time_s,
+                    ':zero': 0,
+                    ':one': 1,
+                },
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            print(f"Error putting context snapshot for user {user_id}: {e}")
+            raise
+
     def put_message(self, message: Message) -> None:
         """메시지 저장"""
         try:
@@ -137,22 +405,222 @@ class ChatRepository:
             print(f"Error putting message: {e}")
             raise
 
-    def get_messages_of_user(self, user_id: str, cursor: str, limit: int) -> (List[Message], Optional[str]):
-        """세션 ID로 메시지 조회"""
+    def batch_put_messages(self, messages: List[Message]) -> List[Message]:
+        """
+        메시지 일괄 저장 (BatchWriteItem, 최대 25개).
+        처리되지 않은 메시지 목록을 반환합니다.
+        """
+        table_name = self.message_table.name
+        try:
+            response = self.dynamodb.batch_write_item(
+                RequestItems={
+                    table_name: [{'PutRequest': {'Item': message.model_dump()}} for message in messages]
+                }
+            )
+            unprocessed = response.get('UnprocessedItems', {}).get(table_name, [])
+            return [Message(**request['PutRequest']['Item']) for request in unprocessed]
+        except ClientError as e:
+            print(f"Error batch putting messages: {e}")
+            raise
+
+    def get_recent_messages_of_session(self, user_id: str, session_id: str, limit: int) -> List[Message]:
+        """세션의 최근 메시지를 시간순으로 조회 (최대 limit 개)"""
+        try:
+            response = self.message_table.query(
+                KeyConditionExpression=Key('user_id').eq(user_id) & Key('sort_key').begins_with(session_sort_key_prefix(session_id)),
+                Limit=limit,
+                ScanIndexForward=False  # 최신 메시지부터 limit 개
+            )
+            return [Message(**item) for item in reversed(response.get('Items', []))]
+        except ClientError as e:
+            print(f"Error getting recent messages for session {session_id}: {e}")
+            raise
+
+    def get_messages_of_user(self, user_id: str, cursor: str, limit: int, session_id: Optional[str] = None,
+                             start_time_s: Optional[int] = None,
+                             end_time_s: Optional[int] = None,
+                             max_query_pages: int = settings.HISTORY_MAX_QUERY_PAGES) -> Tuple[List[Message], Optional[str]]:
+        """
+        사용자의 메시지를 최신순으로 조회
+        session_id 가 주어지면 sort_key 범위 조건(begins_with / between)으로 해당 세션만 Query 합니다.
+        """
+        items, last_sort_key = self.get_message_items_of_user(
+            user_id, cursor, limit, session_id, start_time_s, end_time_s, max_query_pages
+        )
+        return [Message(**item) for item in items], last_sort_key
+
+    def get_message_items_of_user(self, user_id: str, cursor: str, limit: int, session_id: Optional[str] = None,
+                                  start_time_s: Optional[int] = None,
+                                  end_time_s: Optional[int] = None,
+                                  max_query_pages: int = settings.HISTORY_MAX_QUERY_PAGES
+                                  ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """get_messages_of_user 와 같지만 Message 모델로 검증하지 않은 DynamoDB 아이템을 그대로 반환"""
         try:
+            key_condition = Key('user_id').eq(user_id)
+            if session_id and (start_time_s is not None or end_time_s is not None):
+                lower, upper = sort_key_time_range(
+                    session_id,
+                    start_time_s if start_time_s is not None else 0,
+                    end_time_s if end_time_s is not None else MAX_EPOCH_SECONDS,
+                )
+                key_condition &= Key('sort_key').between(lower, upper)
+            elif session_id:
+                key_condition &= Key('sort_key').begins_with(session_sort_key_prefix(session_id))
+
             query_kwargs = {
-                'KeyConditionExpression': Key('user_id').eq(user_id),
-                'Limit': limit,
+                'KeyConditionExpression': key_condition,
                 'ScanIndexForward': False
             }
-            if cursor:
-                query_kwargs['ExclusiveStartKey'] = {'user_id': user_id, 'sort_key': cursor}
+            if not session_id and (start_time_s is not None or end_time_s is not None):
+                # 세션을 모르면 sort_key 로 시간 범위를 표현할 수 없으므로 created_at 필터로 처리
+                query_kwargs['FilterExpression'] = Attr('created_at').between(
+                    start_time_s if start_time_s is not None else 0,
+                    end_time_s if end_time_s is not None else MAX_EPOCH_SECONDS,
+                )
+
+            # 필터나 1MB 응답 제한으로 페이지가 덜 찼으면 limit 개가 모일 때까지 이어서 Query
+            res: List[Dict[str, Any]] = []
+            last_sort_key = cursor
+            for _ in range(max_query_pages):
+                query_kwargs['Limit'] = limit - len(res)
+                if last_sort_key:
+                    query_kwargs['ExclusiveStartKey'] = {'user_id': user_id, 'sort_key': last_sort_key}
+                response = self.message_table.query(**query_kwargs)
+                res.extend(response.get('Items', []))
+                last_evaluated_key = response.get('LastEvaluatedKey')
+                last_sort_key = last_evaluated_key['sort_key'] if last_evaluated_key else None
+                if not last_sort_key or len(res) >= limit:
+                    break
+            return res, last_sort_key
+        except ClientError as e:
+            print(f"Error getting messages for user {user_id}: {e}")
+            raise
+
+    def get_cached_response(self, cache_key: str) -> Optional[CachedResponse]:
+        """공유 응답 캐시 조회 (TTL 삭제 전의 만료된 아이템은 무시)"""
+        try:
+            response = self.response_cache_table.get_item(Key={'cache_key': cache_key})
+            item = response.get('Item')
+            if not item or item['expired_at'] <= int(time.time()):
+                return None
+            return CachedResponse(**item)
+        except ClientError as e:
+            print(f"Error getting cached response {cache_key}: {e}")
+            raise
+
+    def put_cached_response(self, cached_response: CachedResponse) -> None:
+        try:
+            self.response_cache_table.put_item(Item=cached_response.model_dump())
+        except ClientError as e:
+            print(f"Error putting cached response {cached_response.cache_key}: {e}")
+            raise
+
+    def get_user_token_usage(self, user_id: str) -> Dict[str, int]:
+        """사용자의 시간/일 단위 토큰 사용량 조회 (window -> tokens), TTL 로 오래된 window 는 정리됨"""
+        try:
+            current_time_s = int(time.time())
+            query_kwargs = {'KeyConditionExpression': Key('user_id').eq(user_id)}
+            usage: Dict[str, int] = {}
+            while True:
+                response = self.user_token_usage_table.query(**query_kwargs)
+                for item in response.get('Items', []):
+                    if item['expired_at'] > current_time_s:
+                        usage[item['window']] = int(item['tokens'])
+                if 'LastEvaluatedKey' not in response:
+                    return usage
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except ClientError as e:
+            print(f"Error getting token usage for user {user_id}: {e}")
+            raise
+
+    def add_user_token_usage(self, user_id: str, window: str, tokens: int, expired_at: int) -> None:
+        """window 의 토큰 사용량을 원자적으로 증가 (여러 워커가 동시에 호출해도 안전)"""
+        try:
+            self.user_token_usage_table.update_item(
+                Key={'user_id': user_id, 'window': window},
+                UpdateExpression='ADD tokens :tokens SET expired_at = :expired_at',
+                ExpressionAttributeValues={':tokens': tokens, ':expired_at': expired_at},
+            )
+        except ClientError as e:
+            print(f"Error adding token usage for user {user_id} ({window}): {e}")
+            raise
+
+    def acquire_idempotency_record(self, record: IdempotencyRecord, current_time_s: int) -> bool:
+        """
+        처리 중(in_progress) 기록 생성. 기록이 없거나, 만료되었거나, 처리하던 워커의 lease 가 끝난 경우에만 성공합니다.
+        """
+        try:
+            self.idempotency_table.put_item(
+                Item=record.model_dump(exclude_none=True),
+                ConditionExpression=(
+                    'attribute_not_exists(idempotency_key) OR expired_at < :now '
+                    'OR (#status = :in_progress AND lease_expires_at < :now)'
+                ),
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':now': current_time_s,
+                    ':in_progress': IdempotencyStatus.IN_PROGRESS.value,
+                },
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            print(f"Error acquiring idempotency record {record.idempotency_key}: {e}")
+            raise
+
+    def get_idempotency_record(self, idempotency_key: str) -> Optional[IdempotencyRecord]:
+        """idempotency 기록 조회 (만료된 기록은 없는 것으로 처리)"""
+        try:
+            response = self.idempotency_table.get_item(
+                Key={'idempotency_key': idempotency_key},
+                ConsistentRead=True,  # 방금 완료된 응답도 읽을 수 있도록
+            )
+            item = response.get('Item')
+            if not item or item['expired_at'] <= int(time.time()):
+                return None
+            return IdempotencyRecord(**item)
+        except ClientError as e:
+            print(f"Error getting idempotency record {idempotency_key}: {e}")
+            raise
 
-            response = self.message_table.query(**query_kwargs)
-            items = response.get('Items', [])
-            last_evaluated_key = response.get('LastEvaluatedKey')
-            res = [Message(**item) for item in items]
-            return res, last_evaluated_key['sort_key'] if last_evaluated_key else None
+    def complete_idempotency_record(self, idempotency_key: str, owner_id: str, response_content: str,
+                                    response_session_id: str, expired_at: int) -> None:
+        """처리 결과 저장. lease 가 만료되어 다른 요청이 가져간 경우에는 덮어쓰지 않음"""
+        try:
+            self.idempotency_table.update_item(
+                Key={'idempotency_key': idempotency_key},
+                UpdateExpression=(
+                    'SET #status = :completed, response_content = :content, '
+                    'response_session_id = :session_id, expired_at = :expired_at'
+                ),
+                ConditionExpression='owner_id = :owner_id',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':completed': IdempotencyStatus.COMPLETED.value,
+                    ':content': response_content,
+                    ':session_id': response_session_id,
+                    ':expired_at': expired_at,
+                    ':owner_id': owner_id,
+                },
+            )
         except ClientError as e:
-            print(f"Error getting messages for session {user_id}: {e}")
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                print(f"Idempotency record {idempotency_key} is owned by another request.")
+                return
+            print(f"Error completing idempotency record {idempotency_key}: {e}")
+            raise
+
+    def delete_idempotency_record(self, idempotency_key: str, owner_id: str) -> None:
+        """처리 실패 시 기록을 지워 재시도가 가능하도록 함 (자신이 만든 기록만)"""
+        try:
+            self.idempotency_table.delete_item(
+                Key={'idempotency_key': idempotency_key},
+                ConditionExpression='owner_id = :owner_id',
+                ExpressionAttributeValues={':owner_id': owner_id},
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return
+            print(f"Error deleting idempotency record {idempotency_key}: {e}")
             raise
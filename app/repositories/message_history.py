@@ -0,0 +1,100 @@
+from typing import List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, message_chunk_to_message
+
+from app.core.config import settings
+from app.core.telemetry import stage
+from app.core.message_key import make_message_sort_key, message_key_generator
+from app.core.tokenizer import count_tokens
+from app.models.entity import Message, SenderType
+from app.repositories.async_chat_repository import AsyncChatRepository
+
+
+def to_langchain_message(message: Message) -> BaseMessage:
+    """Message 엔티티를 LangChain 메시지로 변환 (저장된 토큰 수는 response_metadata 로 전달)"""
+    response_metadata = {'token_count': message.token_count} if message.token_count is not None else {}
+    if message.sender_type == SenderType.AI.value:
+        return AIMessage(content=message.content, response_metadata=response_metadata)
+    return HumanMessage(content=message.content, response_metadata=response_metadata)
+
+
+class MessageTableChatHistory(BaseChatMessageHistory):
+    """
+    Message 테이블(user_id / sort_key = session_id#message_id)을 저장소로 사용하는 대화 기록.
+    메시지마다 아이템 하나를 추가(append-only)하고, 조회 시에는 최근 window 개의 메시지만 Query 합니다.
+    preloaded_messages 가 주어지면 (같은 턴에서 이미 읽은 기록) Query 하지 않고 그대로 반환합니다.
+    """
+
+    def __init__(self, chat_repo: AsyncChatRepository, user_id: str, session_id: str,
+                 window: int = settings.GET_MESSAGE_HISTORY_WINDOW,
+                 preloaded_messages: Optional[List[BaseMessage]] = None):
+        self.chat_repo = chat_repo
+        self.user_id = user_id
+        self.session_id = session_id
+        self.window = window
+        self.preloaded_messages = preloaded_messages
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        if self.preloaded_messages is not None:
+            return list(self.preloaded_messages)
+        recent = self.chat_repo.repo.get_recent_messages_of_session(self.user_id, self.session_id, self.window)
+        return [to_langchain_message(message) for message in self._with_pending(recent)]
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        if self.preloaded_messages is not None:
+            return list(self.preloaded_messages)
+        with stage("history.load"):
+            recent = await self.chat_repo.get_recent_messages_of_session(self.user_id, self.session_id, self.window)
+            return [to_langchain_message(message) for message in self._with_pending(recent)]
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        for message in self._to_entities(messages):
+            self.chat_repo.repo.put_message(message)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with stage("history.save"):
+            for message in self._to_entities(messages):
+                await self.chat_repo.put_message(message)
+
+    def clear(self) -> None:
+        """
+        아무것도 하지 않음. Message 테이블은 영구 기록이므로 대화 기록 초기화로 삭제하지 않으며,
+        세션을 새로 시작하려면 새 session_id 를 사용합니다.
+        """
+        print(f"Ignoring clear() for session {self.session_id}: messages are permanent records.")
+
+    def _with_pending(self, recent: List[Message]) -> List[Message]:
+        """write-behind 버퍼에 아직 남아 있는 메시지까지 포함하여 최근 window 개를 반환"""
+        if not self.chat_repo.message_writer:
+            return recent
+        stored_keys = {message.sort_key for message in recent}
+        pending = [
+            message for message in self.chat_repo.message_writer.pending_messages(self.user_id, self.session_id)
+            if message.sort_key not in stored_keys
+        ]
+        merged = sorted(recent + pending, key=lambda message: message.sort_key)
+        return merged[-self.window:]
+
+    def _to_entities(self, messages: Sequence[BaseMessage]) -> List[Message]:
+        entities = []
+        for message in messages:
+            # 스트리밍 응답은 AIMessageChunk(type="AIMessageChunk")로 전달되므로 일반 메시지로 변환
+            message = message_chunk_to_message(message)
+            if message.type not in (SenderType.HUMAN.value, SenderType.AI.value):
+                continue
+            # 메시지마다 단조 증가하는 ID 를 부여하므로 같은 초에 저장되어도 덮어쓰지 않음
+            created_at_ms, message_id = message_key_generator.next_id()
+            entities.append(
+                Message(
+                    user_id=self.user_id,
+                    sort_key=make_message_sort_key(self.session_id, message_id),
+                    session_id=self.session_id,
+                    created_at=created_at_ms // 1000,
+                    sender_type=message.type,
+                    content=message.content,
+                    token_count=count_tokens(message.content),
+                )
+            )
+        return entities
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import Executor
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.telemetry import observe, register_metrics, run_in_executor
+from app.models.entity import Message
+from app.repositories.chat_repository import ChatRepository
+
+logger = logging.getLogger(__name__)
+
+# DynamoDB BatchWriteItem 한 번에 쓸 수 있는 최대 아이템 수
+BATCH_WRITE_MAX_ITEMS = 25
+
+
+class MessageWriterMetrics(BaseModel):
+    queue_depth: int
+    flushed_batches: int  # 모든 아이템을 저장한 배치 수
+    failed_batches: int  # 재시도 후에도 저장하지 못한 아이템이 남은 배치 수
+    flushed_items: int
+    retried_items: int
+    failed_items: int  # 재시도 후에도 저장하지 못해 버퍼로 되돌린 아이템 수 (다음 flush 에서 다시 시도)
+    dropped_items: int  # 종료 시 끝내 저장하지 못해 유실된 아이템 수
+    last_flush_latency_ms: float
+    max_flush_latency_ms: float
+
+
+class MessageWriter:
+    """
+    Message 엔티티를 버퍼링했다가 BatchWriteItem 으로 모아서 저장하는 write-behind 컴포넌트.
+    버퍼가 배치 크기에 도달하거나, flush 주기가 지나거나, 종료(stop) 시 flush 합니다.
+    처리되지 않은(UnprocessedItems) 아이템은 지수 백오프로 재시도하고, 재시도 후에도 남은 아이템은 버퍼 뒤로,
+    쓰는 도중 취소된 아이템은 버퍼 앞으로 되돌려 다음 flush 에서 다시 저장합니다.
+    """
+
+    def __init__(
+            self,
+            repo: ChatRepository,
+            executor: Executor,
+            max_batch_size: int = BATCH_WRITE_MAX_ITEMS,
+            flush_interval_s: float = settings.MESSAGE_WRITER_FLUSH_INTERVAL_SECONDS,
+            max_queue_size: int = settings.MESSAGE_WRITER_MAX_QUEUE_SIZE,
+            max_retries: int = settings.MESSAGE_WRITER_MAX_RETRIES,
+            retry_backoff_base_s: float = settings.MESSAGE_WRITER_RETRY_BACKOFF_SECONDS,
+    ):
+        self.repo = repo
+        self.executor = executor
+        self.max_batch_size = min(max_batch_size, BATCH_WRITE_MAX_ITEMS)
+        self.flush_interval_s = flush_interval_s
+        self.max_queue_size = max_queue_size
+        self.max_retries = max_retries
+        self.retry_backoff_base_s = retry_backoff_base_s
+
+        self._buffer: List[Message] = []
+        self._in_flight: List[Message] = []
+        self._flush_lock = asyncio.Lock()
+        self._batch_ready = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+        self._flushed_batches = 0
+        self._failed_batches = 0
+        self._flushed_items = 0
+        self._retried_items = 0
+        self._failed_items = 0
+        self._dropped_items = 0
+        self._last_flush_latency_ms = 0.0
+        self._max_flush_latency_ms = 0.0
+        register_metrics("message_writer", self.metrics)
+
+    def start(self) -> None:
+        """백그라운드 flush 루프 시작"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        flush 루프가 진행 중인 배치(재시도 대기 포함)를 마치고 멈추게 한 뒤 남은 메시지를 모두 저장 (graceful shutdown).
+        그래도 저장하지 못한 메시지는 유실로 기록합니다.
+        """
+        self._stopping = True
+        self._batch_ready.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._buffer:
+            self._dropped_items += len(self._buffer)
+            logger.error(f"Dropped {len(self._buffer)} unsaved messages on shutdown.")
+            self._buffer = []
+
+    async def put(self, message: Message) -> None:
+        """메시지를 버퍼에 추가. 버퍼가 가득 찬 경우에만 flush 를 기다립니다."""
+        self._buffer.append(message)
+        if len(self._buffer) >= self.max_batch_size:
+            self._batch_ready.set()
+        if len(self._buffer) >= self.max_queue_size:
+            # 백프레셔: DynamoDB 가 따라오지 못하면 호출자를 잠시 기다리게 함
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        flush 시작 시점에 버퍼에 있던 메시지를 모두 저장.
+        재시도 후에도 저장하지 못한 메시지는 버퍼 뒤로 되돌려 다음 flush 에서 다시 시도합니다.
+        (앞으로 되돌리면 저장할 수 없는 메시지 하나가 뒤의 메시지를 모두 막음)
+        """
+        async with self._flush_lock:
+            remaining = len(self._buffer)
+            while remaining > 0 and self._buffer:
+                batch = self._buffer[:min(self.max_batch_size, remaining)]
+                del self._buffer[:len(batch)]
+                remaining -= len(batch)
+                self._in_flight = batch
+                try:
+                    unsaved = await self._write_batch(batch)
+                except BaseException:
+                    # 취소 등: 저장이 확인되지 않은 메시지를 버리지 않고 버퍼로 되돌림 (같은 키로 다시 쓰므로 중복 저장되지 않음)
+                    self._buffer[:0] = self._in_flight
+                    raise
+                finally:
+                    self._in_flight = []
+                self._buffer.extend(unsaved)
+
+    def pending_messages(self, user_id: str, session_id: str) -> List[Message]:
+        """아직 저장되지 않은 해당 세션의 메시지 (read-your-writes 용)"""
+        return [
+            message for message in self._in_flight + self._buffer
+            if message.user_id == user_id and message.session_id == session_id
+        ]
+
+    def metrics(self) -> MessageWriterMetrics:
+        return MessageWriterMetrics(
+            queue_depth=len(self._buffer),
+            flushed_batches=self._flushed_batches,
+            failed_batches=self._failed_batches,
+            flushed_items=self._flushed_items,
+            retried_items=self._retried_items,
+            failed_items=self._failed_items,
+            dropped_items=self._dropped_items,
+            last_flush_latency_ms=self._last_flush_latency_ms,
+            max_flush_latency_ms=self._max_flush_latency_ms,
+        )
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                break  # 남은 메시지는 stop 이 flush
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # 루프가 죽으면 이후 메시지가 저장되지 않으므로 에러만 기록하고 계속 진행
+                print(f"Error flushing message batch: {e}")
+
+    async def _write_batch(self, batch: List[Message]) -> List[Message]:
+        """배치를 저장하고, 재시도 후에도 저장하지 못한 메시지를 반환"""
+        started_at = time.perf_counter()
+        # BatchWriteItem 은 같은 키가 중복되면 배치 전체를 거부하므로, PutItem 을 순서대로 호출한 것과 같이 마지막 값만 남김
+        batch = list({(message.user_id, message.sort_key): message for message in batch}.values())
+        pending = self._in_flight = batch
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self._retried_items += len(pending)
+                # full jitter 지수 백오프
+                await asyncio.sleep(random.uniform(0, self.retry_backoff_base_s * (2 ** (attempt - 1))))
+            try:
+                pending = await run_in_executor(
+                    self.executor, "dynamodb.batch_put_messages", self.repo.batch_put_messages, pending
+                )
+            except Exception as e:
+                print(f"Error writing message batch (attempt {attempt + 1}): {e}")
+                continue
+            self._in_flight = pending
+            if not pending:
+                break
+
+        self._flushed_items += len(batch) - len(pending)
+        latency_s = time.perf_counter() - started_at
+        observe("message_writer.flush", latency_s, "ok" if not pending else "error")
+        self._last_flush_latency_ms = latency_s * 1000
+        self._max_flush_latency_ms = max(self._max_flush_latency_ms, latency_s * 1000)
+
+        if not pending:
+            self._flushed_batches += 1
+        else:
+            self._failed_batches += 1
+            self._failed_items += len(pending)
+            logger.warning(f"Failed to write {len(pending)} messages after {self.max_retries} retries, re-queued.")
+        return pending
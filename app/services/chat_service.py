@@ -1,154 +1,539 @@
+import asyncio
 import time
-import boto3  # AWS SDK - 표준 라이브러리는 아니지만 매우 일반적이고 널리 사용됨
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Hashable, List, Optional, Tuple
 
 from uuid_extensions import uuid7  # 외부 라이브러리
-from langchain_community.chat_message_histories import (  # 외부 라이브러리
-    DynamoDBChatMessageHistory,
-)
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder  # 외부 라이브러리
-from langchain_core.runnables.history import RunnableWithMessageHistory  # 외부 라이브러리
-from langchain_openai import ChatOpenAI  # 외부 라이브러리
-
-from app.repositories.chat_repository import ChatRepository  # 내부 모듈
+
+from app.repositories.async_chat_repository import AsyncChatRepository  # 내부 모듈
+from app.core.cache import TTLCache  # 내부 모듈
 from app.core.config import settings  # 내부 모듈
-from app.models.entity import Message, SenderType  # 내부 모듈
+from app.core.cursor import InvalidCursorError, decode_cursor, encode_cursor  # 내부 모듈
+from app.core.telemetry import observe, record_llm_usage, set_attributes, stage  # 내부 모듈
+from app.services.context_builder import ContextBuilder  # 내부 모듈
+from app.services.context_snapshot import ContextSnapshotService  # 내부 모듈
+from app.services.idempotency_service import IdempotencyService  # 내부 모듈
+from app.services.llm_guard import LLMGuard  # 내부 모듈
+from app.services.memory_retrieval import MemoryRetrievalService  # 내부 모듈
+from app.services.quota_service import QuotaService  # 내부 모듈
+from app.services.response_cache import ResponseCache, ResponseCacheKey  # 내부 모듈
+from app.services.session_expiry_scheduler import SessionExpiryScheduler  # 내부 모듈
+from app.models.entity import CachedResponse, SessionMetadata
 from app.models.request import SendMessageRequest
-from app.models.response import ChatHistoryResponse, ChatMessageResponse, MessageResponse
+from app.models.response import ChatHistoryResponse, ChatMessageResponse, ChatStreamEvent, MessageResponse
+
+if TYPE_CHECKING:
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import Runnable
+    from langchain_core.runnables.history import RunnableWithMessageHistory
+    from langchain_openai import ChatOpenAI
+    from app.repositories.message_history import MessageTableChatHistory
+
+# LangChain / OpenAI 관련 모듈은 import 비용이 커서, /history 처럼 LLM 을 쓰지 않는 경로가
+# 그 비용을 내지 않도록 체인을 처음 만들 때 import 합니다.
+
+CHAT_MODEL_NAME = "gpt-4o-mini"
+SYSTEM_PROMPT = "You are a helpful assistant.{summaries}"
+
+context_builder = ContextBuilder()
+# 프로세스(워커)의 모든 요청이 공유하는 LLM 호출 보호 계층 (동시성 제한, 타임아웃, 회로 차단, hedge)
+llm_guard: Optional[LLMGuard] = LLMGuard() if settings.LLM_GUARD_ENABLED else None
+
+
+@lru_cache(maxsize=1)
+def get_prompt() -> "ChatPromptTemplate":
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder  # 외부 라이브러리
+
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", SYSTEM_PROMPT),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", "{question}"),
+        ]
+    )
+
+
+def build_chat_model() -> "ChatOpenAI":
+    """
+    프로세스 당 하나의 ChatOpenAI 클라이언트 생성.
+    HTTP 커넥션 풀을 명시적으로 만들어 모든 요청이 재사용하도록 합니다.
+    """
+    import httpx  # langchain_openai 의존성
+    from langchain_openai import ChatOpenAI  # 외부 라이브러리
 
-dynamodb = boto3.resource("dynamodb")
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", "You are a helpful assistant."),
-        MessagesPlaceholder(variable_name="history"),
-        ("human", "{question}"),
-    ]
-)
+    limits = httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    )
+    return ChatOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        model=CHAT_MODEL_NAME,
+        temperature=0.7,
+        stream_usage=True,  # 스트리밍 시에도 마지막 청크에 usage_metadata 포함
+        http_client=httpx.Client(limits=limits),
+        http_async_client=httpx.AsyncClient(limits=limits),
+    )
 
-chain = prompt | ChatOpenAI(api_key=settings.OPENAI_API_KEY, model="gpt-4o-mini", temperature=0.7)
+
+@lru_cache(maxsize=1)
+def get_chain() -> "Runnable":
+    """저장소에서 읽은 대화 기록과 세션 요약을 토큰 예산에 맞게 줄인 뒤 프롬프트로 전달하는 체인"""
+    from langchain_core.runnables import RunnableLambda  # 외부 라이브러리
+
+    chat_model = build_chat_model()
+    if llm_guard is not None:
+        from app.services.guarded_chat_model import GuardedChatModel  # 내부 모듈
+        chat_model = GuardedChatModel(chat_model, llm_guard)
+    return RunnableLambda(context_builder.build_prompt_input) | get_prompt() | chat_model
+
+
+@lru_cache(maxsize=1)
+def get_chain_with_history(chat_repo: AsyncChatRepository) -> "RunnableWithMessageHistory":
+    """
+    프로세스 당 한 번만 생성되는 대화 기록 포함 체인.
+    대화 기록은 Message 테이블에 메시지 단위로 저장되며, config 의 user_id / session_id 로 찾습니다.
+    config 의 preloaded_messages 에 이번 턴에서 이미 읽은 대화 기록이 있으면 다시 Query 하지 않고 사용합니다.
+    """
+    from langchain_core.runnables import ConfigurableFieldSpec  # 외부 라이브러리
+    from langchain_core.runnables.history import RunnableWithMessageHistory  # 외부 라이브러리
+    from app.repositories.message_history import MessageTableChatHistory  # 내부 모듈
+
+    return RunnableWithMessageHistory(
+        get_chain(),
+        lambda user_id, session_id, preloaded_messages: MessageTableChatHistory(
+            chat_repo, user_id, session_id, preloaded_messages=preloaded_messages
+        ),
+        input_messages_key="question",
+        history_messages_key="history",
+        history_factory_config=[
+            ConfigurableFieldSpec(id="user_id", annotation=str, is_shared=True),
+            ConfigurableFieldSpec(id="session_id", annotation=str, is_shared=True),
+            ConfigurableFieldSpec(id="preloaded_messages", annotation=Optional[list], default=None, is_shared=True),
+        ],
+    )
+
+
+def warm_up_chain(chat_repo: AsyncChatRepository) -> None:
+    """
+    앱 시작 시 호출하여 LangChain 의 지연 초기화 비용을 첫 요청 전에 미리 지불합니다.
+    LLM 호출은 하지 않고 체인 생성, 프롬프트 포맷팅, 히스토리 팩토리 생성까지만 수행합니다.
+    """
+    get_chain_with_history(chat_repo)
+    get_prompt().invoke(context_builder.build_prompt_input({"question": "warm-up", "history": [], "summaries": []}))
 
 
 class ChatService:
-    def __init__(self, chat_repo: ChatRepository):
+    def __init__(self, chat_repo: AsyncChatRepository,
+                 chain_with_history: Optional["RunnableWithMessageHistory"] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 quota_service: Optional[QuotaService] = None,
+                 idempotency_service: Optional[IdempotencyService] = None,
+                 session_expiry_scheduler: Optional[SessionExpiryScheduler] = None,
+                 context_snapshot_service: Optional[ContextSnapshotService] = None,
+                 memory_retrieval_service: Optional[MemoryRetrievalService] = None):
         self.chat_repo = chat_repo
         self.active_session_ttl_seconds = settings.ACTIVE_SESSION_TTL_SECONDS
         self.token_limit_per_session = settings.TOKEN_LIMIT_PER_SESSION
-        self.chain_with_history = RunnableWithMessageHistory(
-            chain,
-            lambda sid: DynamoDBChatMessageHistory(
-                table_name=settings.DYNAMODB_LANGCHAIN_TABLE, session_id=sid, primary_key_name="session_id"
-            ),
-            input_messages_key="question",
-            history_messages_key="history",
+        self._chain_with_history = chain_with_history
+        # /history 다음 페이지 prefetch 결과와 진행 중인 prefetch 작업
+        self.history_prefetch_cache: TTLCache[Tuple[List[Dict[str, Any]], Optional[str]]] = TTLCache(
+            settings.HISTORY_PREFETCH_MAX_PAGES, settings.HISTORY_PREFETCH_TTL_SECONDS, name="history_prefetch"
         )
+        self._history_prefetches: Dict[Hashable, asyncio.Task] = {}
+        if response_cache is None and settings.RESPONSE_CACHE_ENABLED:
+            # 모델이나 시스템 프롬프트가 바뀌면 이전 응답을 재사용하지 않도록 namespace 에 포함
+            response_cache = ResponseCache(
+                namespace=f"{CHAT_MODEL_NAME}|{SYSTEM_PROMPT}",
+                chat_repo=chat_repo if settings.RESPONSE_CACHE_SHARED_ENABLED else None,
+            )
+        self.response_cache = response_cache
+        # 사용자별 토큰 한도 (None 이면 검사하지 않음, 시작/종료는 app lifespan 에서 관리)
+        self.quota_service = quota_service
+        # 같은 사용자의 중복 요청(재시도, 더블 클릭)을 한 번만 처리
+        self.idempotency_service = idempotency_service or IdempotencyService(chat_repo)
+        # 만료된 활성 세션을 TTL 삭제 전에 닫는 타이머 (None 이면 TTL 에 맡김, 시작/종료는 app lifespan 에서 관리)
+        self.session_expiry_scheduler = session_expiry_scheduler
+        # 세션 요약을 SessionMetadata Query 대신 사용자별 스냅샷 GetItem 으로 조회 (None 이면 Query)
+        if context_snapshot_service is None and settings.CONTEXT_SNAPSHOT_ENABLED:
+            context_snapshot_service = ContextSnapshotService(chat_repo)
+        self.context_snapshot_service = context_snapshot_service
+        # 최근 세션 요약 대신(또는 shadow 로 비교하며) 질문과 관련된 세션 요약을 검색 (None 이면 최근 요약만 사용)
+        if memory_retrieval_service is None and settings.LONG_TERM_MEMORY_MODE != "recency":
+            memory_retrieval_service = MemoryRetrievalService(chat_repo)
+        self.memory_retrieval_service = memory_retrieval_service
+
+    @property
+    def chain_with_history(self) -> "RunnableWithMessageHistory":
+        # LLM 을 처음 사용할 때 체인 생성 (warm-up 이 켜져 있으면 앱 시작 시 이미 생성됨)
+        if self._chain_with_history is None:
+            self._chain_with_history = get_chain_with_history(self.chat_repo)
+        return self._chain_with_history
 
     async def upsert_active_session(self, user_id: str, current_time_s: int) -> str:
         """
         사용자의 활성 세션을 가져오거나 새로 생성합니다.
+        토큰 한도와 만료 여부 검사는 DynamoDB 조건식에서 수행되므로 동시 요청에도 안전합니다.
+        (TTL 삭제 전의 만료된 세션은 연장하지 않고 새 세션으로 교체)
         """
-        active_session = self.chat_repo.get_active_session(user_id)
-
-        if active_session and active_session.token_usage <= self.token_limit_per_session:  # 이미 활성 세션이 있는 경우
-            self.chat_repo.update_active_session_ttl(
-                user_id, active_session.session_id,
-                current_time_s,
-                self.active_session_ttl_seconds
+        for _ in range(settings.ACTIVE_SESSION_UPSERT_MAX_ATTEMPTS):
+            # 일반 경로: 한도 이내의 활성 세션 TTL 갱신 (1 round trip)
+            active_session = await self.chat_repo.touch_active_session(
+                user_id, current_time_s, self.active_session_ttl_seconds, self.token_limit_per_session
             )
-            print(f"Existing active session found for user {user_id}: {active_session.session_id}")
-            print(active_session.token_usage, self.token_limit_per_session)
-            return active_session.session_id
-
-        if active_session and active_session.token_usage >= self.token_limit_per_session:
-            print(f"Active session for user {user_id} has reached token usage limit.")
-            self.chat_repo.remove_active_session(user_id)
-
-        new_session_id = str(uuid7())
-        self.chat_repo.create_active_session(
-            user_id,
-            new_session_id,
-            current_time_s,
-            self.active_session_ttl_seconds,
-        )
+            if active_session:
+                print(f"Existing active session found for user {user_id}: {active_session.session_id}")
+                self._schedule_session_expiry(user_id, active_session.session_id, active_session.expired_at)
+                return active_session.session_id
 
-        # Session Metadata도 함께 생성
-        self.chat_repo.create_session_metadata(user_id, new_session_id, current_time_s)
-        print(f"New active session created for user {user_id}: {new_session_id}")
-        return new_session_id
+            # 세션이 없거나 토큰 한도 초과: 새 세션과 Session Metadata 를 하나의 트랜잭션으로 생성
+            new_session_id = str(uuid7())
+            if await self.chat_repo.rollover_active_session(
+                    user_id, new_session_id, current_time_s, self.active_session_ttl_seconds,
+                    self.token_limit_per_session,
+            ):
+                print(f"New active session created for user {user_id}: {new_session_id}")
+                self._schedule_session_expiry(
+                    user_id, new_session_id, current_time_s + self.active_session_ttl_seconds
+                )
+                return new_session_id
 
-    async def handle_user_message(self, request: SendMessageRequest) -> ChatMessageResponse:
+            # 다른 요청이 먼저 새 세션을 만든 경우: 다시 TTL 갱신 경로로 재시도
+            print(f"Concurrent session rollover detected for user {user_id}, retrying.")
+
+        raise RuntimeError(f"Failed to upsert active session for user {user_id}")
+
+    def _schedule_session_expiry(self, user_id: str, session_id: str, expired_at: int) -> None:
+        if self.session_expiry_scheduler:
+            self.session_expiry_scheduler.schedule(user_id, session_id, expired_at)
+
+    async def _prepare_turn(self, request: SendMessageRequest,
+                            check_quota: bool = True) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
         """
-        사용자 메시지를 처리하고, AI 응답을 생성하며, 메시지를 저장합니다.
+        LLM 호출 전 단계: 활성 세션 확보, 세션 요약 조회.
+        (session_id, chain 입력, chain config) 를 반환합니다.
+        호출자가 이미 한도를 검사했으면 check_quota=False 로 다시 조회하지 않습니다.
         """
-        # 0. 유저별 토큰 상태 체크
-        # TODO(window9u): 유저별 토큰 사용량 체크 로직 추가, Relation Database 사용
+        # 0. 유저별 토큰 한도 체크: 초과 시 세션/LLM 작업 전에 QuotaExceededError
+        if check_quota:
+            with stage("quota.check"):
+                await self.check_user_quota(request.user_id)
+        # LLM 회로가 열려 있으면 세션 생성/연장 전에 바로 LLMUnavailableError
+        self.check_llm_available()
 
-        # 1. 사용자의 활성 세션을 가져오거나 새로 생성
+        # 1. 사용자의 활성 세션 확보와 세션 요약 조회는 서로 독립적이므로 동시에 수행
+        #    (사용자/AI 메시지는 LLM 응답 후 대화 기록(MessageTableChatHistory)이 함께 저장)
         current_time_s = int(time.time())
 
-        session_id = await self.upsert_active_session(request.user_id, current_time_s)
-
-        self.chat_repo.put_message(
-            Message(
-                user_id=request.user_id,
-                sort_key=f"{session_id}#{current_time_s}",
-                session_id=session_id,
-                content=request.content,
-                sender_type=SenderType.HUMAN,
-                created_at=current_time_s,
+        with stage("turn.prepare"):
+            session_id, session_summaries = await asyncio.gather(
+                self.upsert_active_session(request.user_id, current_time_s),
+                self.get_session_summaries(request.user_id, request.content),
             )
-        )
 
-        config = {"configurable": {"session_id": session_id}}
-        llm_response = self.chain_with_history.invoke(
-            input={
-                "question": request.content,
-                "history": self.chat_repo.get_current_session_metadata_by_user_id(
-                    request.user_id,
-                    settings.SESSION_SUMMARY_WINDOW  # 항상 최신 SESSION_SUMMARY_WINDOW 개의 세션 요약을 가져옴
-                )
-            },
-            config=config
+        chain_input = {
+            "question": request.content,
+            "summaries": session_summaries
+        }
+        # preloaded_messages 는 응답 캐시 조회에서 대화 기록을 읽으면 채워짐 (체인이 같은 기록을 다시 Query 하지 않도록)
+        config = {"configurable": {"user_id": request.user_id, "session_id": session_id, "preloaded_messages": None}}
+        return session_id, chain_input, config
+
+    async def get_session_summaries(self, user_id: str, question: Optional[str] = None) -> List[SessionMetadata]:
+        """
+        프롬프트에 넣을 이전 세션 요약.
+        검색 모드이고 질문이 있으면 질문과 관련된 요약, 아니면 최신 SESSION_SUMMARY_WINDOW 개의 요약.
+        shadow 모드는 최신 요약을 사용하고 검색 결과는 지표로만 비교합니다.
+        """
+        retrieval = self.memory_retrieval_service
+        if retrieval is None or question is None:
+            return await self.get_recent_session_summaries(user_id)
+
+        if retrieval.mode == "retrieval":
+            try:
+                return await retrieval.retrieve(user_id, question)
+            except Exception as e:
+                # 검색에 실패하면 이전 방식(최근 요약)으로 진행
+                print(f"Error retrieving session summaries for user {user_id}: {e}")
+                return await self.get_recent_session_summaries(user_id)
+
+        recent, retrieved = await asyncio.gather(
+            self.get_recent_session_summaries(user_id),
+            retrieval.retrieve(user_id, question),
+            return_exceptions=True,
         )
+        if isinstance(recent, BaseException):
+            raise recent
+        if isinstance(retrieved, BaseException):
+            print(f"Error retrieving session summaries for user {user_id}: {retrieved}")
+        else:
+            retrieval.compare_with_recency(recent, retrieved)
+        return recent
 
-        ai_response_time_s = int(time.time()) + 1  # AI 응답 시간은 현재 시간 + 1초로 설정
-        self.chat_repo.put_message(
-            Message(
-                user_id=request.user_id,
-                sort_key=f"{session_id}#{ai_response_time_s}",
-                session_id=session_id,
-                content=llm_response.content,
-                sender_type=SenderType.AI,
-                created_at=ai_response_time_s,
+    async def get_recent_session_summaries(self, user_id: str) -> List[SessionMetadata]:
+        """항상 최신 SESSION_SUMMARY_WINDOW 개의 세션 요약을 가져옴"""
+        with stage("memory.recency"):  # memory.retrieve 와 지연 시간 비교용
+            if self.context_snapshot_service:
+                return await self.context_snapshot_service.get_session_summaries(user_id)
+            return await self.chat_repo.get_current_session_metadata_by_user_id(
+                user_id, settings.SESSION_SUMMARY_WINDOW
             )
+
+    async def check_user_quota(self, user_id: str) -> None:
+        """사용자 토큰 한도 초과 시 QuotaExceededError"""
+        if self.quota_service:
+            await self.quota_service.check(user_id)
+
+    def check_llm_available(self) -> None:
+        """LLM 회로가 열려 있으면 LLMUnavailableError"""
+        if llm_guard is not None:
+            llm_guard.check()
+
+    async def _complete_turn(self, user_id: str, total_tokens: int) -> None:
+        """
+        LLM 응답 이후 단계: 세션 토큰 사용량과 사용자 토큰 사용량 갱신.
+        """
+        with stage("turn.complete"):
+            await self.chat_repo.update_active_session_token_usage(user_id, total_tokens)
+        if self.quota_service:
+            self.quota_service.record(user_id, total_tokens)
+
+    def _message_history(self, user_id: str, session_id: str) -> "MessageTableChatHistory":
+        from app.repositories.message_history import MessageTableChatHistory  # 내부 모듈
+
+        return MessageTableChatHistory(self.chat_repo, user_id, session_id)
+
+    async def _lookup_response_cache(
+            self, request: SendMessageRequest, session_id: str, chain_input: Dict[str, Any], config: Dict[str, Any]
+    ) -> Tuple[Optional[ResponseCacheKey], Optional[CachedResponse]]:
+        """
+        응답 캐시가 켜져 있으면 현재 컨텍스트(세션 요약 + 최근 대화)로 캐시 키를 만들어 조회.
+        읽은 대화 기록은 config 에 담아, 캐시 미스로 LLM 을 호출할 때 체인이 다시 Query 하지 않도록 합니다.
+        """
+        if not self.response_cache:
+            return None, None
+        history = await self._message_history(request.user_id, session_id).aget_messages()
+        config["configurable"]["preloaded_messages"] = history
+        cache_key = self.response_cache.make_key(request.content, chain_input["summaries"], history)
+        try:
+            with stage("response_cache.lookup") as span:
+                cached_response = await self.response_cache.get(cache_key)
+                set_attributes(span, **{"response_cache.hit": cached_response is not None})
+            return cache_key, cached_response
+        except Exception as e:
+            # 캐시 장애는 응답 실패로 이어지지 않도록 LLM 호출로 진행
+            print(f"Error looking up response cache for user {request.user_id}: {e}")
+            return cache_key, None
+
+    async def _complete_cached_turn(self, request: SendMessageRequest, session_id: str,
+                                    cached_response: CachedResponse) -> None:
+        """
+        캐시 히트: LLM 호출 없이 대화 기록(사용자/AI 메시지)을 저장하고,
+        원래 응답에 사용된 토큰 수만큼 세션 토큰 사용량을 갱신합니다.
+        """
+        from langchain_core.messages import AIMessage, HumanMessage  # 외부 라이브러리
+
+        await self._message_history(request.user_id, session_id).aadd_messages(
+            [HumanMessage(content=request.content), AIMessage(content=cached_response.content)]
         )
+        await self._complete_turn(request.user_id, cached_response.total_tokens)
 
-        self.chat_repo.update_active_session_token_usage(request.user_id, llm_response.usage_metadata['total_tokens'])
-        # TODO(window9u): 유저별 토큰 사용량 업데이트
+    async def _store_response_cache(self, cache_key: Optional[ResponseCacheKey], content: str,
+                                    total_tokens: int) -> None:
+        if cache_key is None or not content:
+            return
+        try:
+            await self.response_cache.put(cache_key, content, total_tokens)
+        except Exception as e:
+            print(f"Error storing response cache: {e}")
+
+    async def handle_user_message(self, request: SendMessageRequest) -> ChatMessageResponse:
+        """
+        사용자 메시지를 처리하고, AI 응답을 생성하며, 메시지를 저장합니다.
+        같은 요청이 이미 처리 중이거나 처리되었으면 그 결과를 반환합니다.
+        """
+        return await self.idempotency_service.run(request, lambda: self._handle_user_message(request))
+
+    async def _handle_user_message(self, request: SendMessageRequest) -> ChatMessageResponse:
+        session_id, chain_input, config = await self._prepare_turn(request)
+
+        cache_key, cached_response = await self._lookup_response_cache(request, session_id, chain_input, config)
+        if cached_response:
+            await self._complete_cached_turn(request, session_id, cached_response)
+            return ChatMessageResponse(content=cached_response.content, session_id=session_id)
+
+        with stage("llm.invoke", **{"llm.model": CHAT_MODEL_NAME}) as span:
+            llm_response = await self.chain_with_history.ainvoke(input=chain_input, config=config)
+            record_llm_usage(span, llm_response.usage_metadata)
+
+        await self._complete_turn(request.user_id, llm_response.usage_metadata['total_tokens'])
+        await self._store_response_cache(cache_key, llm_response.content, llm_response.usage_metadata['total_tokens'])
 
         return ChatMessageResponse(
             content=llm_response.content,
             session_id=session_id
         )
 
-    def get_user_history(self, user_id: str, cursor: str, limit: int) -> ChatHistoryResponse:
+    async def stream_user_message(self, request: SendMessageRequest,
+                                  quota_checked: bool = False) -> AsyncIterator[ChatStreamEvent]:
         """
-        세션 ID에 해당하는 채팅 기록을 가져옵니다.
+        handle_user_message 의 스트리밍 버전. 토큰이 생성되는 대로 "token" 이벤트를 내보내고,
+        스트림이 끝나면 대화 기록 저장 및 토큰 사용량 갱신 후 "done" 이벤트를 내보냅니다.
+        클라이언트가 중간에 연결을 끊으면 생성이 취소되며, 해당 턴의 대화 기록은 저장하지 않습니다.
+        중복 요청이면 생성하지 않고 기존 응답을 "done" 이벤트로만 내보냅니다.
+        스트림을 시작하기 전에 check_user_quota 를 호출했으면 quota_checked=True 로 한도를 다시 검사하지 않습니다.
         """
-        messages, last_evaluated_key = self.chat_repo.get_messages_of_user(user_id, cursor, limit)
-        return ChatHistoryResponse(
-            messages=[
-                MessageResponse(
-                    content=message.content,
-                    type=message.sender_type,
-                    timestamp=_convert_num_to_ISO8601(message.created_at),
-                )
-                for message in messages
-            ],
-            cursor=last_evaluated_key if last_evaluated_key else None
+        lease, response = await self.idempotency_service.acquire(request)
+        if response is not None:
+            yield ChatStreamEvent(event="done", content=response.content, session_id=response.session_id)
+            return
+
+        completed = False
+        try:
+            async for event in self._stream_user_message(request, quota_checked):
+                if event.event == "done":
+                    await self.idempotency_service.complete(
+                        lease, ChatMessageResponse(content=event.content, session_id=event.session_id)
+                    )
+                    completed = True
+                yield event
+        except BaseException as e:
+            if not completed:
+                await self.idempotency_service.release(lease, e)
+            raise
+
+    async def _stream_user_message(self, request: SendMessageRequest,
+                                   quota_checked: bool = False) -> AsyncIterator[ChatStreamEvent]:
+        session_id, chain_input, config = await self._prepare_turn(request, check_quota=not quota_checked)
+
+        cache_key, cached_response = await self._lookup_response_cache(request, session_id, chain_input, config)
+        if cached_response:
+            await asyncio.shield(self._complete_cached_turn(request, session_id, cached_response))
+            yield ChatStreamEvent(event="token", content=cached_response.content, session_id=session_id)
+            yield ChatStreamEvent(event="done", content=cached_response.content, session_id=session_id)
+            return
+
+        contents: List[str] = []
+        total_tokens = 0
+        started_at = time.perf_counter()
+        try:
+            with stage("llm.stream", **{"llm.model": CHAT_MODEL_NAME}) as span:
+                async for chunk in self.chain_with_history.astream(input=chain_input, config=config):
+                    if chunk.usage_metadata:
+                        total_tokens += chunk.usage_metadata['total_tokens']
+                        record_llm_usage(span, chunk.usage_metadata)
+                    if chunk.content:
+                        if not contents:
+                            # 첫 토큰까지의 시간 (체감 지연)
+                            observe("llm.first_token", time.perf_counter() - started_at)
+                        contents.append(chunk.content)
+                        yield ChatStreamEvent(event="token", content=chunk.content, session_id=session_id)
+        except (asyncio.CancelledError, GeneratorExit):
+            print(f"Stream for user {request.user_id} in session {session_id} was interrupted by the client.")
+            raise
+
+        content = ''.join(contents)
+        # 저장 도중 연결이 끊기더라도 완료된 응답은 끝까지 저장되도록 보호
+        await asyncio.shield(self._complete_turn(request.user_id, total_tokens))
+        await self._store_response_cache(cache_key, content, total_tokens)
+
+        yield ChatStreamEvent(event="done", content=content, session_id=session_id)
+
+    async def get_user_history(self, user_id: str, cursor: Optional[str], limit: int,
+                               session_id: Optional[str] = None, start_time_s: Optional[int] = None,
+                               end_time_s: Optional[int] = None) -> ChatHistoryResponse:
+        """
+        사용자의 채팅 기록을 가져옵니다. session_id / 시간 범위가 주어지면 해당 구간만 조회합니다.
+        cursor 는 이전 응답에서 받은 서명된 값이며, 같은 조회 조건에서만 사용할 수 있습니다.
+        """
+        query = {"u": user_id, "s": session_id, "a": start_time_s, "b": end_time_s}
+        start_key = None
+        if cursor:
+            payload = decode_cursor(cursor)
+            start_key = payload.pop("k", None)
+            if payload != query or not start_key:
+                raise InvalidCursorError("Cursor was issued for a different query.")
+
+        page_key = (user_id, session_id, start_time_s, end_time_s, start_key, limit)
+        items, next_key = await self._get_history_page(page_key)
+        if next_key and settings.HISTORY_PREFETCH_ENABLED:
+            self._prefetch_history_page((user_id, session_id, start_time_s, end_time_s, next_key, limit))
+
+        return build_history_response(items, encode_cursor({**query, "k": next_key}) if next_key else None)
+
+    async def _get_history_page(self, page_key: Tuple) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """prefetch 된 페이지가 있으면 사용하고, 없으면 DynamoDB 에서 조회"""
+        page = self.history_prefetch_cache.get(page_key)
+        if page is not None:
+            return page
+
+        prefetch = self._history_prefetches.get(page_key)
+        if prefetch:
+            try:
+                # 취소되어도 다른 대기자를 위해 prefetch 작업은 계속 진행
+                return await asyncio.shield(prefetch)
+            except Exception:
+                pass  # prefetch 실패 시 직접 조회
+
+        user_id, session_id, start_time_s, end_time_s, start_key, limit = page_key
+        return await self.chat_repo.get_message_items_of_user(
+            user_id, start_key, limit, session_id, start_time_s, end_time_s
         )
 
+    def _prefetch_history_page(self, page_key: Tuple) -> None:
+        if page_key in self._history_prefetches:
+            return
+
+        async def prefetch() -> Tuple[List[Dict[str, Any]], Optional[str]]:
+            user_id, session_id, start_time_s, end_time_s, start_key, limit = page_key
+            try:
+                page = await self.chat_repo.get_message_items_of_user(
+                    user_id, start_key, limit, session_id, start_time_s, end_time_s
+                )
+                self.history_prefetch_cache.set(page_key, page)
+                return page
+            except Exception as e:
+                print(f"Error prefetching history page for user {user_id}: {e}")
+                raise
+            finally:
+                self._history_prefetches.pop(page_key, None)
+
+        task = asyncio.create_task(prefetch())
+        # 아무도 기다리지 않은 prefetch 의 예외가 "never retrieved" 경고로 남지 않도록 처리
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._history_prefetches[page_key] = task
+
+
+def build_history_response(items: List[Dict[str, Any]], cursor: Optional[str]) -> ChatHistoryResponse:
+    """
+    DynamoDB 아이템을 바로 응답 모델로 매핑 (fast path).
+    저장소에서 온 값은 이미 Message 스키마를 따르므로 Message / MessageResponse 검증을 생략하고
+    model_construct 로 만듭니다.
+    """
+    construct = MessageResponse.model_construct
+    return ChatHistoryResponse.model_construct(
+        messages=[
+            construct(
+                content=item['content'],
+                type=item['sender_type'],
+                timestamp=_convert_num_to_ISO8601(item['created_at']),
+            )
+            for item in items
+        ],
+        cursor=cursor,
+    )
+
+
+@lru_cache(maxsize=4096)
+def _utc_date_prefix(day: int) -> str:
+    return time.strftime('%Y-%m-%dT', time.gmtime(day * 86400))
+
 
 def _convert_num_to_ISO8601(num: int) -> str:
     """
-    Convert a Unix timestamp to ISO 8601 format.
+    Convert a Unix timestamp to ISO 8601 format (UTC).
+    날짜 부분은 일 단위로 캐시하고 시:분:초만 계산합니다.
     """
-    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(num)) + 'Z'  # 'Z' indicates UTC time
+    day, seconds = divmod(int(num), 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{_utc_date_prefix(day)}{hours:02d}:{minutes:02d}:{seconds:02d}Z"  # 'Z' indicates UTC time
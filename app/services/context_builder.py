@@ -0,0 +1,139 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.telemetry import record_context_tokens
+from app.core.tokenizer import count_tokens
+from app.models.entity import SessionMetadata
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+# 세션이 아직 끝나지 않아 요약이 없는 SessionMetadata 의 초기값
+UNFINISHED_SESSION_SUMMARY = 'session not finished yet'
+
+
+def message_token_count(message: "BaseMessage") -> int:
+    """저장 시 계산해 둔 토큰 수(response_metadata.token_count)가 있으면 재사용"""
+    token_count = message.response_metadata.get('token_count')
+    if token_count is None:
+        token_count = count_tokens(message.content)
+    return token_count
+
+
+def trim_session_summaries(session_summaries: List[SessionMetadata],
+                           summary_token_budget: int) -> List[SessionMetadata]:
+    """
+    최신순 세션 요약 중 요약 토큰 예산에 들어가지 않는 요약은 비움 (ContextBuilder.build 와 같은 순서/기준).
+    컨텍스트 스냅샷에 미리 잘라 저장하는 용도이며, 질문 길이에 따른 최종 조정은 build 에서 다시 합니다.
+    """
+    trimmed = []
+    remaining = summary_token_budget
+    for metadata in session_summaries:
+        summary = metadata.session_summary
+        if summary and summary != UNFINISHED_SESSION_SUMMARY:
+            tokens = count_tokens(summary)
+            if tokens <= remaining:
+                remaining -= tokens
+            else:
+                metadata = metadata.model_copy(update={'session_summary': None})
+        trimmed.append(metadata)
+    return trimmed
+
+
+class ContextWindow(BaseModel):
+    history: List[Any]  # List[BaseMessage]
+    summaries: str
+    prompt_tokens: int
+    saved_tokens: int
+
+
+class ContextBuilderMetrics(BaseModel):
+    built_contexts: int
+    prompt_tokens: int
+    saved_tokens: int
+
+
+class ContextBuilder:
+    """
+    LLM 프롬프트에 들어갈 컨텍스트를 토큰 예산에 맞게 구성합니다.
+    이전 세션 요약(최신순)을 요약 예산만큼 먼저 채우고, 남은 예산으로 최근 대화 턴을 최신순으로 채웁니다.
+    """
+
+    def __init__(self, token_budget: int = settings.CONTEXT_TOKEN_BUDGET,
+                 summary_token_budget: int = settings.CONTEXT_SUMMARY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self._built_contexts = 0
+        self._prompt_tokens = 0
+        self._saved_tokens = 0
+
+    def build(self, question: str, history: List["BaseMessage"],
+              session_summaries: Optional[List[SessionMetadata]] = None) -> ContextWindow:
+        question_tokens = count_tokens(question)
+        remaining = self.token_budget - question_tokens
+        prompt_tokens = question_tokens
+        candidate_tokens = question_tokens
+
+        summaries = []
+        summary_remaining = min(self.summary_token_budget, remaining)
+        for metadata in session_summaries or []:
+            if not metadata.session_summary or metadata.session_summary == UNFINISHED_SESSION_SUMMARY:
+                continue
+            tokens = count_tokens(metadata.session_summary)
+            candidate_tokens += tokens
+            if tokens <= summary_remaining:
+                summaries.append(metadata.session_summary)
+                summary_remaining -= tokens
+                remaining -= tokens
+                prompt_tokens += tokens
+
+        selected: List["BaseMessage"] = []
+        history_full = False
+        for message in reversed(history):
+            tokens = message_token_count(message)
+            candidate_tokens += tokens
+            # 중간 턴을 건너뛰면 대화 순서에 빈 곳이 생기므로, 한 번 넘치면 더 오래된 턴은 넣지 않음
+            if history_full or tokens > remaining:
+                history_full = True
+                continue
+            selected.append(message)
+            remaining -= tokens
+            prompt_tokens += tokens
+
+        saved_tokens = candidate_tokens - prompt_tokens
+        self._built_contexts += 1
+        self._prompt_tokens += prompt_tokens
+        self._saved_tokens += saved_tokens
+        record_context_tokens(prompt_tokens, saved_tokens)
+
+        return ContextWindow(
+            history=list(reversed(selected)),
+            summaries=_format_summaries(summaries),
+            prompt_tokens=prompt_tokens,
+            saved_tokens=saved_tokens,
+        )
+
+    def build_prompt_input(self, chain_input: Dict[str, Any]) -> Dict[str, Any]:
+        """체인 입력({question, history, summaries})을 토큰 예산에 맞춘 프롬프트 입력으로 변환"""
+        context = self.build(chain_input['question'], chain_input.get('history', []), chain_input.get('summaries'))
+        return {
+            'question': chain_input['question'],
+            'history': context.history,
+            'summaries': context.summaries,
+        }
+
+    def metrics(self) -> ContextBuilderMetrics:
+        return ContextBuilderMetrics(
+            built_contexts=self._built_contexts,
+            prompt_tokens=self._prompt_tokens,
+            saved_tokens=self._saved_tokens,
+        )
+
+
+def _format_summaries(summaries: List[str]) -> str:
+    if not summaries:
+        return ""
+    lines = "\n".join(f"- {summary}" for summary in summaries)
+    return f"\n\nSummaries of the user's previous sessions:\n{lines}"
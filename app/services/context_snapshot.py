@@ -0,0 +1,85 @@
+import time
+from typing import List
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.telemetry import register_metrics
+from app.models.entity import ContextSnapshot, SessionMetadata
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.context_builder import trim_session_summaries
+
+
+class ContextSnapshotMetrics(BaseModel):
+    hits: int  # 최신 스냅샷을 GetItem 한 번으로 사용한 경우
+    missing: int  # 스냅샷이 없어 다시 만든 경우
+    stale: int  # SessionMetadata 가 바뀌었거나 설정이 달라 다시 만든 경우
+    conflicts: int  # 다시 만드는 동안 SessionMetadata 가 또 바뀌어 저장하지 못한 경우
+
+
+class ContextSnapshotService:
+    """
+    사용자별 컨텍스트 스냅샷(최근 세션 요약, 요약 토큰 예산에 맞게 잘라 둔 것)으로 장기 기억을 GetItem 한 번에 조회.
+
+    SessionMetadata 가 바뀌는 곳(세션 교체 트랜잭션, summary lambda)은 스냅샷의 metadata_version 을 올리고,
+    summary lambda 는 요약 후 스냅샷을 바로 다시 만듭니다.
+    snapshot_version 이 metadata_version 과 다르면(stale) 또는 스냅샷이 없으면 SessionMetadata 를 Query 하여
+    다시 만들고, 그 사이 다른 변경이 없을 때만 저장합니다.
+    """
+
+    def __init__(self, chat_repo: AsyncChatRepository,
+                 window: int = settings.SESSION_SUMMARY_WINDOW,
+                 summary_token_budget: int = settings.CONTEXT_SUMMARY_TOKEN_BUDGET):
+        self.chat_repo = chat_repo
+        self.window = window
+        self.summary_token_budget = summary_token_budget
+        self._hits = 0
+        self._missing = 0
+        self._stale = 0
+        self._conflicts = 0
+        register_metrics("context_snapshot", self.metrics)
+
+    async def get_session_summaries(self, user_id: str) -> List[SessionMetadata]:
+        """최근 window 개 세션의 요약 (최신순)"""
+        snapshot = await self.chat_repo.get_context_snapshot(user_id)
+        if snapshot is not None and self._is_fresh(snapshot):
+            self._hits += 1
+            return snapshot.summaries
+
+        if snapshot is None:
+            self._missing += 1
+        else:
+            self._stale += 1
+        return await self.rebuild(user_id, snapshot.metadata_version if snapshot else 0)
+
+    async def rebuild(self, user_id: str, metadata_version: int) -> List[SessionMetadata]:
+        """metadata_version 시점 이후의 SessionMetadata 로 스냅샷을 다시 만들어 저장"""
+        session_metadata = await self.chat_repo.get_current_session_metadata_by_user_id(
+            user_id, self.window, consistent_read=True
+        )
+        summaries = trim_session_summaries(session_metadata, self.summary_token_budget)
+        try:
+            stored = await self.chat_repo.put_context_snapshot(
+                user_id, summaries, self.window, self.summary_token_budget, metadata_version, int(time.time())
+            )
+            if not stored:
+                self._conflicts += 1
+        except Exception as e:
+            # 저장에 실패해도 이번 요청은 방금 읽은 요약으로 진행 (다음 요청이 다시 만듦)
+            print(f"Error storing context snapshot for user {user_id}: {e}")
+        return summaries
+
+    def metrics(self) -> ContextSnapshotMetrics:
+        return ContextSnapshotMetrics(
+            hits=self._hits,
+            missing=self._missing,
+            stale=self._stale,
+            conflicts=self._conflicts,
+        )
+
+    def _is_fresh(self, snapshot: ContextSnapshot) -> bool:
+        return (
+            snapshot.snapshot_version == snapshot.metadata_version
+            and snapshot.window == self.window
+            and snapshot.summary_token_budget == self.summary_token_budget
+        )
@@ -0,0 +1,33 @@
+from typing import Any, AsyncIterator, Optional
+
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import BaseMessage, BaseMessageChunk
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from app.services.llm_guard import LLMGuard
+
+
+class GuardedChatModel(Runnable[LanguageModelInput, BaseMessage]):
+    """
+    채팅 모델 호출만 LLMGuard 로 감싼 Runnable (체인의 마지막 단계).
+    대화 기록 래퍼(RunnableWithMessageHistory)가 아니라 모델을 감싸므로, 거절/타임아웃된 턴의 대화 기록은 저장되지 않고
+    hedge 로 보내는 두 번째 요청도 프롬프트가 만들어진 뒤의 모델 호출만 반복합니다.
+    """
+
+    def __init__(self, model: Runnable[LanguageModelInput, BaseMessage], guard: LLMGuard):
+        self.model = model
+        self.guard = guard
+
+    def invoke(self, input: LanguageModelInput, config: Optional[RunnableConfig] = None,
+               **kwargs: Any) -> BaseMessage:
+        # 동기 경로는 API 에서 사용하지 않으므로 보호 없이 그대로 위임
+        return self.model.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: LanguageModelInput, config: Optional[RunnableConfig] = None,
+                      **kwargs: Any) -> BaseMessage:
+        return await self.guard.ainvoke(lambda: self.model.ainvoke(input, config, **kwargs))
+
+    async def astream(self, input: LanguageModelInput, config: Optional[RunnableConfig] = None,
+                      **kwargs: Any) -> AsyncIterator[BaseMessageChunk]:
+        async for chunk in self.guard.astream(lambda: self.model.astream(input, config, **kwargs)):
+            yield chunk
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.models.entity import IdempotencyRecord, IdempotencyStatus
+from app.models.request import SendMessageRequest
+from app.models.response import ChatMessageResponse
+from app.repositories.async_chat_repository import AsyncChatRepository
+
+
+class IdempotencyConflictError(Exception):
+    """같은 idempotency_key 로 다른 내용의 요청을 보낸 경우"""
+
+
+class IdempotencyInProgressError(Exception):
+    """다른 워커가 같은 요청을 처리 중이며, 대기 시간 안에 끝나지 않은 경우"""
+
+    def __init__(self, message: str, retry_after_s: int):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class IdempotencyLease(NamedTuple):
+    flight_key: Optional[Hashable]  # 다른 요청과 합치지 않으면 None
+    record_key: Optional[str]  # DynamoDB 기록을 쓰지 않으면 None
+    owner_id: str
+    future: "asyncio.Future[ChatMessageResponse]"
+
+
+class IdempotencyService:
+    """
+    send_message 의 중복 요청을 한 번만 처리합니다.
+
+    - 워커 내부(single-flight): 같은 사용자의 같은 요청이 처리 중이면 새로 계산하지 않고 그 결과를 기다림.
+      idempotency_key 가 없는 요청은 합치지 않습니다 (coalesce_by_content 가 켜져 있으면 같은 내용의 동시 요청을 합침).
+    - 워커 간(선택): idempotency_key 가 있으면 DynamoDB 조건부 쓰기로 처리 중/완료 기록을 남기고,
+      다른 워커의 중복 요청은 완료된 응답을 재사용하거나 완료될 때까지 기다립니다.
+    """
+
+    def __init__(self, chat_repo: AsyncChatRepository,
+                 record_enabled: bool = settings.IDEMPOTENCY_RECORD_ENABLED,
+                 ttl_seconds: int = settings.IDEMPOTENCY_TTL_SECONDS,
+                 lease_seconds: int = settings.IDEMPOTENCY_LEASE_SECONDS,
+                 wait_timeout_s: float = settings.IDEMPOTENCY_WAIT_TIMEOUT_SECONDS,
+                 poll_interval_s: float = settings.IDEMPOTENCY_POLL_INTERVAL_SECONDS,
+                 coalesce_by_content: bool = settings.IDEMPOTENCY_COALESCE_BY_CONTENT):
+        self.chat_repo = chat_repo
+        self.record_enabled = record_enabled
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.wait_timeout_s = wait_timeout_s
+        self.poll_interval_s = poll_interval_s
+        self.coalesce_by_content = coalesce_by_content
+        # flight_key -> (request_hash, 처리 결과 future)
+        self._in_flight: Dict[Hashable, Tuple[str, "asyncio.Future[ChatMessageResponse]"]] = {}
+        self.coalesced_requests = 0
+        self.replayed_responses = 0
+
+    async def run(self, request: SendMessageRequest,
+                  handler: Callable[[], Awaitable[ChatMessageResponse]]) -> ChatMessageResponse:
+        """중복 요청이면 기존 결과를, 아니면 handler 를 실행한 결과를 반환"""
+        lease, response = await self.acquire(request)
+        if response is not None:
+            return response
+        try:
+            response = await handler()
+        except BaseException as e:
+            await self.release(lease, e)
+            raise
+        await self.complete(lease, response)
+        return response
+
+    async def acquire(self, request: SendMessageRequest
+                      ) -> Tuple[Optional[IdempotencyLease], Optional[ChatMessageResponse]]:
+        """
+        (lease, None): 이 요청이 처리해야 함. 끝나면 complete / release 를 호출해야 합니다.
+        (None, response): 중복 요청이며 이미 처리된 응답.
+        """
+        request_hash = hashlib.sha256(request.content.encode()).hexdigest()
+        flight_key: Optional[Hashable] = None  # None 이면 다른 요청과 합치지 않음
+        if request.idempotency_key:
+            flight_key = (request.user_id, "key", request.idempotency_key)
+        elif self.coalesce_by_content:
+            flight_key = (request.user_id, "content", request_hash)
+
+        while flight_key is not None:
+            in_flight = self._in_flight.get(flight_key)
+            if in_flight is None:
+                break
+            in_flight_hash, future = in_flight
+            if in_flight_hash != request_hash:
+                raise IdempotencyConflictError("Idempotency key was already used for a different message.")
+            self.coalesced_requests += 1
+            try:
+                return None, await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # 이 요청 자체가 취소됨
+                # 먼저 온 요청이 취소되면(클라이언트 연결 종료 등) 이 요청이 다시 처리를 시도
+
+        future: "asyncio.Future[ChatMessageResponse]" = asyncio.get_running_loop().create_future()
+        # 기다리는 요청이 없을 때 예외가 "never retrieved" 로 남지 않도록 처리
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if flight_key is not None:
+            self._in_flight[flight_key] = (request_hash, future)
+        lease = IdempotencyLease(flight_key, None, str(uuid.uuid4()), future)
+
+        if not (self.record_enabled and request.idempotency_key):
+            return lease, None
+
+        lease = lease._replace(record_key=f"{request.user_id}#{request.idempotency_key}")
+        try:
+            response = await self._acquire_record(lease, request_hash)
+        except BaseException as e:
+            self._finish(lease, error=e)
+            raise
+        if response is not None:
+            self._finish(lease, response=response)
+            self.replayed_responses += 1
+        return (None, response) if response is not None else (lease, None)
+
+    async def complete(self, lease: IdempotencyLease, response: ChatMessageResponse) -> None:
+        self._finish(lease, response=response)
+        if lease.record_key:
+            try:
+                await self.chat_repo.complete_idempotency_record(
+                    lease.record_key, lease.owner_id, response.content, response.session_id,
+                    int(time.time()) + self.ttl_seconds,
+                )
+            except Exception as e:
+                # 응답은 이미 만들어졌으므로 기록 실패로 요청을 실패시키지 않음 (lease 만료 후 재처리될 수 있음)
+                print(f"Error completing idempotency record {lease.record_key}: {e}")
+
+    async def release(self, lease: IdempotencyLease, error: BaseException) -> None:
+        """처리 실패/취소: 기다리던 중복 요청에 알리고, 재시도할 수 있도록 기록 삭제"""
+        self._finish(lease, error=error)
+        if lease.record_key:
+            try:
+                await asyncio.shield(self.chat_repo.delete_idempotency_record(lease.record_key, lease.owner_id))
+            except Exception as e:
+                print(f"Error releasing idempotency record {lease.record_key}: {e}")
+
+    def _finish(self, lease: IdempotencyLease, response: Optional[ChatMessageResponse] = None,
+                error: Optional[BaseException] = None) -> None:
+        if self._in_flight.get(lease.flight_key, (None, None))[1] is lease.future:
+            del self._in_flight[lease.flight_key]
+        if lease.future.done():
+            return
+        if error is not None and not isinstance(error, Exception):
+            # 취소, 스트리밍 generator 종료(GeneratorExit) 등: 기다리던 요청이 다시 처리를 시도하도록 취소로 알림
+            lease.future.cancel()
+        elif error is not None:
+            lease.future.set_exception(error)
+        else:
+            lease.future.set_result(response)
+
+    async def _acquire_record(self, lease: IdempotencyLease, request_hash: str) -> Optional[ChatMessageResponse]:
+        """DynamoDB 기록을 선점하면 None, 다른 요청이 완료한 응답이 있으면 그 응답을 반환"""
+        deadline = time.monotonic() + self.wait_timeout_s
+        while True:
+            current_time_s = int(time.time())
+            record = IdempotencyRecord(
+                idempotency_key=lease.record_key,
+                status=IdempotencyStatus.IN_PROGRESS.value,
+                request_hash=request_hash,
+                owner_id=lease.owner_id,
+                lease_expires_at=current_time_s + self.lease_seconds,
+                expired_at=current_time_s + self.ttl_seconds,
+            )
+            if await self.chat_repo.acquire_idempotency_record(record, current_time_s):
+                return None
+
+            existing = await self.chat_repo.get_idempotency_record(lease.record_key)
+            if existing is None:
+                continue  # 그 사이 삭제/만료됨: 다시 선점 시도
+            if existing.request_hash != request_hash:
+                raise IdempotencyConflictError("Idempotency key was already used for a different message.")
+            if existing.status == IdempotencyStatus.COMPLETED.value:
+                return ChatMessageResponse(
+                    content=existing.response_content, session_id=existing.response_session_id
+                )
+
+            # 다른 워커가 처리 중: 완료되거나 lease 가 만료될 때까지 대기
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgressError(
+                    "A request with the same idempotency key is still in progress.",
+                    max(existing.lease_expires_at - current_time_s, 1),
+                )
+            await asyncio.sleep(self.poll_interval_s)
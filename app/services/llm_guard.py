@@ -0,0 +1,370 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.telemetry import observe, register_metrics
+
+T = TypeVar("T")
+
+_END_OF_STREAM = object()
+
+
+class LLMUnavailableError(Exception):
+    """회로가 열려 있거나 동시 호출 대기 시간을 넘어 LLM 을 호출하지 않은 경우 (503)"""
+
+    def __init__(self, message: str, retry_after_s: int):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class LLMTimeoutError(Exception):
+    """LLM 응답이 제한 시간 안에 오지 않은 경우 (504)"""
+
+
+def is_transient_failure(error: BaseException) -> bool:
+    """
+    회로 차단기가 실패로 세는 오류인지: 타임아웃, 5xx 응답, 연결 오류만 해당.
+    4xx(잘못된 요청, 인증, rate limit 등)나 입력 검증 오류는 LLM 장애가 아니므로 세지 않습니다.
+    """
+    if isinstance(error, (asyncio.TimeoutError, OSError)):  # ConnectionError 포함
+        return True
+    status_code = getattr(error, "status_code", None)  # openai.APIStatusError, httpx.HTTPStatusError 등
+    if isinstance(status_code, int):
+        return status_code >= 500
+    try:
+        import openai
+        if isinstance(error, openai.APIConnectionError):  # APITimeoutError 포함
+            return True
+    except ImportError:  # pragma: no cover - 선택 의존성
+        pass
+    try:
+        import httpx
+        if isinstance(error, httpx.TransportError):
+            return True
+    except ImportError:  # pragma: no cover - 선택 의존성
+        pass
+    return False
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    연속 실패가 failure_threshold 번이면 회로를 열어(open) reset_seconds 동안 호출을 바로 거절하고,
+    그 후에는 시험 호출 하나만 허용(half-open)하여 성공하면 닫고 실패하면 다시 엽니다.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def check(self) -> None:
+        """지금 호출할 수 없으면 LLMUnavailableError (상태는 바꾸지 않음)"""
+        if self.state is CircuitState.OPEN:
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                self._reject(remaining)
+        elif self.state is CircuitState.HALF_OPEN and self._probing:
+            self._reject(self.reset_seconds)
+
+    def before_call(self) -> bool:
+        """호출 직전에 확인. 이 호출이 half-open 시험 호출이면 True"""
+        self.check()
+        if self.state is CircuitState.CLOSED:
+            return False
+        self.state = CircuitState.HALF_OPEN
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self._consecutive_failures = 0
+        if self.state is not CircuitState.CLOSED:
+            print("LLM circuit closed.")
+        self.state = CircuitState.CLOSED
+        self._probing = False
+
+    def record_failure(self) -> None:
+        if self.state is CircuitState.OPEN:
+            return  # 회로가 열리기 전에 시작된 호출의 실패
+        self._consecutive_failures += 1
+        if self.state is CircuitState.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            print(f"LLM circuit opened after {self._consecutive_failures} consecutive failures.")
+            self.state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+            self.opened += 1
+
+    def release_probe(self) -> None:
+        """시험 호출이 취소된 경우: 결과 없이 다음 요청이 다시 시험하도록 함"""
+        self._probing = False
+
+    def _reject(self, retry_after_s: float) -> None:
+        self.rejected += 1
+        raise LLMUnavailableError(
+            "The language model is temporarily unavailable, please retry later.",
+            max(math.ceil(retry_after_s), 1),
+        )
+
+
+class LLMGuardMetrics(BaseModel):
+    in_flight: int
+    waiting: int  # 동시 호출 자리를 기다리는 요청 수
+    avg_queue_wait_ms: float
+    max_queue_wait_ms: float
+    queue_timeouts: int
+    timeouts: int
+    failures: int  # 회로에 실패로 반영한 오류 (5xx, 연결 오류)
+    client_errors: int  # 회로에 반영하지 않은 오류 (4xx, 입력 검증 오류 등)
+    circuit_state: str
+    circuit_opened: int
+    rejected: int  # 회로가 열려 있어 LLM 을 호출하지 않고 거절한 요청 수
+    hedged: int
+    hedge_wins: int  # 두 번째 요청이 먼저 응답한 경우
+    hedge_delay_ms: Optional[float]  # 현재 ainvoke 의 hedge 지연 시간 (표본이 부족하면 None)
+
+
+class LLMGuard:
+    """
+    LLM 모델 호출을 감싸는 워커 단위 보호 계층.
+
+    - 동시 호출 수 제한: 워커의 모든 요청이 세마포어 하나를 공유하며, 가득 차면 queue_timeout_s 까지 기다린 뒤 503
+    - 타임아웃: 응답 전체 timeout_s, 스트리밍 첫 청크 first_token_timeout_s. 넘으면 504
+    - 회로 차단: 연속으로 실패(타임아웃, 5xx, 연결 오류)하면 일정 시간 LLM 을 호출하지 않고 바로 503
+      (ChatService 는 세션을 만들거나 메시지를 저장하기 전에 check 로 먼저 확인)
+    - hedge(선택): 첫 응답(스트리밍은 첫 청크)이 최근 지연 시간의 p95 보다 늦으면 같은 요청을 한 번 더 보내
+      먼저 성공한 쪽을 사용하고 나머지는 취소합니다. 회로가 닫혀 있고 동시 호출 자리가 남을 때만 보냅니다.
+    """
+
+    def __init__(self, max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+                 queue_timeout_s: float = settings.LLM_QUEUE_TIMEOUT_SECONDS,
+                 timeout_s: float = settings.LLM_TIMEOUT_SECONDS,
+                 first_token_timeout_s: float = settings.LLM_FIRST_TOKEN_TIMEOUT_SECONDS,
+                 circuit_failure_threshold: int = settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                 circuit_reset_seconds: float = settings.LLM_CIRCUIT_RESET_SECONDS,
+                 hedge_enabled: bool = settings.LLM_HEDGE_ENABLED,
+                 hedge_percentile: float = settings.LLM_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = settings.LLM_HEDGE_MIN_SAMPLES,
+                 hedge_min_delay_s: float = settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+                 latency_window: int = 200):
+        self.queue_timeout_s = queue_timeout_s
+        self.timeout_s = timeout_s
+        self.first_token_timeout_s = first_token_timeout_s
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay_s = hedge_min_delay_s
+        self.circuit = CircuitBreaker(circuit_failure_threshold, circuit_reset_seconds)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # 호출 방식별 최근 첫 응답 지연 시간 (초): "invoke" 는 응답 전체, "stream" 은 첫 청크
+        self._latencies: Dict[str, Deque[float]] = {
+            "invoke": deque(maxlen=latency_window), "stream": deque(maxlen=latency_window),
+        }
+
+        self._in_flight = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._queue_wait_s = 0.0
+        self._max_queue_wait_s = 0.0
+        self._queue_timeouts = 0
+        self._timeouts = 0
+        self._failures = 0
+        self._client_errors = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        register_metrics("llm_guard", self.metrics)
+
+    def check(self) -> None:
+        """회로가 열려 있으면 LLMUnavailableError (LLM 호출 전 작업을 하기 전에 확인)"""
+        self.circuit.check()
+
+    async def ainvoke(self, call: Callable[[], Awaitable[T]]) -> T:
+        async with self._guarded_call():
+            return await self._race("invoke", call, self.timeout_s)
+
+    async def astream(self, call: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        async with self._guarded_call():
+            deadline = time.monotonic() + self.timeout_s
+            iterator, chunk = await self._race(
+                "stream", lambda: _open_stream(call), min(self.first_token_timeout_s, self.timeout_s),
+                discard=lambda opened: opened[0].aclose(),
+            )
+            try:
+                while chunk is not _END_OF_STREAM:
+                    yield chunk
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        chunk = _END_OF_STREAM
+            finally:
+                await iterator.aclose()
+
+    def metrics(self) -> LLMGuardMetrics:
+        hedge_delay_s = self._hedge_delay("invoke")
+        return LLMGuardMetrics(
+            in_flight=self._in_flight,
+            waiting=self._waiting,
+            avg_queue_wait_ms=self._queue_wait_s / (self._acquired or 1) * 1000,
+            max_queue_wait_ms=self._max_queue_wait_s * 1000,
+            queue_timeouts=self._queue_timeouts,
+            timeouts=self._timeouts,
+            failures=self._failures,
+            client_errors=self._client_errors,
+            circuit_state=self.circuit.state.value,
+            circuit_opened=self.circuit.opened,
+            rejected=self.circuit.rejected,
+            hedged=self._hedged,
+            hedge_wins=self._hedge_wins,
+            hedge_delay_ms=hedge_delay_s * 1000 if hedge_delay_s is not None else None,
+        )
+
+    @asynccontextmanager
+    async def _guarded_call(self) -> AsyncIterator[None]:
+        """회로 확인, 동시 호출 자리 확보, 결과(성공/실패/타임아웃)를 회로에 반영"""
+        probe = self.circuit.before_call()
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout_s)
+        except BaseException as e:
+            if probe:
+                self.circuit.release_probe()
+            if isinstance(e, asyncio.TimeoutError):
+                self._queue_timeouts += 1
+                raise LLMUnavailableError(
+                    "Too many concurrent requests to the language model, please retry later.", 1
+                ) from None
+            raise
+        finally:
+            self._waiting -= 1
+        queue_wait_s = time.perf_counter() - queued_at
+        observe("llm.queue_wait", queue_wait_s)
+        self._acquired += 1
+        self._queue_wait_s += queue_wait_s
+        self._max_queue_wait_s = max(self._max_queue_wait_s, queue_wait_s)
+
+        self._in_flight += 1
+        try:
+            yield
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            self.circuit.record_failure()
+            raise LLMTimeoutError("The language model did not respond in time.") from None
+        except Exception as e:
+            if is_transient_failure(e):
+                self._failures += 1
+                self.circuit.record_failure()
+            else:
+                # LLM 은 응답했으므로(요청 쪽 문제) 회로에는 정상 응답으로 반영
+                self._client_errors += 1
+                self.circuit.record_success()
+            raise
+        except BaseException:
+            # 취소(클라이언트 연결 종료 등)는 LLM 의 성공/실패로 세지 않음
+            if probe:
+                self.circuit.release_probe()
+            raise
+        else:
+            self.circuit.record_success()
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def _race(self, kind: str, start: Callable[[], Awaitable[T]], timeout_s: float,
+                    discard: Optional[Callable[[T], Awaitable[Any]]] = None) -> T:
+        """
+        start() 의 결과를 timeout_s 안에 반환.
+        hedge 지연 시간이 지나도 결과가 없으면 start() 를 한 번 더 실행하고 먼저 성공한 결과를 사용합니다.
+        """
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        deadline = started_at + timeout_s
+        hedge_delay_s = self._hedge_delay(kind)
+        hedge_at = started_at + hedge_delay_s if hedge_delay_s is not None else None
+        primary = asyncio.ensure_future(start())
+        attempts: Dict["asyncio.Future[T]", float] = {primary: started_at}
+        pending = {primary}
+        winner: Optional["asyncio.Future[T]"] = None
+        error: Optional[BaseException] = None
+        hedge_permit = False
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    raise asyncio.TimeoutError
+                wake_at = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, pending = await asyncio.wait(pending, timeout=wake_at - now,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        winner = attempt
+                        self._latencies[kind].append(loop.time() - attempts[attempt])
+                        if attempt is not primary:
+                            self._hedge_wins += 1
+                        return attempt.result()
+                    error = attempt.exception()
+
+                if hedge_at is not None and pending and loop.time() >= hedge_at:
+                    hedge_at = None
+                    hedge_permit = await self._acquire_hedge_permit()
+                    if hedge_permit:
+                        self._hedged += 1
+                        hedge = asyncio.ensure_future(start())
+                        attempts[hedge] = loop.time()
+                        pending.add(hedge)
+            raise error
+        finally:
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+                elif (discard is not None and attempt is not winner
+                      and not attempt.cancelled() and attempt.exception() is None):
+                    asyncio.ensure_future(discard(attempt.result()))
+            if hedge_permit:
+                self._semaphore.release()
+
+    def _hedge_delay(self, kind: str) -> Optional[float]:
+        """최근 지연 시간의 hedge_percentile 값 (hedge 를 쓰지 않거나 표본이 부족하면 None)"""
+        latencies = self._latencies[kind]
+        if not self.hedge_enabled or len(latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(latencies)
+        return max(ordered[min(int(len(ordered) * self.hedge_percentile), len(ordered) - 1)], self.hedge_min_delay_s)
+
+    async def _acquire_hedge_permit(self) -> bool:
+        """회로가 닫혀 있고 기다리지 않고 동시 호출 자리를 얻을 수 있을 때만 hedge"""
+        if self.circuit.state is not CircuitState.CLOSED or self._semaphore.locked():
+            return False
+        await self._semaphore.acquire()  # 대기 중인 요청이 없으므로 바로 반환
+        return True
+
+
+async def _open_stream(call: Callable[[], AsyncIterator[T]]) -> tuple:
+    """스트림을 시작하고 첫 청크까지 받음: (iterator, 첫 청크 또는 _END_OF_STREAM)"""
+    iterator = call()
+    try:
+        return iterator, await iterator.__anext__()
+    except StopAsyncIteration:
+        return iterator, _END_OF_STREAM
+    except BaseException:
+        await iterator.aclose()
+        raise
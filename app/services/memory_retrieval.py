@@ -0,0 +1,250 @@
+import asyncio
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional
+
+from pydantic import BaseModel
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.telemetry import register_metrics, stage
+from app.core.tokenizer import count_tokens
+from app.models.entity import SessionMetadata
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.context_builder import UNFINISHED_SESSION_SUMMARY
+from app.services.response_cache import normalize_prompt
+
+if TYPE_CHECKING:
+    import numpy as np
+
+HASHING_EMBEDDING_MODEL = "hashing"
+
+
+def hashing_vector(text: str, dimensions: int) -> "np.ndarray":
+    """
+    글자 3-gram 을 부호 있는 해싱으로 dimensions 차원에 모은 L2 정규화 벡터.
+    summary lambda 의 hashing_embedding 과 같은 값을 만들어야 합니다.
+    """
+    import numpy as np
+
+    padded = f" {normalize_prompt(text)} "
+    hashes = np.fromiter(
+        (zlib.crc32(padded[index:index + 3].encode()) for index in range(max(len(padded) - 2, 1))),
+        dtype=np.uint32,
+    )
+    vector = np.zeros(dimensions, dtype=np.float32)
+    np.add.at(vector, hashes % dimensions, np.where(hashes >> 31, 1.0, -1.0).astype(np.float32))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SummaryIndex(NamedTuple):
+    """사용자 한 명의 세션 요약 인덱스 (brute-force 코사인 유사도)"""
+    vectors: "np.ndarray"  # (요약 수, 차원) float32, 행마다 L2 정규화됨
+    summaries: List[SessionMetadata]
+    token_counts: List[int]
+
+
+class MemoryRetrievalMetrics(BaseModel):
+    mode: str
+    retrievals: int
+    failures: int
+    avg_latency_ms: float  # 인덱스 로드와 질문 임베딩을 포함한 검색 시간
+    max_latency_ms: float
+    index_loads: int
+    avg_index_load_ms: float
+    cached_users: int
+    avg_candidates: float  # 검색 대상 요약 수
+    avg_retrieved: float
+    avg_retrieved_tokens: float
+    recency_comparisons: int  # shadow 모드에서 최근 요약 방식과 비교한 횟수
+    recency_recall: float  # 최근 요약 방식이 고른 요약 중 검색도 고른 비율
+    avg_recency_tokens: float
+
+
+class MemoryRetrievalService:
+    """
+    장기 기억으로 "최근 N개 세션 요약" 대신 현재 질문과 관련된 세션 요약을 검색합니다.
+
+    사용자별 인덱스는 처음 검색할 때 SessionMetadata 를 Query 하여 만들고(최근 MEMORY_INDEX_MAX_SESSIONS 개)
+    워커에 TTL 동안 캐시합니다. 요약 임베딩은 summary lambda 가 저장한 값을 쓰며,
+    로컬 해싱 임베딩이면 임베딩이 없거나 다른 차원인 요약도 여기서 다시 계산합니다.
+    요약 수가 많지 않으므로 NumPy 행렬 곱 한 번(brute-force)으로 top-k 를 구합니다.
+    """
+
+    def __init__(self, chat_repo: AsyncChatRepository,
+                 mode: str = settings.LONG_TERM_MEMORY_MODE,
+                 top_k: int = settings.MEMORY_RETRIEVAL_TOP_K,
+                 min_similarity: float = settings.MEMORY_RETRIEVAL_MIN_SIMILARITY,
+                 summary_token_budget: int = settings.CONTEXT_SUMMARY_TOKEN_BUDGET,
+                 max_sessions: int = settings.MEMORY_INDEX_MAX_SESSIONS,
+                 max_users: int = settings.MEMORY_INDEX_MAX_USERS,
+                 ttl_seconds: float = settings.MEMORY_INDEX_TTL_SECONDS,
+                 embedding_model: str = settings.SUMMARY_EMBEDDING_MODEL,
+                 embedding_dimensions: int = settings.SUMMARY_EMBEDDING_DIMENSIONS):
+        self.chat_repo = chat_repo
+        self.mode = mode
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.summary_token_budget = summary_token_budget
+        self.max_sessions = max_sessions
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+        self.embedding_model_id = f"{embedding_model}:{embedding_dimensions}"
+        self._indexes: TTLCache[SummaryIndex] = TTLCache(max_users, ttl_seconds, name="memory_index")
+        # 같은 사용자의 인덱스를 동시에 여러 번 만들지 않도록 진행 중인 로드를 공유
+        self._loading: Dict[str, "asyncio.Task[SummaryIndex]"] = {}
+        self._embeddings: Optional[Any] = None  # OpenAI 임베딩 클라이언트 (처음 사용할 때 생성)
+
+        self._retrievals = 0
+        self._failures = 0
+        self._latency_ms = 0.0
+        self._max_latency_ms = 0.0
+        self._index_loads = 0
+        self._index_load_ms = 0.0
+        self._candidates = 0
+        self._retrieved = 0
+        self._retrieved_tokens = 0
+        self._recency_comparisons = 0
+        self._recency_selected = 0
+        self._recency_matched = 0
+        self._recency_tokens = 0
+        register_metrics("memory_retrieval", self.metrics)
+
+    async def retrieve(self, user_id: str, question: str) -> List[SessionMetadata]:
+        """질문과 관련된 세션 요약 (유사도순, 최대 top_k 개, 요약 토큰 예산 이내)"""
+        started_at = time.perf_counter()
+        try:
+            with stage("memory.retrieve"):
+                index, query = await asyncio.gather(self._get_index(user_id), self._embed_query(question))
+                selected = self._search(index, query)
+        except Exception:
+            self._failures += 1
+            raise
+        latency_ms = (time.perf_counter() - started_at) * 1000
+        self._retrievals += 1
+        self._latency_ms += latency_ms
+        self._max_latency_ms = max(self._max_latency_ms, latency_ms)
+        self._candidates += len(index.summaries)
+        self._retrieved += len(selected)
+        self._retrieved_tokens += sum(index.token_counts[row] for row in selected)
+        return [index.summaries[row] for row in selected]
+
+    def compare_with_recency(self, recent: List[SessionMetadata], retrieved: List[SessionMetadata]) -> None:
+        """shadow 모드: 최근 요약 방식이 프롬프트에 넣었을 요약 중 검색 결과에도 있는 비율을 기록"""
+        retrieved_ids = {metadata.session_id for metadata in retrieved}
+        remaining = self.summary_token_budget
+        for metadata in recent:
+            if not _has_summary(metadata):
+                continue
+            tokens = count_tokens(metadata.session_summary)
+            if tokens > remaining:
+                continue
+            remaining -= tokens
+            self._recency_selected += 1
+            self._recency_tokens += tokens
+            if metadata.session_id in retrieved_ids:
+                self._recency_matched += 1
+        self._recency_comparisons += 1
+
+    def metrics(self) -> MemoryRetrievalMetrics:
+        retrievals = self._retrievals or 1
+        comparisons = self._recency_comparisons or 1
+        return MemoryRetrievalMetrics(
+            mode=self.mode,
+            retrievals=self._retrievals,
+            failures=self._failures,
+            avg_latency_ms=self._latency_ms / retrievals,
+            max_latency_ms=self._max_latency_ms,
+            index_loads=self._index_loads,
+            avg_index_load_ms=self._index_load_ms / (self._index_loads or 1),
+            cached_users=self._indexes.metrics().size,
+            avg_candidates=self._candidates / retrievals,
+            avg_retrieved=self._retrieved / retrievals,
+            avg_retrieved_tokens=self._retrieved_tokens / retrievals,
+            recency_comparisons=self._recency_comparisons,
+            recency_recall=self._recency_matched / (self._recency_selected or 1),
+            avg_recency_tokens=self._recency_tokens / comparisons,
+        )
+
+    def _search(self, index: SummaryIndex, query: "np.ndarray") -> List[int]:
+        """유사도가 높은 순서로 토큰 예산에 들어가는 요약의 행 번호 (최대 top_k 개)"""
+        import numpy as np
+
+        if not index.summaries:
+            return []
+        scores = index.vectors @ query
+        selected: List[int] = []
+        remaining = self.summary_token_budget
+        for row in np.argsort(-scores):
+            if scores[row] < self.min_similarity or len(selected) >= self.top_k:
+                break
+            tokens = index.token_counts[row]
+            if tokens <= remaining:  # 예산을 넘는 긴 요약은 건너뛰고 다음으로 관련된 요약을 봄
+                selected.append(int(row))
+                remaining -= tokens
+        return selected
+
+    async def _get_index(self, user_id: str) -> SummaryIndex:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+        task = self._loading.get(user_id)
+        if task is None:
+            task = self._loading[user_id] = asyncio.create_task(self._load_index(user_id))
+            task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _load_index(self, user_id: str) -> SummaryIndex:
+        import numpy as np
+
+        started_at = time.perf_counter()
+        with stage("memory.index_load"):
+            items = await self.chat_repo.get_session_summary_items(user_id, self.max_sessions)
+            vectors: List["np.ndarray"] = []
+            summaries: List[SessionMetadata] = []
+            token_counts: List[int] = []
+            for item in items:
+                embedding = item.pop("summary_embedding", None)
+                embedding_model = item.pop("summary_embedding_model", None)
+                metadata = SessionMetadata(**item)
+                if not _has_summary(metadata):
+                    continue
+                if embedding is not None and embedding_model == self.embedding_model_id:
+                    vector = np.frombuffer(embedding, dtype="<f4")
+                elif self.embedding_model == HASHING_EMBEDDING_MODEL:
+                    # 임베딩 이전에 만든 요약이나 설정이 바뀐 경우: 로컬 임베딩은 여기서 바로 계산
+                    vector = hashing_vector(metadata.session_summary, self.embedding_dimensions)
+                else:
+                    continue  # 같은 모델의 임베딩이 없으면 검색에서 제외
+                vectors.append(vector)
+                summaries.append(metadata)
+                token_counts.append(count_tokens(metadata.session_summary))
+        matrix = np.vstack(vectors) if vectors else np.zeros((0, self.embedding_dimensions), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+        index = SummaryIndex(matrix, summaries, token_counts)
+        self._indexes.set(user_id, index)
+        self._index_loads += 1
+        self._index_load_ms += (time.perf_counter() - started_at) * 1000
+        return index
+
+    async def _embed_query(self, question: str) -> "np.ndarray":
+        import numpy as np
+
+        if self.embedding_model == HASHING_EMBEDDING_MODEL:
+            return hashing_vector(question, self.embedding_dimensions)
+        if self._embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+            self._embeddings = OpenAIEmbeddings(
+                model=self.embedding_model, dimensions=self.embedding_dimensions,
+                api_key=settings.OPENAI_API_KEY,
+            )
+        with stage("llm.embed"):
+            vector = np.asarray(await self._embeddings.aembed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def _has_summary(metadata: SessionMetadata) -> bool:
+    return bool(metadata.session_summary) and metadata.session_summary != UNFINISHED_SESSION_SUMMARY
@@ -0,0 +1,238 @@
+import asyncio
+import calendar
+import time
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.telemetry import register_metrics
+from app.repositories.async_chat_repository import AsyncChatRepository
+
+HOUR_SECONDS = 3600
+DAY_SECONDS = 86400
+DAILY_WINDOW_HOURS = 24  # 최근 24시간 = 시간 단위 window 24개
+MONTHLY_WINDOW_DAYS = 30  # 최근 30일 = 일 단위 window 30개
+# DynamoDB TTL 은 즉시 삭제되지 않으므로 조회 범위보다 조금 더 길게 유지
+HOUR_WINDOW_TTL_SECONDS = (DAILY_WINDOW_HOURS + 1) * HOUR_SECONDS
+DAY_WINDOW_TTL_SECONDS = (MONTHLY_WINDOW_DAYS + 1) * DAY_SECONDS
+
+
+def hour_window(timestamp_s: int) -> str:
+    return time.strftime("hour#%Y%m%d%H", time.gmtime(timestamp_s))
+
+
+def day_window(timestamp_s: int) -> str:
+    return time.strftime("day#%Y%m%d", time.gmtime(timestamp_s))
+
+
+class QuotaExceededError(Exception):
+    """사용자의 토큰 한도 초과 (LLM 호출 전에 발생)"""
+
+    def __init__(self, user_id: str, window: str, used: int, limit: int, retry_after_s: int):
+        super().__init__(f"Token quota exceeded for user {user_id}: {window} usage {used}/{limit}.")
+        self.user_id = user_id
+        self.window = window
+        self.used = used
+        self.limit = limit
+        self.retry_after_s = retry_after_s
+
+
+class UserQuotaUsage(BaseModel):
+    daily_tokens: int
+    daily_limit: int
+    monthly_tokens: int
+    monthly_limit: int
+
+
+class QuotaServiceMetrics(BaseModel):
+    checks: int
+    rejections: int
+    loads: int  # 캐시 미스로 DynamoDB 에서 읽은 횟수
+    pending_users: int  # 아직 DynamoDB 에 반영되지 않은 사용량이 있는 사용자 수
+    flushed_updates: int
+    failed_updates: int
+
+
+class QuotaService:
+    """
+    사용자별 토큰 한도(최근 24시간 / 최근 30일) 검사와 사용량 집계.
+
+    - 검사: 워커 로컬 캐시의 사용량으로 판단 (캐시 미스 시에만 DynamoDB Query 1회)
+    - 집계: 로컬 캐시에 즉시 더하고, 백그라운드 루프가 모아서 DynamoDB 에 원자적 ADD 로 반영
+    다른 워커의 사용량은 캐시 TTL 이 지나 다시 읽을 때 반영되므로, 한도는 그만큼 느슨하게 적용됩니다.
+
+    검사는 예약이 아니므로 한도를 넘을 수 있습니다: 사용량은 LLM 응답 후에 기록되어, 한도 직전의 사용자가
+    동시에 보낸 요청은 모두 통과합니다. 초과량은 (동시 요청 수 x 턴당 토큰) + 캐시 TTL 동안의 다른 워커 사용량 이내입니다.
+    """
+
+    def __init__(self, chat_repo: AsyncChatRepository,
+                 daily_limit: int = settings.USER_DAILY_TOKEN_LIMIT,
+                 monthly_limit: int = settings.USER_MONTHLY_TOKEN_LIMIT,
+                 cache_ttl_seconds: float = settings.USER_QUOTA_CACHE_TTL_SECONDS,
+                 max_users: int = settings.USER_QUOTA_CACHE_MAX_USERS,
+                 flush_interval_s: float = settings.USER_QUOTA_FLUSH_INTERVAL_SECONDS):
+        self.chat_repo = chat_repo
+        self.daily_limit = daily_limit
+        self.monthly_limit = monthly_limit
+        self.flush_interval_s = flush_interval_s
+
+        # user_id -> {window: tokens}, DynamoDB 값 + 이후 이 워커에서 기록한 사용량
+        self._usage: TTLCache[Dict[str, int]] = TTLCache(max_users, cache_ttl_seconds, name="quota_usage")
+        # user_id -> {window: tokens}, 아직 DynamoDB 에 반영되지 않은 사용량
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self._loads: Dict[str, asyncio.Task] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self._checks = 0
+        self._rejections = 0
+        self._load_count = 0
+        self._flushed_updates = 0
+        self._failed_updates = 0
+        register_metrics("quota", self.metrics)
+
+    def start(self) -> None:
+        """백그라운드 reconcile 루프 시작"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """루프를 멈추고 남은 사용량을 모두 반영 (graceful shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def check(self, user_id: str, current_time_s: Optional[int] = None) -> UserQuotaUsage:
+        """한도를 넘었으면 QuotaExceededError, 아니면 현재 사용량 반환"""
+        current_time_s = current_time_s or int(time.time())
+        usage = await self._get_usage(user_id)
+        hourly = [usage.get(hour_window(current_time_s - i * HOUR_SECONDS), 0) for i in range(DAILY_WINDOW_HOURS)]
+        daily = [usage.get(day_window(current_time_s - i * DAY_SECONDS), 0) for i in range(MONTHLY_WINDOW_DAYS)]
+        quota_usage = UserQuotaUsage(
+            daily_tokens=sum(hourly),
+            daily_limit=self.daily_limit,
+            monthly_tokens=sum(daily),
+            monthly_limit=self.monthly_limit,
+        )
+        self._checks += 1
+
+        if self.daily_limit and quota_usage.daily_tokens >= self.daily_limit:
+            self._rejections += 1
+            raise QuotaExceededError(
+                user_id, "daily", quota_usage.daily_tokens, self.daily_limit,
+                _retry_after(hourly, self.daily_limit, HOUR_SECONDS, current_time_s),
+            )
+        if self.monthly_limit and quota_usage.monthly_tokens >= self.monthly_limit:
+            self._rejections += 1
+            raise QuotaExceededError(
+                user_id, "monthly", quota_usage.monthly_tokens, self.monthly_limit,
+                _retry_after(daily, self.monthly_limit, DAY_SECONDS, current_time_s),
+            )
+        return quota_usage
+
+    def record(self, user_id: str, tokens: int, current_time_s: Optional[int] = None) -> None:
+        """사용량 기록. 로컬 캐시에 바로 반영하고 DynamoDB 반영은 백그라운드 루프에 맡깁니다."""
+        if tokens <= 0:
+            return
+        current_time_s = current_time_s or int(time.time())
+        windows = (hour_window(current_time_s), day_window(current_time_s))
+        pending = self._pending.setdefault(user_id, {})
+        usage = self._usage.get(user_id)
+        for window in windows:
+            pending[window] = pending.get(window, 0) + tokens
+            if usage is not None:
+                usage[window] = usage.get(window, 0) + tokens
+
+    async def flush(self) -> None:
+        """대기 중인 사용량을 DynamoDB 에 ADD 로 반영, 실패한 항목은 다음 flush 에 다시 시도"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            in_flight, self._pending = self._pending, {}
+            updates = [
+                (user_id, window, tokens)
+                for user_id, windows in in_flight.items()
+                for window, tokens in windows.items()
+            ]
+            results = await asyncio.gather(
+                *(self._add_usage(user_id, window, tokens) for user_id, window, tokens in updates),
+                return_exceptions=True,
+            )
+            for (user_id, window, tokens), result in zip(updates, results):
+                if isinstance(result, Exception):
+                    self._failed_updates += 1
+                    pending = self._pending.setdefault(user_id, {})
+                    pending[window] = pending.get(window, 0) + tokens
+                else:
+                    self._flushed_updates += 1
+
+    def metrics(self) -> QuotaServiceMetrics:
+        return QuotaServiceMetrics(
+            checks=self._checks,
+            rejections=self._rejections,
+            loads=self._load_count,
+            pending_users=len(self._pending),
+            flushed_updates=self._flushed_updates,
+            failed_updates=self._failed_updates,
+        )
+
+    async def _get_usage(self, user_id: str) -> Dict[str, int]:
+        usage = self._usage.get(user_id)
+        if usage is not None:
+            return usage
+        # 같은 사용자의 동시 요청이 각각 Query 하지 않도록 하나의 조회를 공유
+        load = self._loads.get(user_id)
+        if load is None:
+            load = asyncio.create_task(self._load_usage(user_id))
+            self._loads[user_id] = load
+            load.add_done_callback(lambda _: self._loads.pop(user_id, None))
+        return await asyncio.shield(load)
+
+    async def _load_usage(self, user_id: str) -> Dict[str, int]:
+        # flush 와 겹치면 반영 중인 ADD 가 읽은 값에 포함되었는지 알 수 없으므로(중복 또는 누락),
+        # flush 가 없는 동안 읽고 아직 반영되지 않은 이 워커의 사용량(_pending)을 더함
+        async with self._flush_lock:
+            usage = await self.chat_repo.get_user_token_usage(user_id)
+            self._load_count += 1
+            for window, tokens in self._pending.get(user_id, {}).items():
+                usage[window] = usage.get(window, 0) + tokens
+            self._usage.set(user_id, usage)
+        return usage
+
+    async def _add_usage(self, user_id: str, window: str, tokens: int) -> None:
+        window_start_s = _window_start(window)
+        ttl = HOUR_WINDOW_TTL_SECONDS if window.startswith("hour#") else DAY_WINDOW_TTL_SECONDS
+        await self.chat_repo.add_user_token_usage(user_id, window, tokens, window_start_s + ttl)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing user token usage: {e}")
+
+
+def _window_start(window: str) -> int:
+    kind, value = window.split("#", 1)
+    return calendar.timegm(time.strptime(value, "%Y%m%d%H" if kind == "hour" else "%Y%m%d"))
+
+
+def _retry_after(windows: List[int], limit: int, window_seconds: int, current_time_s: int) -> int:
+    """
+    windows(최신순) 의 가장 오래된 window 부터 빠져나간다고 할 때, 사용량이 한도 아래로 내려가기까지 남은 초
+    """
+    used = sum(windows)
+    elapsed_in_window = current_time_s % window_seconds
+    for index, tokens in enumerate(reversed(windows)):
+        used -= tokens
+        if used < limit:
+            return (index + 1) * window_seconds - elapsed_in_window
+    return len(windows) * window_seconds - elapsed_in_window
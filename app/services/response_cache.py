@@ -0,0 +1,189 @@
+import hashlib
+import json
+import math
+import re
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.telemetry import register_metrics
+from app.models.entity import CachedResponse, SessionMetadata
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.context_builder import UNFINISHED_SESSION_SUMMARY
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+Embedding = Dict[int, float]  # 희소 벡터 (차원 인덱스 -> 값), L2 정규화됨
+EMBEDDING_DIMENSIONS = 1 << 18
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """대소문자, 유니코드 표기, 문장 부호, 공백 차이를 없앤 질문"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(char).startswith("P") else char for char in text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def hashing_embedding(text: str) -> Embedding:
+    """
+    글자 3-gram 을 해싱한 로컬 임베딩. 외부 임베딩 API 호출 없이 오타나 어순이 조금 다른 질문을 찾는 용도입니다.
+    """
+    padded = f" {text} "
+    counts: Dict[int, float] = {}
+    for index in range(max(len(padded) - 2, 1)):
+        dimension = zlib.crc32(padded[index:index + 3].encode()) % EMBEDDING_DIMENSIONS
+        counts[dimension] = counts.get(dimension, 0.0) + 1.0
+    norm = math.sqrt(sum(value * value for value in counts.values()))
+    return {dimension: value / norm for dimension, value in counts.items()}
+
+
+def cosine_similarity(a: Embedding, b: Embedding) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(dimension, 0.0) for dimension, value in a.items())
+
+
+class ResponseCacheKey(NamedTuple):
+    cache_key: str
+    context_fingerprint: str
+    prompt: str
+    embedding: Embedding
+
+
+class ResponseCacheMetrics(BaseModel):
+    exact_hits: int
+    similar_hits: int
+    shared_hits: int  # DynamoDB 공유 캐시에서 찾은 경우
+    misses: int
+    stores: int
+    contexts: int
+
+
+class ResponseCache:
+    """
+    LLM 응답 캐시.
+    키는 정규화된 질문 + 컨텍스트 fingerprint(모델/시스템 프롬프트, 세션 요약, 최근 대화) 이므로
+    같은 컨텍스트에서 나온 질문끼리만 응답을 재사용합니다.
+
+    - 로컬: fingerprint 별 LRU 버킷(TTL) 안에서 정확 일치 후 임베딩 유사도로 조회
+    - 공유(선택): DynamoDB 에 cache_key 로 정확 일치만 저장/조회
+    """
+
+    def __init__(self, namespace: str, chat_repo: Optional[AsyncChatRepository] = None,
+                 ttl_seconds: int = settings.RESPONSE_CACHE_TTL_SECONDS,
+                 max_contexts: int = settings.RESPONSE_CACHE_MAX_CONTEXTS,
+                 max_entries_per_context: int = settings.RESPONSE_CACHE_MAX_ENTRIES_PER_CONTEXT,
+                 similarity_threshold: float = settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+                 embed: Callable[[str], Embedding] = hashing_embedding):
+        self.namespace = namespace
+        self.chat_repo = chat_repo  # None 이면 공유 캐시를 사용하지 않음
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_context = max_entries_per_context
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        # 이벤트 루프에서만 접근하므로 버킷(OrderedDict)은 별도 잠금 없이 사용
+        self._contexts: TTLCache["OrderedDict[str, Tuple[Embedding, CachedResponse]]"] = TTLCache(
+            max_contexts, ttl_seconds, name="response_contexts"
+        )
+        self._exact_hits = 0
+        self._similar_hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._stores = 0
+        register_metrics("response_cache", self.metrics)
+
+    def make_key(self, question: str, session_summaries: List[SessionMetadata],
+                 history: List["BaseMessage"]) -> ResponseCacheKey:
+        context = {
+            "namespace": self.namespace,
+            # 프롬프트에 들어가지 않는 빈 요약(진행 중인 세션)은 제외
+            "summaries": [
+                metadata.session_summary for metadata in session_summaries
+                if metadata.session_summary and metadata.session_summary != UNFINISHED_SESSION_SUMMARY
+            ],
+            "history": [[message.type, message.content] for message in history],
+        }
+        fingerprint = hashlib.sha256(
+            json.dumps(context, ensure_ascii=False, separators=(",", ":")).encode()
+        ).hexdigest()
+        prompt = normalize_prompt(question)
+        cache_key = hashlib.sha256(f"{fingerprint}\0{prompt}".encode()).hexdigest()
+        return ResponseCacheKey(cache_key, fingerprint, prompt, self.embed(prompt))
+
+    async def get(self, key: ResponseCacheKey) -> Optional[CachedResponse]:
+        now = int(time.time())
+        bucket = self._contexts.get(key.context_fingerprint)
+        if bucket:
+            entry = bucket.get(key.prompt)
+            if entry and entry[1].expired_at > now:
+                bucket.move_to_end(key.prompt)
+                self._exact_hits += 1
+                return entry[1]
+
+            best_prompt, best_similarity = None, self.similarity_threshold
+            for prompt, (embedding, cached_response) in bucket.items():
+                if cached_response.expired_at <= now:
+                    continue
+                similarity = cosine_similarity(key.embedding, embedding)
+                if similarity >= best_similarity:
+                    best_prompt, best_similarity = prompt, similarity
+            if best_prompt is not None:
+                bucket.move_to_end(best_prompt)
+                self._similar_hits += 1
+                return bucket[best_prompt][1]
+
+        if self.chat_repo:
+            cached_response = await self.chat_repo.get_cached_response(key.cache_key)
+            if cached_response:
+                self._store_local(key, cached_response)
+                self._shared_hits += 1
+                return cached_response
+
+        self._misses += 1
+        return None
+
+    async def put(self, key: ResponseCacheKey, content: str, total_tokens: int) -> None:
+        now = int(time.time())
+        cached_response = CachedResponse(
+            cache_key=key.cache_key,
+            context_fingerprint=key.context_fingerprint,
+            prompt=key.prompt,
+            content=content,
+            total_tokens=total_tokens,
+            created_at=now,
+            expired_at=now + self.ttl_seconds,
+        )
+        self._store_local(key, cached_response)
+        self._stores += 1
+        if self.chat_repo:
+            await self.chat_repo.put_cached_response(cached_response)
+
+    def _store_local(self, key: ResponseCacheKey, cached_response: CachedResponse) -> None:
+        bucket = self._contexts.get(key.context_fingerprint)
+        if bucket is None:
+            bucket = OrderedDict()
+        bucket[key.prompt] = (key.embedding, cached_response)
+        bucket.move_to_end(key.prompt)
+        while len(bucket) > self.max_entries_per_context:
+            bucket.popitem(last=False)
+        # 저장할 때마다 버킷의 TTL / LRU 순서 갱신
+        self._contexts.set(key.context_fingerprint, bucket)
+
+    def metrics(self) -> ResponseCacheMetrics:
+        return ResponseCacheMetrics(
+            exact_hits=self._exact_hits,
+            similar_hits=self._similar_hits,
+            shared_hits=self._shared_hits,
+            misses=self._misses,
+            stores=self._stores,
+            contexts=self._contexts.metrics().size,
+        )
@@ -0,0 +1,122 @@
+import asyncio
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.telemetry import register_metrics
+from app.repositories.async_chat_repository import AsyncChatRepository
+
+
+class SessionExpirySchedulerMetrics(BaseModel):
+    scheduled: int  # 만료 예정으로 추적 중인 사용자 수
+    heap_size: int  # 무효가 되어 아직 꺼내지 않은 항목 포함
+    expired: int  # 직접 종료한 세션 수
+    skipped: int  # 만료 시각에 확인했더니 이미 연장/교체된 경우
+    failures: int
+
+
+class SessionExpiryScheduler:
+    """
+    활성 세션을 만료 시각에 직접 종료하는 워커 내부 타이머.
+
+    DynamoDB TTL 삭제는 수 시간까지 늦어질 수 있어, 이 워커가 연장/생성한 세션의 만료 시각을 기억해 두고
+    그 시각이 지나면 조건부 삭제(session_id 일치 + expired_at 경과)로 세션을 닫습니다.
+    다른 워커가 그 사이 세션을 연장했다면 조건이 맞지 않아 삭제되지 않습니다.
+
+    요약은 삭제로 생기는 스트림 REMOVE 레코드로 summary lambda 가 한 번만 수행합니다.
+    (lambda 를 여기서 직접 호출하면 같은 세션을 두 번 동시에 요약하게 되어 LLM 호출이 중복됨)
+    프로세스가 재시작되면 추적 중이던 만료 예정은 사라지며, 그 세션은 TTL 삭제로 종료됩니다.
+    """
+
+    def __init__(self, chat_repo: AsyncChatRepository,
+                 grace_seconds: float = settings.SESSION_EXPIRY_GRACE_SECONDS,
+                 max_concurrency: int = settings.SESSION_EXPIRY_MAX_CONCURRENCY):
+        self.chat_repo = chat_repo
+        self.grace_seconds = grace_seconds
+        # user_id -> (expired_at, session_id): 사용자마다 가장 최근에 알려진 만료 예정 하나만 유효
+        self._deadlines: Dict[str, Tuple[int, str]] = {}
+        # (expired_at, user_id, session_id) 최소 힙. _deadlines 와 다른 항목은 꺼낼 때 버림
+        self._heap: List[Tuple[int, str, str]] = []
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._expiring: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+        self._expired = 0
+        self._skipped = 0
+        self._failures = 0
+        register_metrics("session_expiry_scheduler", self.metrics)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """타이머 중지. 아직 만료되지 않은 세션은 TTL 삭제에 맡김"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._expiring:
+            await asyncio.gather(*self._expiring, return_exceptions=True)
+
+    def schedule(self, user_id: str, session_id: str, expired_at: int) -> None:
+        """세션을 생성/연장할 때 호출. 같은 사용자의 이전 만료 예정은 무효가 됩니다."""
+        if self._deadlines.get(user_id) == (expired_at, session_id):
+            return
+        self._deadlines[user_id] = (expired_at, session_id)
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (expired_at, user_id, session_id))
+        if earliest is None or expired_at < earliest:
+            self._wakeup.set()  # 가장 이른 만료 시각이 바뀌었으므로 대기 시간을 다시 계산
+
+    def metrics(self) -> SessionExpirySchedulerMetrics:
+        return SessionExpirySchedulerMetrics(
+            scheduled=len(self._deadlines),
+            heap_size=len(self._heap),
+            expired=self._expired,
+            skipped=self._skipped,
+            failures=self._failures,
+        )
+
+    async def _run(self) -> None:
+        while True:
+            timeout = None
+            if self._heap:
+                timeout = max(self._heap[0][0] + self.grace_seconds - time.time(), 0)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            current_time_s = int(time.time() - self.grace_seconds)
+            while self._heap and self._heap[0][0] <= current_time_s:
+                expired_at, user_id, session_id = heapq.heappop(self._heap)
+                if self._deadlines.get(user_id) != (expired_at, session_id):
+                    continue  # 이후에 연장/교체되어 무효가 된 항목
+                del self._deadlines[user_id]
+                task = asyncio.create_task(self._expire(user_id, session_id))
+                self._expiring.add(task)
+                task.add_done_callback(self._expiring.discard)
+
+    async def _expire(self, user_id: str, session_id: str) -> None:
+        async with self._semaphore:
+            try:
+                active_session = await self.chat_repo.expire_active_session(user_id, session_id, int(time.time()))
+            except Exception as e:
+                self._failures += 1
+                print(f"Error expiring active session {session_id} of user {user_id}: {e}")
+                return
+            if active_session is None:
+                # 다른 워커가 연장했거나 이미 교체/삭제됨
+                self._skipped += 1
+                return
+            self._expired += 1
+            print(f"Active session {session_id} of user {user_id} expired.")
@@ -1,20 +1,64 @@
 import json
+import math
+import os
+import random
+import re
+import struct
+import threading
+import time
+import unicodedata
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from functools import lru_cache
 import boto3
-# import openai
-from typing import List, Dict, Any
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple, TypeVar
 from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Key
 
-dynamodb = boto3.resource('dynamodb')
+try:
+    # ADOT(OpenTelemetry) Lambda 레이어가 있으면 span 도 함께 기록
+    from opentelemetry import trace
+except ImportError:
+    trace = None
 
-# LangChainSessionTableName = get_parameter('/p-dynamo/DynamoDB/LangChainSessionTableName')
-# SessionMetadataTableName = get_parameter('/p-dynamo/DynamoDB/SessionMetadataTableName')
-# OpenAIAPIKey = get_parameter('/api-key/openai')
+T = TypeVar("T")
 
 LangChainSessionTableName = "LangChainSession"
 SessionMetadataTableName = "SessionMetadata"
+MessageTableName = "Message"
+# 설정하면 요약 갱신 후 사용자별 컨텍스트 스냅샷(최근 세션 요약)도 다시 만듦 (API 의 CONTEXT_SNAPSHOT_ENABLED 와 함께 사용)
+ContextSnapshotTableName = os.environ.get('CONTEXT_SNAPSHOT_TABLE', '')
+# API 의 SESSION_SUMMARY_WINDOW / CONTEXT_SUMMARY_TOKEN_BUDGET 과 같은 값이어야 API 가 스냅샷을 그대로 사용
+SessionSummaryWindow = int(os.environ.get('SESSION_SUMMARY_WINDOW', '2'))
+ContextSummaryTokenBudget = int(os.environ.get('CONTEXT_SUMMARY_TOKEN_BUDGET', '400'))
+# API 의 CONTEXT_TOKENIZER_ENCODING 과 같은 tiktoken 인코딩 (배포 패키지에 tiktoken 을 포함해야 API 와 같은 토큰 수)
+ContextTokenizerEncoding = os.environ.get('CONTEXT_TOKENIZER_ENCODING', 'o200k_base')
+# 요약마다 임베딩을 계산해 SessionMetadata 에 저장 (API 의 장기 기억 검색용, 빈 값이면 저장하지 않음)
+# "hashing" 은 API 와 같은 로컬 글자 3-gram 임베딩, 그 외에는 OpenAI 임베딩 모델 이름 (API 설정과 같은 값이어야 함)
+SummaryEmbeddingModel = os.environ.get('SUMMARY_EMBEDDING_MODEL', 'hashing')
+SummaryEmbeddingDimensions = int(os.environ.get('SUMMARY_EMBEDDING_DIMENSIONS', '256'))
 
-langchain_session_table = dynamodb.Table(LangChainSessionTableName)
-session_metadata_table = dynamodb.Table(SessionMetadataTableName)
+# 한 배치 안에서 동시에 처리할 레코드 수
+SummaryConcurrency = int(os.environ.get('SUMMARY_CONCURRENCY', '8'))
+# BatchGetItem 한 번에 조회할 수 있는 최대 키 수
+BATCH_GET_MAX_KEYS = 100
+# 한 번의 요약 호출에 넣을 대화 최대 길이. 넘으면 나누어 요약한 뒤 합침 (map-reduce)
+SummaryChunkChars = int(os.environ.get('SUMMARY_CHUNK_CHARS', '12000'))
+# LLM 을 사용할 수 없을 때 저장할 요약의 최대 길이
+SummaryMaxChars = int(os.environ.get('SUMMARY_MAX_CHARS', '2000'))
+# OpenAI API 키는 환경 변수 또는 SSM 파라미터(예: /api-key/openai)에서 읽음
+OpenAIAPIKeyParameterName = os.environ.get('OPENAI_API_KEY_PARAMETER', '')
+SsmParameterCacheTTLSeconds = float(os.environ.get('SSM_PARAMETER_CACHE_TTL_SECONDS', '300'))
+# 단계별 소요 시간을 CloudWatch Embedded Metric Format 로그로 남김 (로그에서 지표가 자동 생성됨)
+StageMetricsEnabled = os.environ.get('SUMMARY_STAGE_METRICS_ENABLED', 'true').lower() == 'true'
+StageMetricsNamespace = os.environ.get('SUMMARY_STAGE_METRICS_NAMESPACE', 'PDynamo/SummaryLambda')
+
+# 세션이 아직 끝나지 않아 요약이 없는 SessionMetadata 의 초기값
+UNFINISHED_SESSION_SUMMARY = 'session not finished yet'
+# LangChainSession 아이템의 History 는 sort_key 가 없으므로 순서 번호로 watermark 를 만듦
+LEGACY_WATERMARK_PREFIX = 'legacy#'
 
 summary_system_prompt = """
 You are a helpful assistant that summarizes the conversation.
@@ -23,25 +67,214 @@ Your Summary will be used after new session for long term memory.
 Summarize the conversation in 10 sentences or less.
 """
 
+incremental_summary_system_prompt = """
+You are a helpful assistant that maintains a running summary of a conversation.
+You will be given the current summary and the new messages of the conversation.
+Update the summary so that it also covers the new messages.
+Your Summary will be used after new session for long term memory.
+Keep the summary in 10 sentences or less.
+"""
+
+reduce_summary_system_prompt = """
+You are a helpful assistant that merges partial summaries of one conversation.
+You will be given summaries of consecutive parts of the conversation, in order.
+Merge them into a single summary in 10 sentences or less.
+"""
+
+
+# 클라이언트/리소스는 import 시점이 아니라 처음 사용할 때 만들고, 이후 호출(warm start)에서 재사용
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.RLock()
+_parameter_cache: Dict[str, Tuple[float, str]] = {}
+
+
+def _get_or_create(name: str, factory: Callable[[], T]) -> T:
+    client = _clients.get(name)
+    if client is None:
+        # 레코드를 여러 스레드에서 처리하므로 한 번만 생성되도록 잠금
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def get_dynamodb():
+    return _get_or_create('dynamodb', lambda: boto3.resource('dynamodb'))
+
+
+def get_table(table_name: str):
+    return _get_or_create(f"table:{table_name}", lambda: get_dynamodb().Table(table_name))
+
 
 def get_parameter(name, with_decryption=True):
-    ssm = boto3.client('ssm')
+    """SSM 파라미터 조회 (TTL 동안 캐시)"""
+    cached = _parameter_cache.get(name)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    ssm = _get_or_create('ssm', lambda: boto3.client('ssm'))
     response = ssm.get_parameter(
         Name=name,
         WithDecryption=with_decryption
     )
-    return response['Parameter']['Value']
+    value = response['Parameter']['Value']
+    _parameter_cache[name] = (time.monotonic() + SsmParameterCacheTTLSeconds, value)
+    return value
 
 
-def get_messages_by_session_id(session_id: str) -> List[str]:
-    """세션 ID로 메시지 조회"""
-    try:
-        response = langchain_session_table.get_item(
-            Key={'session_id': session_id}
-        )
+def get_openai_api_key() -> str:
+    api_key = os.environ.get('OPENAI_API_KEY', '')
+    if not api_key and OpenAIAPIKeyParameterName:
+        api_key = get_parameter(OpenAIAPIKeyParameterName)
+    return api_key
+
+
+def emit_metric(stage_name: str, outcome: str, duration_ms: float, **values: float) -> None:
+    """CloudWatch EMF 형식의 지표 한 줄 출력 (Stage / Outcome 차원)"""
+    if not StageMetricsEnabled:
+        return
+    metrics = [{'Name': 'Duration', 'Unit': 'Milliseconds'}]
+    metrics.extend({'Name': name, 'Unit': 'Count'} for name in values)
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': StageMetricsNamespace,
+                'Dimensions': [['Stage', 'Outcome']],
+                'Metrics': metrics,
+            }],
+        },
+        'Stage': stage_name,
+        'Outcome': outcome,
+        'Duration': round(duration_ms, 3),
+        **values,
+    }))
+
+
+@contextmanager
+def stage(stage_name: str, **attributes: Any) -> Iterator[Dict[str, float]]:
+    """
+    한 단계의 소요 시간 측정. yield 하는 dict 에 넣은 값(토큰 수, 소비 용량 등)도 함께 지표로 기록합니다.
+    """
+    tracer = trace.get_tracer(__name__) if trace is not None else None
+    span_cm = tracer.start_as_current_span(stage_name, attributes=attributes) if tracer else nullcontext()
+    values: Dict[str, float] = {}
+    outcome = 'ok'
+    started_at = time.perf_counter()
+    with span_cm as span:
+        try:
+            yield values
+        except BaseException:
+            outcome = 'error'
+            raise
+        finally:
+            if span is not None and values:
+                span.set_attributes(values)
+            emit_metric(stage_name, outcome, (time.perf_counter() - started_at) * 1000, **values)
+
+
+def add_consumed_capacity(values: Dict[str, float], response: Dict[str, Any]) -> None:
+    """ReturnConsumedCapacity=TOTAL 응답의 소비 용량을 stage 지표에 더함"""
+    consumed = response.get('ConsumedCapacity') or []
+    for capacity in consumed if isinstance(consumed, list) else [consumed]:
+        values['ConsumedCapacity'] = values.get('ConsumedCapacity', 0) + capacity.get('CapacityUnits', 0)
+
+
+@dataclass
+class DeactivatedSession:
+    sequence_number: str  # batchItemFailures 의 itemIdentifier
+    user_id: str
+    session_id: str
+    updated_at: int
+    previous_summary: Optional[str] = None  # 지금까지 누적된 요약
+    summary_watermark: Optional[str] = None  # 마지막으로 요약에 반영된 메시지의 sort_key
 
-        history = response['Item']['History']
-        return [convert_history_item_to_chat(item) for item in history]
+
+@dataclass
+class SessionMessage:
+    sort_key: str
+    text: str
+
+
+def batch_get_items(table_name: str, keys: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """BatchGetItem 으로 여러 아이템을 조회 (처리되지 않은 키는 지수 백오프 후 재시도)"""
+    items = []
+    with stage('dynamodb.batch_get_item', table=table_name) as values:
+        for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+            request_items = {table_name: {'Keys': keys[start:start + BATCH_GET_MAX_KEYS]}}
+            attempt = 0
+            while request_items:
+                if attempt > 0:
+                    time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+                try:
+                    response = get_dynamodb().batch_get_item(
+                        RequestItems=request_items, ReturnConsumedCapacity='TOTAL'
+                    )
+                except ClientError as e:
+                    print(f"Error batch getting items from {table_name}: {e}")
+                    raise
+                add_consumed_capacity(values, response)
+                items.extend(response.get('Responses', {}).get(table_name, []))
+                request_items = response.get('UnprocessedKeys')
+                attempt += 1
+    return items
+
+
+def batch_get_session_messages_from_langchain_table(session_ids: List[str]) -> Dict[str, List[SessionMessage]]:
+    """이전 방식의 LangChainSession 아이템들을 BatchGetItem 으로 한 번에 조회"""
+    items = batch_get_items(LangChainSessionTableName, [{'session_id': session_id} for session_id in session_ids])
+    return {
+        item['session_id']: [
+            SessionMessage(sort_key=f"{LEGACY_WATERMARK_PREFIX}{index:06d}", text=convert_history_item_to_chat(history_item))
+            for index, history_item in enumerate(item['History'])
+        ]
+        for item in items
+    }
+
+
+def batch_get_session_metadata(sessions: List[DeactivatedSession]) -> None:
+    """SessionMetadata 의 누적 요약과 watermark 를 BatchGetItem 으로 한 번에 읽어 세션에 채움"""
+    items = batch_get_items(
+        SessionMetadataTableName,
+        [{'user_id': session.user_id, 'session_id': session.session_id} for session in sessions],
+    )
+    metadata_by_key = {(item['user_id'], item['session_id']): item for item in items}
+    for session in sessions:
+        metadata = metadata_by_key.get((session.user_id, session.session_id), {})
+        summary = metadata.get('session_summary')
+        session.previous_summary = summary if summary != UNFINISHED_SESSION_SUMMARY else None
+        session.summary_watermark = metadata.get('summary_watermark')
+
+
+def get_session_messages_from_message_table(
+        user_id: str, session_id: str, after_sort_key: Optional[str] = None
+) -> List[SessionMessage]:
+    """Message 테이블에서 세션의 메시지를 시간순으로 조회 (after_sort_key 이후의 메시지만)"""
+    if after_sort_key:
+        # '$' 는 '#' 바로 다음 문자이므로 이 세션의 모든 sort_key 보다 큼
+        sort_key_condition = Key('sort_key').between(after_sort_key, f"{session_id}$")
+    else:
+        sort_key_condition = Key('sort_key').begins_with(f"{session_id}#")
+    try:
+        query_kwargs = {
+            'KeyConditionExpression': Key('user_id').eq(user_id) & sort_key_condition,
+            'ReturnConsumedCapacity': 'TOTAL',
+        }
+        messages = []
+        with stage('dynamodb.query_messages') as values:
+            while True:
+                response = get_table(MessageTableName).query(**query_kwargs)
+                add_consumed_capacity(values, response)
+                messages.extend(
+                    SessionMessage(sort_key=item['sort_key'], text=f"{item['sender_type']}: {item['content']}")
+                    for item in response.get('Items', [])
+                    if item['sort_key'] != after_sort_key
+                )
+                if 'LastEvaluatedKey' not in response:
+                    values['Messages'] = len(messages)
+                    return messages
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
     except ClientError as e:
         print(f"Error getting messages for session {session_id}: {e}")
         raise
@@ -56,41 +289,265 @@ def convert_history_item_to_chat(item: Dict[str, Any]) -> str:
     return ""
 
 
+def llm_available() -> bool:
+    if not get_openai_api_key():
+        return False
+    try:
+        import openai  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def call_llm(system_prompt: str, content: str) -> str:
+    """OpenAI 를 사용한 요약. API 키가 없거나 openai 패키지가 없으면 앞부분만 잘라 저장"""
+    if not llm_available():
+        return content[:SummaryMaxChars]
+
+    import openai
+    client = _get_or_create('openai', lambda: openai.OpenAI(api_key=get_openai_api_key()))
+    with stage('llm.summarize', model="gpt-4o-mini") as values:
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content}
+            ],
+            temperature=0.3
+        )
+        if response.usage:
+            values['InputTokens'] = response.usage.prompt_tokens
+            values['OutputTokens'] = response.usage.completion_tokens
+    return response.choices[0].message.content.strip()
+
+
 def summarize_messages(messages: List[str]) -> str:
     """OpenAI를 사용한 메시지 요약"""
-    # if not messages:
-    #     return "요약할 메시지가 없습니다."
+    return call_llm(summary_system_prompt, '\n'.join(messages))
+
 
-    # openai.api_key = OpenAIAPIKey
+def chunk_messages(messages: List[str], max_chars: int) -> List[List[str]]:
+    """메시지를 순서대로 max_chars 이하의 묶음으로 나눔"""
+    chunks: List[List[str]] = [[]]
+    size = 0
+    for message in messages:
+        if chunks[-1] and size + len(message) > max_chars:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(message)
+        size += len(message)
+    return chunks
+
+
+def summarize_incrementally(previous_summary: Optional[str], new_messages: List[str]) -> str:
+    """
+    누적 요약에 새 메시지만 반영합니다.
+    새 메시지가 너무 길면 묶음별로 요약(map)한 뒤 하나로 합쳐(reduce) 반영합니다.
+    """
+    chunks = chunk_messages(new_messages, SummaryChunkChars)
+    if len(chunks) > 1:
+        partial_summaries = [summarize_messages(chunk) for chunk in chunks]
+        while sum(len(summary) for summary in partial_summaries) > SummaryChunkChars and len(partial_summaries) > 1:
+            groups = chunk_messages(partial_summaries, SummaryChunkChars)
+            if len(groups) == len(partial_summaries):
+                # 요약 하나하나가 너무 길어 묶이지 않으면 둘씩 합쳐 반드시 개수가 줄도록 함
+                groups = [partial_summaries[i:i + 2] for i in range(0, len(partial_summaries), 2)]
+            partial_summaries = [call_llm(reduce_summary_system_prompt, '\n\n'.join(group)) for group in groups]
+        new_content = call_llm(reduce_summary_system_prompt, '\n\n'.join(partial_summaries))
+    else:
+        new_content = '\n'.join(new_messages)
+
+    if not previous_summary:
+        return summarize_messages([new_content]) if len(chunks) == 1 else new_content
+    if not llm_available():
+        # LLM 없이 누적할 때는 최신 내용이 남도록 뒷부분을 유지
+        return f"{previous_summary}\n{new_content}"[-SummaryMaxChars:]
+    return call_llm(
+        incremental_summary_system_prompt,
+        f"Current summary:\n{previous_summary}\n\nNew messages:\n{new_content}",
+    )
 
-    # try:
-    #     response = openai.ChatCompletion.create(
-    #         model="gpt-4o-mini",
-    #         messages=[
-    #             {"role": "system", "content": summary_system_prompt},
-    #             {"role": "user", "content": ''.join(messages)}
-    #         ],
-    #         temperature=0.3
-    #     )
 
-    #     return response.choices[0].message['content'].strip()
+_whitespace = re.compile(r"\s+")
 
-    return ''.join(messages)
 
+def normalize_text(text: str) -> str:
+    """대소문자, 유니코드 표기, 문장 부호, 공백 차이를 없앤 텍스트 (API 의 normalize_prompt 와 같은 기준)"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(char).startswith("P") else char for char in text)
+    return _whitespace.sub(" ", text).strip()
 
 
-def update_session_metadata(user_id: str, session_id: str, summary: str, finished_at: int):
+def hashing_embedding(text: str, dimensions: int) -> List[float]:
+    """
+    글자 3-gram 을 부호 있는 해싱으로 dimensions 차원에 모은 L2 정규화 벡터.
+    API 의 app.services.memory_retrieval.hashing_vector 와 같은 값을 만들어야 합니다.
+    """
+    padded = f" {normalize_text(text)} "
+    vector = [0.0] * dimensions
+    for index in range(max(len(padded) - 2, 1)):
+        hashed = zlib.crc32(padded[index:index + 3].encode())
+        vector[hashed % dimensions] += 1.0 if hashed >> 31 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def embed_summary(summary: str) -> Optional[Tuple[str, bytes]]:
+    """(임베딩 모델 식별자, float32 little-endian bytes). 임베딩을 만들 수 없으면 None"""
+    if not SummaryEmbeddingModel:
+        return None
+    if SummaryEmbeddingModel == 'hashing':
+        vector = hashing_embedding(summary, SummaryEmbeddingDimensions)
+    else:
+        if not llm_available():
+            return None
+        import openai
+        client = _get_or_create('openai', lambda: openai.OpenAI(api_key=get_openai_api_key()))
+        with stage('llm.embed', model=SummaryEmbeddingModel) as values:
+            response = client.embeddings.create(
+                model=SummaryEmbeddingModel, input=summary, dimensions=SummaryEmbeddingDimensions
+            )
+            if response.usage:
+                values['InputTokens'] = response.usage.prompt_tokens
+        vector = response.data[0].embedding
+    return f"{SummaryEmbeddingModel}:{SummaryEmbeddingDimensions}", struct.pack(f'<{len(vector)}f', *vector)
+
+
+def update_session_metadata(user_id: str, session_id: str, summary: str, finished_at: int,
+                            summary_watermark: str, previous_watermark: Optional[str],
+                            embedding: Optional[Tuple[str, bytes]] = None) -> bool:
+    """
+    요약과 watermark 갱신. 읽은 이후 다른 실행이 먼저 watermark 를 옮겼다면 갱신하지 않고 False 반환.
+    embedding 이 없으면 이전 요약의 임베딩은 지움 (API 가 요약으로 다시 계산하거나 검색에서 제외)
+    """
+    if previous_watermark is None:
+        condition_expression = "attribute_not_exists(summary_watermark)"
+        expression_attribute_values = {':s': summary, ':n': finished_at, ':w': summary_watermark}
+    else:
+        condition_expression = "summary_watermark = :pw"
+        expression_attribute_values = {
+            ':s': summary, ':n': finished_at, ':w': summary_watermark, ':pw': previous_watermark
+        }
+    update_expression = "SET session_summary = :s, finished_at = :n, summary_watermark = :w"
+    if embedding is not None:
+        update_expression += ", summary_embedding_model = :em, summary_embedding = :e"
+        expression_attribute_values[':em'], expression_attribute_values[':e'] = embedding
+    else:
+        update_expression += " REMOVE summary_embedding_model, summary_embedding"
     try:
-        session_metadata_table.update_item(
-            Key={'user_id': user_id, 'session_id': session_id},
-            UpdateExpression="SET session_summary = :s, finished_at = :n",
-            ExpressionAttributeValues={':s': summary, ':n': finished_at},
-        )
+        with stage('dynamodb.update_session_metadata') as values:
+            response = get_table(SessionMetadataTableName).update_item(
+                Key={'user_id': user_id, 'session_id': session_id},
+                UpdateExpression=update_expression,
+                ConditionExpression=condition_expression,
+                ExpressionAttributeValues=expression_attribute_values,
+                ReturnConsumedCapacity='TOTAL',
+            )
+            add_consumed_capacity(values, response)
+        return True
     except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            print(f"Session {session_id} summary was already advanced by another invocation.")
+            return False
         print(f"Error updating session metadata: {e}")
         raise
 
 
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """API 의 count_tokens 와 같은 tiktoken 인코딩. tiktoken 이 없거나 인코딩 파일을 받을 수 없으면 None"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(ContextTokenizerEncoding)
+    except Exception as e:
+        print(f"Tokenizer unavailable, falling back to conservative token estimates: {e}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    요약의 토큰 수. tiktoken 을 쓸 수 있으면 API 와 같은 인코딩으로 세고,
+    없으면 예산을 넘지 않도록 넉넉하게 추정 (ASCII 2글자당 1토큰, 그 외 글자당 1토큰)
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for ch in text if ch.isascii())
+    return (ascii_chars + 1) // 2 + (len(text) - ascii_chars)
+
+
+def mark_context_snapshot_stale(user_id: str) -> None:
+    """요약을 바꾸기 전에 스냅샷을 stale 로 표시 (이후 갱신이 실패해도 API 가 다시 만들도록)"""
+    get_table(ContextSnapshotTableName).update_item(
+        Key={'user_id': user_id},
+        UpdateExpression='ADD metadata_version :one',
+        ExpressionAttributeValues={':one': 1},
+    )
+
+
+def refresh_context_snapshot(user_id: str) -> bool:
+    """
+    최근 SessionSummaryWindow 개 세션의 요약을 토큰 예산에 맞게 잘라 스냅샷으로 저장.
+    그 사이 세션이 교체되는 등 metadata_version 이 바뀌었으면 저장하지 않고 False 반환.
+    """
+    table = get_table(ContextSnapshotTableName)
+    snapshot = table.get_item(
+        Key={'user_id': user_id}, ConsistentRead=True, ProjectionExpression='metadata_version'
+    ).get('Item') or {}
+    metadata_version = int(snapshot.get('metadata_version', 0))
+    items = get_table(SessionMetadataTableName).query(
+        KeyConditionExpression=Key('user_id').eq(user_id),
+        Limit=SessionSummaryWindow,
+        ScanIndexForward=False,
+        ConsistentRead=True,
+    ).get('Items', [])
+
+    remaining = ContextSummaryTokenBudget
+    for item in items:
+        # 임베딩은 검색 인덱스 용이므로 스냅샷에 복사하지 않음
+        item.pop('summary_embedding', None)
+        item.pop('summary_embedding_model', None)
+        summary = item.get('session_summary')
+        if not summary or summary == UNFINISHED_SESSION_SUMMARY:
+            continue
+        tokens = estimate_tokens(summary)
+        if tokens <= remaining:
+            remaining -= tokens
+        else:
+            del item['session_summary']
+
+    try:
+        table.update_item(
+            Key={'user_id': user_id},
+            UpdateExpression=(
+                'SET summaries = :summaries, #window = :window, summary_token_budget = :budget, '
+                'snapshot_version = :metadata_version, updated_at = :now, '
+                'metadata_version = if_not_exists(metadata_version, :zero) '
+                'ADD version :one'
+            ),
+            ConditionExpression=(
+                '(attribute_not_exists(metadata_version) AND :metadata_version = :zero) '
+                'OR metadata_version = :metadata_version'
+            ),
+            ExpressionAttributeNames={'#window': 'window'},
+            ExpressionAttributeValues={
+                ':summaries': items,
+                ':window': SessionSummaryWindow,
+                ':budget': ContextSummaryTokenBudget,
+                ':metadata_version': metadata_version,
+                ':now': int(time.time()),
+                ':zero': 0,
+                ':one': 1,
+            },
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            print(f"Context snapshot of user {user_id} changed while refreshing, left stale.")
+            return False
+        raise
+
+
 def is_valid_old_item(item: Dict[str, Any]) -> bool:
     """유효한 아이템인지 확인"""
     return (
@@ -102,26 +559,168 @@ def is_valid_old_item(item: Dict[str, Any]) -> bool:
     )
 
 
+def get_deactivated_session(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    종료된 세션의 OldImage 반환.
+    TTL 만료(REMOVE)와, 토큰 한도 초과로 새 세션이 덮어쓴 경우(MODIFY, session_id 변경) 모두 세션 종료로 봅니다.
+    """
+    if record['eventName'] == 'REMOVE':
+        return record['dynamodb'].get('OldImage')
+
+    if record['eventName'] == 'MODIFY':
+        old_image = record['dynamodb'].get('OldImage')
+        new_image = record['dynamodb'].get('NewImage')
+        if old_image and new_image and old_image.get('session_id') != new_image.get('session_id'):
+            return old_image
+
+    return None
+
+
+def is_legacy_watermark(summary_watermark: Optional[str]) -> bool:
+    return summary_watermark is not None and summary_watermark.startswith(LEGACY_WATERMARK_PREFIX)
+
+
+def parse_deactivated_session(record: Dict[str, Any], sequence_number: str) -> Optional[DeactivatedSession]:
+    deactivated_session = get_deactivated_session(record)
+    if not deactivated_session or not is_valid_old_item(deactivated_session):
+        return None
+
+    return DeactivatedSession(
+        sequence_number=sequence_number,
+        user_id=deactivated_session['user_id']['S'],
+        session_id=deactivated_session['session_id']['S'],
+        updated_at=int(deactivated_session['updated_at']['N']),
+    )
+
+
+def summarize_session(session: DeactivatedSession, messages: List[SessionMessage]) -> None:
+    """watermark 이후의 새 메시지만 누적 요약에 반영. 새 메시지가 없으면 아무것도 하지 않음 (멱등)"""
+    new_messages = [
+        message for message in messages
+        if session.summary_watermark is None or message.sort_key > session.summary_watermark
+    ]
+    if not new_messages:
+        print(f"Session {session.session_id} has no new messages to summarize.")
+        return
+
+    with stage('summarize_session') as values:
+        values['Messages'] = len(new_messages)
+        summary = summarize_incrementally(session.previous_summary, [message.text for message in new_messages])
+    try:
+        with stage('summary.embed'):
+            embedding = embed_summary(summary)
+    except Exception as e:
+        # 임베딩 없이도 요약은 저장 (검색 인덱스에서만 빠짐)
+        print(f"Error embedding summary of session {session.session_id}: {e}")
+        embedding = None
+    if ContextSnapshotTableName:
+        mark_context_snapshot_stale(session.user_id)
+    updated = update_session_metadata(
+        session.user_id, session.session_id, summary, session.updated_at,
+        new_messages[-1].sort_key, session.summary_watermark, embedding,
+    )
+    if updated and ContextSnapshotTableName:
+        try:
+            with stage('context_snapshot.refresh'):
+                refresh_context_snapshot(session.user_id)
+        except Exception as e:
+            # 스냅샷은 stale 로 표시되어 있으므로 API 가 다음 요청에서 다시 만듦
+            print(f"Error refreshing context snapshot of user {session.user_id}: {e}")
+
+
 def lambda_handler(event, context):
-    for record in event['Records']:
-        if record['eventName'] != 'REMOVE':
-            continue
+    """
+    스트림 배치의 종료된 세션들을 동시에 요약합니다.
+    실패한 레코드만 batchItemFailures 로 보고하여, 나머지 레코드는 다시 처리되지 않도록 합니다.
+    (이벤트 소스 매핑에 ReportBatchItemFailures 설정 필요)
+    """
+    with stage('handler') as values:
+        result = handle_records(event['Records'])
+        values['Records'] = len(event['Records'])
+        values['FailedRecords'] = len(result['batchItemFailures'])
+    return result
 
-        print(record)
-        deactivated_session = record['dynamodb'].get('OldImage')
 
-        if not deactivated_session or not is_valid_old_item(deactivated_session):
+def handle_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    sessions: List[DeactivatedSession] = []
+    failed_sequence_numbers: List[str] = []
+    for record in records:
+        sequence_number = (record.get('dynamodb') or {}).get('SequenceNumber')
+        if not sequence_number:
+            # batchItemFailures 로 보고할 수 없고 (빈 itemIdentifier 는 배치 전체 실패), 재시도해도 처리할 수 없으므로 건너뜀
+            print(f"Skipping record {record.get('eventID')} without a sequence number: {record}")
             continue
+        try:
+            session = parse_deactivated_session(record, sequence_number)
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"Error parsing record {record.get('eventID')}: {e}")
+            failed_sequence_numbers.append(sequence_number)
+            continue
+        if session is not None:
+            print(record)
+            sessions.append(session)
+
+    if sessions:
+        # 0. 누적 요약과 watermark 를 BatchGetItem 으로 한 번에 조회
+        try:
+            batch_get_session_metadata(sessions)
+        except Exception as e:
+            print(f"Error getting session metadata: {e}")
+            failed_sequence_numbers.extend(session.sequence_number for session in sessions)
+            sessions = []
+
+    with ThreadPoolExecutor(max_workers=SummaryConcurrency) as executor:
+        # 1. Message 테이블에서 세션별로 watermark 이후의 메시지만 동시에 조회
+        message_futures = [
+            executor.submit(
+                get_session_messages_from_message_table, session.user_id, session.session_id,
+                None if is_legacy_watermark(session.summary_watermark) else session.summary_watermark,
+            )
+            for session in sessions
+        ]
+        messages_by_session_id: Dict[str, List[SessionMessage]] = {}
+        pending_sessions: List[DeactivatedSession] = []
+        for session, future in zip(sessions, message_futures):
+            try:
+                messages_by_session_id[session.session_id] = future.result()
+                pending_sessions.append(session)
+            except Exception as e:
+                print(f"Error getting messages for session {session.session_id}: {e}")
+                failed_sequence_numbers.append(session.sequence_number)
 
-        user_id = deactivated_session['user_id']['S']
-        session_id = deactivated_session['session_id']['S']
-        updated_at = deactivated_session['updated_at']['N']
+        # 2. Message 테이블에 없는 이전 방식의 세션은 BatchGetItem 으로 한 번에 조회
+        legacy_session_ids = [
+            session.session_id for session in pending_sessions
+            if not messages_by_session_id[session.session_id]
+            and (session.summary_watermark is None or is_legacy_watermark(session.summary_watermark))
+        ]
+        if legacy_session_ids:
+            try:
+                messages_by_session_id.update(batch_get_session_messages_from_langchain_table(legacy_session_ids))
+            except Exception as e:
+                print(f"Error getting legacy langchain sessions: {e}")
+                failed_sequence_numbers.extend(
+                    session.sequence_number for session in pending_sessions
+                    if session.session_id in legacy_session_ids
+                )
+                pending_sessions = [
+                    session for session in pending_sessions if session.session_id not in legacy_session_ids
+                ]
 
-        messages = get_messages_by_session_id(session_id)
-        summary = summarize_messages(messages)
-        update_session_metadata(user_id, session_id, summary, updated_at)
+        # 3. 요약 및 SessionMetadata 갱신을 동시에 수행
+        summary_futures = [
+            executor.submit(summarize_session, session, messages_by_session_id[session.session_id])
+            for session in pending_sessions
+        ]
+        for session, future in zip(pending_sessions, summary_futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error summarizing session {session.session_id}: {e}")
+                failed_sequence_numbers.append(session.sequence_number)
 
     return {
-        'statusCode': 200,
-        'body': json.dumps('summary succeed')
+        'batchItemFailures': [
+            {'itemIdentifier': sequence_number} for sequence_number in failed_sequence_numbers
+        ]
     }
@@ -0,0 +1,105 @@
+import os
+
+# Settings 는 import 시점에 환경 변수를 읽으므로 app 모듈보다 먼저 설정
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-2")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("APP_ENV", "test")
+
+import asyncio  # noqa: E402
+from typing import Dict, List  # noqa: E402
+
+import boto3  # noqa: E402
+import pytest  # noqa: E402
+from langchain_core.language_models.chat_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult  # noqa: E402
+from moto import mock_aws  # noqa: E402
+from pydantic import Field  # noqa: E402
+
+from app.core import telemetry  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.repositories.chat_repository import ChatRepository  # noqa: E402
+
+# 테이블 이름 -> (파티션 키, 정렬 키)
+KEY_SCHEMAS = {
+    settings.DYNAMODB_SESSION_METADATA_TABLE: ("user_id", "session_id"),
+    settings.DYNAMODB_MESSAGE_TABLE: ("user_id", "sort_key"),
+    settings.DYNAMODB_ACTIVE_SESSION_TABLE: ("user_id", None),
+    settings.DYNAMODB_LANGCHAIN_TABLE: ("session_id", None),
+    settings.DYNAMODB_RESPONSE_CACHE_TABLE: ("cache_key", None),
+    settings.DYNAMODB_USER_TOKEN_USAGE_TABLE: ("user_id", "window"),
+    settings.DYNAMODB_IDEMPOTENCY_TABLE: ("idempotency_key", None),
+    settings.DYNAMODB_CONTEXT_SNAPSHOT_TABLE: ("user_id", None),
+}
+
+
+@pytest.fixture
+def dynamodb():
+    """moto 로 대체한 DynamoDB 와 앱이 사용하는 테이블"""
+    with mock_aws():
+        resource = boto3.resource("dynamodb", region_name=settings.AWS_REGION)
+        for table_name, (hash_key, range_key) in KEY_SCHEMAS.items():
+            keys = [(hash_key, "HASH")] + ([(range_key, "RANGE")] if range_key else [])
+            resource.create_table(
+                TableName=table_name,
+                KeySchema=[{"AttributeName": name, "KeyType": key_type} for name, key_type in keys],
+                AttributeDefinitions=[{"AttributeName": name, "AttributeType": "S"} for name, _ in keys],
+                BillingMode="PAY_PER_REQUEST",
+            )
+        yield resource
+
+
+@pytest.fixture
+def repo(dynamodb) -> ChatRepository:
+    # 캐시 없이 DynamoDB 의 조건식만으로 동작을 확인
+    return ChatRepository(dynamodb, cache_enabled=False)
+
+
+@pytest.fixture(autouse=True)
+def restore_metrics_sources(monkeypatch):
+    # 테스트에서 만든 서비스가 register_metrics 로 앱의 지표 등록을 덮어쓰지 않도록 테스트마다 복원
+    monkeypatch.setattr(telemetry, "_metrics_sources", dict(telemetry._metrics_sources))
+
+
+class FakeChatModel(BaseChatModel):
+    """ChatOpenAI 대신 사용할 결정적 채팅 모델: reply 를 단어 단위로 스트리밍하고 호출마다 입력을 기록"""
+
+    reply: str = "hello there"
+    total_tokens: int = 7
+    token_delay_s: float = 0.0
+    calls: List[List[BaseMessage]] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-test"
+
+    def _usage(self) -> Dict[str, int]:
+        return {"input_tokens": self.total_tokens - 2, "output_tokens": 2, "total_tokens": self.total_tokens}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(list(messages))
+        message = AIMessage(content=self.reply, usage_metadata=self._usage())
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(list(messages))
+        for index, word in enumerate(self.reply.split(" ")):
+            await asyncio.sleep(self.token_delay_s)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if index == 0 else f" {word}"))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage()))
+
+
+@pytest.fixture
+def chat_model(monkeypatch) -> FakeChatModel:
+    """프로세스 공유 체인이 가짜 모델로 만들어지도록 교체 (테스트 후 체인 캐시 초기화)"""
+    from app.services import chat_service
+
+    model = FakeChatModel()
+    monkeypatch.setattr(chat_service, "build_chat_model", lambda: model)
+    chat_service.get_chain.cache_clear()
+    chat_service.get_chain_with_history.cache_clear()
+    yield model
+    chat_service.get_chain.cache_clear()
+    chat_service.get_chain_with_history.cache_clear()
@@ -0,0 +1,370 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import httpx
+from boto3.dynamodb.conditions import Key
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.core import cursor as cursor_module
+from app.core.cursor import InvalidCursorError, check_cursor_secret, encode_cursor
+from app.api.responses import ORJSONResponse
+from app.api.v1 import chat_routes
+from app.core.message_key import make_message_sort_key
+from app.models.entity import Message
+from app.models.request import SendMessageRequest
+from app.models.response import ChatHistoryResponse, MessageResponse
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.chat_service import ChatService, build_history_response
+from app.services.idempotency_service import IdempotencyService
+from app.services.quota_service import QuotaService
+
+NOW = 1_700_000_000
+TTL = 600
+LIMIT = 200
+
+
+def session_ids(dynamodb, user_id):
+    table = dynamodb.Table(settings.DYNAMODB_SESSION_METADATA_TABLE)
+    return {item["session_id"] for item in table.query(KeyConditionExpression=Key("user_id").eq(user_id))["Items"]}
+
+
+def active_session_item(dynamodb, user_id):
+    # get_active_session 은 현재 시각 기준으로 만료를 판단하므로 아이템을 직접 읽음
+    return dynamodb.Table(settings.DYNAMODB_ACTIVE_SESSION_TABLE).get_item(Key={"user_id": user_id})["Item"]
+
+
+def put_message(repo, user_id, session_id, message_id, created_at, content):
+    repo.put_message(Message(
+        user_id=user_id, sort_key=make_message_sort_key(session_id, message_id), session_id=session_id,
+        created_at=created_at, sender_type="human", content=content,
+    ))
+
+
+def run_with_service(repo, coroutine_factory, configure=lambda chat_repo: {}):
+    """
+    executor 스레드 하나로 ChatService 를 실행 (moto 는 동시 트랜잭션에 스레드 안전하지 않음).
+    요청들의 DynamoDB 호출은 이벤트 루프에서 서로 끼어들므로 경쟁 상태는 그대로 재현됩니다.
+    configure 는 저장소를 받아 ChatService 의 추가 인자(quota_service 등)를 반환합니다.
+    """
+    async def main():
+        chat_repo = AsyncChatRepository(repo, ThreadPoolExecutor(max_workers=1), write_behind=False)
+        try:
+            return await coroutine_factory(ChatService(chat_repo, **configure(chat_repo)))
+        finally:
+            await chat_repo.close()
+            chat_repo.executor.shutdown(wait=True)
+
+    return asyncio.run(main())
+
+
+# user-006: 조건부 upsert 와 세션 교체 경쟁
+
+def test_touch_extends_only_live_session_within_limit(repo):
+    assert repo.touch_active_session("u", NOW, TTL, LIMIT) is None  # 세션 없음
+    assert repo.rollover_active_session("u", "s1", NOW, TTL, LIMIT)
+
+    touched = repo.touch_active_session("u", NOW + 10, TTL, LIMIT)
+    assert touched.session_id == "s1" and touched.expired_at == NOW + 10 + TTL
+
+    repo.update_active_session_token_usage("u", LIMIT + 1)
+    assert repo.touch_active_session("u", NOW + 20, TTL, LIMIT) is None  # 한도 초과
+    assert repo.touch_active_session("v", NOW, TTL, LIMIT) is None
+
+
+def test_touch_does_not_extend_expired_session(repo):
+    assert repo.rollover_active_session("u", "s1", NOW, TTL, LIMIT)
+    assert repo.touch_active_session("u", NOW + TTL, TTL, LIMIT) is None
+
+
+def test_rollover_replaces_only_exhausted_or_expired_session(repo, dynamodb):
+    assert repo.rollover_active_session("u", "s1", NOW, TTL, LIMIT)
+    # 한도 이내의 활성 세션은 교체하지 않음 (동시에 교체를 시도한 요청)
+    assert not repo.rollover_active_session("u", "s2", NOW, TTL, LIMIT)
+    assert active_session_item(dynamodb, "u")["session_id"] == "s1"
+
+    repo.update_active_session_token_usage("u", LIMIT + 1)
+    assert repo.rollover_active_session("u", "s3", NOW + 1, TTL, LIMIT)
+    assert active_session_item(dynamodb, "u")["token_usage"] == 0
+
+    assert repo.rollover_active_session("u", "s4", NOW + 1 + TTL, TTL, LIMIT)  # 만료(TTL 삭제 전)
+    assert session_ids(dynamodb, "u") == {"s1", "s3", "s4"}
+
+
+def test_concurrent_upserts_create_one_session(repo, dynamodb):
+    async def upsert_many(service):
+        return await asyncio.gather(*(service.upsert_active_session("u", NOW) for _ in range(5)))
+
+    results = run_with_service(repo, upsert_many)
+
+    assert len(set(results)) == 1
+    assert session_ids(dynamodb, "u") == set(results)
+
+
+def test_concurrent_upserts_roll_over_exhausted_session_once(repo, dynamodb):
+    assert repo.rollover_active_session("u", "old", NOW, TTL, LIMIT)
+    repo.update_active_session_token_usage("u", LIMIT + 1)
+
+    async def upsert_many(service):
+        return await asyncio.gather(*(service.upsert_active_session("u", NOW + 1) for _ in range(5)))
+
+    results = run_with_service(repo, upsert_many)
+
+    assert len(set(results)) == 1 and results[0] != "old"
+    assert session_ids(dynamodb, "u") == {"old", results[0]}
+
+
+# user-014: 기존(초 단위) sort_key 와 신규 sort_key 가 섞인 세션의 정렬과 범위 조회
+
+@pytest.fixture
+def mixed_session(repo):
+    put_message(repo, "u", "s", f"{NOW:010d}", NOW, "legacy-0")
+    put_message(repo, "u", "s", f"{NOW * 1000 + 500:013d}-0000-aaaa", NOW, "new-0.5")
+    put_message(repo, "u", "s", f"{NOW * 1000 + 500:013d}-0001-aaaa", NOW, "new-0.5-seq1")
+    put_message(repo, "u", "s", f"{NOW + 1:010d}", NOW + 1, "legacy-1")
+    put_message(repo, "u", "s", f"{(NOW + 1) * 1000 + 999:013d}-0000-bbbb", NOW + 1, "new-1.999")
+    put_message(repo, "u", "s", f"{(NOW + 2) * 1000:013d}-0000-aaaa", NOW + 2, "new-2")
+    put_message(repo, "u", "other", f"{NOW:010d}", NOW, "other-session")
+    return repo
+
+
+def test_mixed_sort_keys_are_in_chronological_order(mixed_session):
+    messages = mixed_session.get_recent_messages_of_session("u", "s", 10)
+    assert [message.content for message in messages] == [
+        "legacy-0", "new-0.5", "new-0.5-seq1", "legacy-1", "new-1.999", "new-2",
+    ]
+
+
+def test_time_range_includes_both_formats_at_boundaries(mixed_session):
+    items, cursor = mixed_session.get_message_items_of_user("u", None, 10, "s", NOW, NOW + 1)
+    assert [item["content"] for item in items] == [
+        "new-1.999", "legacy-1", "new-0.5-seq1", "new-0.5", "legacy-0",
+    ]
+    assert cursor is None
+
+    items, _ = mixed_session.get_message_items_of_user("u", None, 10, "s", NOW + 1, None)
+    assert [item["content"] for item in items] == ["new-2", "new-1.999", "legacy-1"]
+
+
+def test_time_range_without_session_filters_on_created_at(mixed_session):
+    items, _ = mixed_session.get_message_items_of_user("u", None, 10, None, NOW + 2, None)
+    assert [item["content"] for item in items] == ["new-2"]
+
+
+# user-015: 서명된 커서
+
+def history(repo, user_id, cursor=None, limit=2, session_id=None):
+    return run_with_service(repo, lambda service: service.get_user_history(user_id, cursor, limit, session_id))
+
+
+def test_cursor_pages_through_history(mixed_session):
+    contents = []
+    cursor = None
+    while True:
+        page = history(mixed_session, "u", cursor, session_id="s")
+        contents += [message.content for message in page.messages]
+        cursor = page.cursor
+        if cursor is None:
+            break
+    assert contents == ["new-2", "new-1.999", "legacy-1", "new-0.5-seq1", "new-0.5", "legacy-0"]
+
+
+def test_tampered_cursor_is_rejected(mixed_session):
+    cursor = history(mixed_session, "u", session_id="s").cursor
+    body, signature = cursor.split(".")
+    tampered = f"{body[:-2]}{'A' if body[-2] != 'A' else 'B'}{body[-1]}.{signature}"
+    with pytest.raises(InvalidCursorError):
+        history(mixed_session, "u", tampered, session_id="s")
+    with pytest.raises(InvalidCursorError):
+        history(mixed_session, "u", "not-a-cursor", session_id="s")
+
+
+def test_cursor_of_another_user_or_query_is_rejected(mixed_session):
+    cursor = history(mixed_session, "u", session_id="s").cursor
+    with pytest.raises(InvalidCursorError):
+        history(mixed_session, "someone-else", cursor, session_id="s")
+    with pytest.raises(InvalidCursorError):
+        history(mixed_session, "u", cursor, session_id="other")
+
+
+def test_expired_cursor_is_rejected(mixed_session):
+    _, next_key = mixed_session.get_message_items_of_user("u", None, 2, "s")
+    query = {"u": "u", "s": "s", "a": None, "b": None, "k": next_key}
+    with pytest.raises(InvalidCursorError, match="expired"):
+        history(mixed_session, "u", encode_cursor(query, ttl_seconds=-1), session_id="s")
+    assert len(history(mixed_session, "u", encode_cursor(query), session_id="s").messages) == 2
+
+
+@pytest.mark.parametrize("app_env, secret, ok", [
+    ("production", "", False), ("production", "s3cret", True), ("local", "", True),
+])
+def test_cursor_secret_is_required_outside_local_environments(monkeypatch, app_env, secret, ok):
+    monkeypatch.setattr(settings, "APP_ENV", app_env)
+    monkeypatch.setattr(settings, "HISTORY_CURSOR_SECRET", secret)
+    cursor_module._get_secret.cache_clear()
+    try:
+        if ok:
+            check_cursor_secret()
+        else:
+            with pytest.raises(RuntimeError, match="HISTORY_CURSOR_SECRET"):
+                check_cursor_secret()
+    finally:
+        cursor_module._get_secret.cache_clear()
+
+
+# user-016: 검증을 생략한 /history 응답
+
+async def get_history(service, user_id, **params):
+    """chat_routes 만 등록한 앱으로 기록을 조회하고 (상태 코드, JSON 본문) 반환"""
+    app = FastAPI()
+    app.include_router(chat_routes.router, prefix="/api/v1")
+    app.state.chat_service = service
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get(f"/api/v1/history/{user_id}", params=params)
+        return response.status_code, response.json()
+
+
+def test_fast_path_matches_validated_response(mixed_session):
+    items, _ = mixed_session.get_message_items_of_user("u", None, 10, "s")
+    messages, _ = mixed_session.get_messages_of_user("u", None, 10, "s")
+    expected = ChatHistoryResponse(messages=[
+        MessageResponse(
+            content=message.content, type=message.sender_type,
+            timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(message.created_at)),
+        )
+        for message in messages
+    ], cursor="c")
+
+    body = ORJSONResponse(build_history_response(items, "c")).body
+
+    assert json.loads(body) == expected.model_dump()
+
+
+def test_history_route_pages_with_cursor(mixed_session):
+    async def scenario(service):
+        first = await get_history(service, "u", session_id="s", limit=4)
+        second = await get_history(service, "u", session_id="s", limit=4, cursor=first[1]["cursor"])
+        rejected = await get_history(service, "u", session_id="other", cursor=first[1]["cursor"])
+        return first, second, rejected
+
+    (status1, first), (status2, second), (status3, _) = run_with_service(mixed_session, scenario)
+
+    assert (status1, status2, status3) == (200, 200, 400)
+    assert [message["content"] for message in first["messages"]] == ["new-2", "new-1.999", "legacy-1", "new-0.5-seq1"]
+    assert [message["content"] for message in second["messages"]] == ["new-0.5", "legacy-0"]
+    assert second["cursor"] is None and first["messages"][0]["timestamp"] == "2023-11-14T22:13:22Z"
+
+
+# user-018: 스트리밍 경로의 한도 검사
+
+async def post_stream(service, content, user_id="u"):
+    """chat_routes 만 등록한 앱으로 스트리밍 요청을 보내고 (상태 코드, 본문) 반환"""
+    app = FastAPI()
+    app.include_router(chat_routes.router, prefix="/api/v1")
+    app.state.chat_service = service
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/api/v1/send_message/stream", json={"user_id": user_id, "content": content})
+        return response.status_code, response.text
+
+
+def with_quota(daily_limit):
+    return lambda chat_repo: {"quota_service": QuotaService(chat_repo, daily_limit=daily_limit, monthly_limit=0)}
+
+
+def test_stream_checks_quota_once_per_turn(repo, chat_model):
+    async def scenario(service):
+        status_code, body = await post_stream(service, "hi")
+        return status_code, body, service.quota_service.metrics()
+
+    status_code, body, metrics = run_with_service(repo, scenario, with_quota(1000))
+
+    assert status_code == 200 and "event: done" in body
+    assert metrics.checks == 1 and metrics.loads == 1
+
+
+def test_stream_over_quota_is_rejected_before_streaming(repo, chat_model):
+    async def scenario(service):
+        service.quota_service.record("u", 1000)
+        return await post_stream(service, "hi")
+
+    status_code, _ = run_with_service(repo, scenario, with_quota(1000))
+
+    assert status_code == 429 and chat_model.calls == []
+
+
+# user-004: 스트리밍 응답과 연결 종료
+
+def stored_messages(repo, user_id="u"):
+    items, _ = repo.get_message_items_of_user(user_id, None, 100)
+    return sorted((item["sender_type"], item["content"]) for item in items)
+
+
+def test_stream_yields_tokens_then_saves_the_turn(repo, dynamodb, chat_model):
+    async def scenario(service):
+        return [event async for event in service.stream_user_message(SendMessageRequest(user_id="u", content="hi"))]
+
+    events = run_with_service(repo, scenario)
+
+    assert [event.event for event in events] == ["token", "token", "done"]
+    assert "".join(event.content for event in events[:-1]) == events[-1].content == "hello there"
+    assert stored_messages(repo) == [("ai", "hello there"), ("human", "hi")]
+    assert active_session_item(dynamodb, "u")["token_usage"] == chat_model.total_tokens
+
+
+def test_disconnect_mid_stream_does_not_save_the_turn(repo, dynamodb, chat_model):
+    chat_model.token_delay_s = 0.05
+
+    async def scenario(service):
+        stream = service.stream_user_message(SendMessageRequest(user_id="u", content="hi"))
+        first = await stream.__anext__()
+        await stream.aclose()  # 클라이언트 연결 종료
+        return first
+
+    assert run_with_service(repo, scenario).content == "hello"
+    assert stored_messages(repo) == []
+    assert active_session_item(dynamodb, "u")["token_usage"] == 0
+
+
+def test_cancel_while_completing_still_records_token_usage(repo, dynamodb, chat_model):
+    async def scenario(service):
+        completing = asyncio.Event()
+        update_token_usage = service.chat_repo.update_active_session_token_usage
+
+        async def slow_update(user_id, tokens):
+            completing.set()
+            await asyncio.sleep(0.05)
+            await update_token_usage(user_id, tokens)
+
+        service.chat_repo.update_active_session_token_usage = slow_update
+
+        async def consume():
+            async for _ in service.stream_user_message(SendMessageRequest(user_id="u", content="hi")):
+                pass
+
+        consumer = asyncio.create_task(consume())
+        await completing.wait()
+        consumer.cancel()  # 응답 생성이 끝난 뒤 저장 도중 연결이 끊김
+        with pytest.raises(asyncio.CancelledError):
+            await consumer
+        await asyncio.sleep(0.1)
+
+    run_with_service(repo, scenario)
+    assert active_session_item(dynamodb, "u")["token_usage"] == chat_model.total_tokens
+    assert stored_messages(repo) == [("ai", "hello there"), ("human", "hi")]
+
+
+def test_duplicate_stream_request_replays_only_the_done_event(repo, chat_model):
+    async def scenario(service):
+        request = SendMessageRequest(user_id="u", content="hi", idempotency_key="k1")
+        first = [event async for event in service.stream_user_message(request)]
+        return first, [event async for event in service.stream_user_message(request)]
+
+    first, second = run_with_service(repo, scenario, lambda chat_repo: {
+        "idempotency_service": IdempotencyService(chat_repo, record_enabled=True),
+    })
+
+    assert [event.event for event in second] == ["done"] and second[0] == first[-1]
+    assert len(chat_model.calls) == 1
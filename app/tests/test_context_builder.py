@@ -0,0 +1,88 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.models.entity import SessionMetadata
+from app.services import context_builder
+from app.services.context_builder import UNFINISHED_SESSION_SUMMARY, ContextBuilder, trim_session_summaries
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # 토크나이저 대신 단어 수를 토큰 수로 사용해 예산 계산을 결정적으로 만듦
+    monkeypatch.setattr(context_builder, "count_tokens", lambda text: len(text.split()))
+
+
+def summary(session_id, text):
+    return SessionMetadata(user_id="u", session_id=session_id, created_at=1, session_summary=text)
+
+
+def words(count, word="w"):
+    return " ".join([word] * count)
+
+
+# user-009: 토큰 예산에 맞춘 컨텍스트 구성
+
+def test_summaries_fill_summary_budget_newest_first():
+    builder = ContextBuilder(token_budget=100, summary_token_budget=10)
+    summaries = [
+        summary("s4", words(4, "newest")),
+        summary("s3", UNFINISHED_SESSION_SUMMARY),
+        summary("s2", words(8, "big")),  # 남은 요약 예산(6)보다 큼
+        summary("s1", words(5, "older")),
+    ]
+
+    context = builder.build("q", [], summaries)
+
+    assert "newest" in context.summaries and "older" in context.summaries and "big" not in context.summaries
+    assert context.summaries.index("newest") < context.summaries.index("older")
+    assert context.prompt_tokens == 1 + 4 + 5 and context.saved_tokens == 8
+
+
+def test_history_keeps_newest_contiguous_turns_within_budget():
+    builder = ContextBuilder(token_budget=10, summary_token_budget=0)
+    history = [
+        HumanMessage(content=words(1, "oldest")),
+        AIMessage(content=words(6, "long")),
+        HumanMessage(content=words(3, "recent")),
+        AIMessage(content=words(4, "latest")),
+    ]
+
+    context = builder.build(words(2, "q"), history)
+
+    # 예산 10 = 질문 2 + latest 4 + recent 3, long 이 넘치면 그보다 오래된 턴은 들어갈 수 있어도 넣지 않음
+    assert [message.content.split()[0] for message in context.history] == ["recent", "latest"]
+    assert context.prompt_tokens == 9 and context.saved_tokens == 7
+
+
+def test_stored_token_count_is_used_instead_of_counting():
+    builder = ContextBuilder(token_budget=5, summary_token_budget=0)
+    history = [HumanMessage(content="short", response_metadata={"token_count": 10})]
+
+    context = builder.build("q", history)
+
+    assert context.history == [] and context.saved_tokens == 10
+
+
+def test_question_over_budget_leaves_no_context():
+    builder = ContextBuilder(token_budget=3, summary_token_budget=3)
+    context = builder.build(words(5), [HumanMessage(content="hi")], [summary("s1", "a summary")])
+    assert context.history == [] and context.summaries == "" and context.prompt_tokens == 5
+
+
+def test_metrics_accumulate_across_builds():
+    builder = ContextBuilder(token_budget=4, summary_token_budget=0)
+    builder.build("q", [HumanMessage(content=words(5))])
+    builder.build("q", [HumanMessage(content=words(2))])
+
+    metrics = builder.metrics()
+    assert metrics.built_contexts == 2 and metrics.prompt_tokens == 1 + 3 and metrics.saved_tokens == 5
+
+
+def test_trim_session_summaries_matches_build_selection():
+    summaries = [summary("s3", words(4, "a")), summary("s2", words(8, "b")), summary("s1", words(5, "c"))]
+
+    trimmed = trim_session_summaries(summaries, 10)
+
+    assert [metadata.session_summary for metadata in trimmed] == [words(4, "a"), None, words(5, "c")]
+    built = ContextBuilder(token_budget=100, summary_token_budget=10).build("q", [], summaries)
+    assert built.summaries == ContextBuilder(token_budget=100, summary_token_budget=10).build("q", [], trimmed).summaries
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.config import settings
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.context_snapshot import ContextSnapshotService
+from app.summary_lambda import summary_lambda
+
+TTL = 600
+LIMIT = 200
+
+
+@pytest.fixture
+def snapshot_repo(repo, monkeypatch):
+    # 세션 교체 트랜잭션이 스냅샷을 stale 로 표시하도록 설정
+    monkeypatch.setattr(settings, "CONTEXT_SNAPSHOT_ENABLED", True)
+    return repo
+
+
+def run_snapshot(repo, scenario, **options):
+    async def main():
+        chat_repo = AsyncChatRepository(repo, ThreadPoolExecutor(max_workers=1), write_behind=False)
+        service = ContextSnapshotService(chat_repo, **{"window": 2, "summary_token_budget": 400, **options})
+        try:
+            return await scenario(service)
+        finally:
+            await chat_repo.close()
+            chat_repo.executor.shutdown(wait=True)
+
+    return asyncio.run(main())
+
+
+def start_session(repo, session_id, created_at, user_id="u"):
+    assert repo.rollover_active_session(user_id, session_id, created_at, TTL, LIMIT)
+    repo.update_active_session_token_usage(user_id, LIMIT + 1)  # 다음 세션으로 교체할 수 있도록 한도 초과
+
+
+def set_summary(dynamodb, session_id, summary, user_id="u"):
+    dynamodb.Table(settings.DYNAMODB_SESSION_METADATA_TABLE).update_item(
+        Key={"user_id": user_id, "session_id": session_id},
+        UpdateExpression="SET session_summary = :s", ExpressionAttributeValues={":s": summary},
+    )
+
+
+def summaries_of(metadata):
+    return [(item.session_id, item.session_summary) for item in metadata]
+
+
+# user-023: 사용자별 컨텍스트 스냅샷과 stale 판단
+
+def test_missing_snapshot_is_built_then_reused(snapshot_repo):
+    async def scenario(service):
+        built = await service.get_session_summaries("u")
+        return built, await service.get_session_summaries("u"), service.metrics()
+
+    built, reused, metrics = run_snapshot(snapshot_repo, scenario)
+    assert built == reused == []
+    assert (metrics.missing, metrics.hits, metrics.stale) == (1, 1, 0)
+
+
+def test_snapshot_marked_by_session_start_is_built_then_reused(snapshot_repo, dynamodb):
+    start_session(snapshot_repo, "s1", 1)  # 세션 교체 트랜잭션이 스냅샷 아이템을 stale 로 만듦
+    set_summary(dynamodb, "s1", "first summary")
+
+    async def scenario(service):
+        built = await service.get_session_summaries("u")
+        return built, await service.get_session_summaries("u"), service.metrics()
+
+    built, reused, metrics = run_snapshot(snapshot_repo, scenario)
+    assert summaries_of(built) == summaries_of(reused) == [("s1", "first summary")]
+    assert (metrics.missing, metrics.hits, metrics.stale) == (0, 1, 1)
+
+
+def test_session_rollover_marks_snapshot_stale(snapshot_repo):
+    start_session(snapshot_repo, "s1", 1)
+
+    async def scenario(service):
+        await service.get_session_summaries("u")
+        start_session(snapshot_repo, "s2", 2)  # 같은 트랜잭션에서 metadata_version 증가
+        return await service.get_session_summaries("u"), service.metrics()
+
+    summaries, metrics = run_snapshot(snapshot_repo, scenario)
+    assert [item.session_id for item in summaries] == ["s2", "s1"]
+    assert metrics.stale == 2 and metrics.hits == 0
+
+
+def test_change_during_rebuild_is_not_stored(snapshot_repo):
+    start_session(snapshot_repo, "s1", 1)
+
+    async def scenario(service):
+        get_metadata = service.chat_repo.get_current_session_metadata_by_user_id
+
+        async def rollover_while_reading(*args, **kwargs):
+            metadata = await get_metadata(*args, **kwargs)
+            start_session(snapshot_repo, "s2", 2)  # 읽은 직후 다른 요청이 세션을 교체
+            return metadata
+
+        service.chat_repo.get_current_session_metadata_by_user_id = rollover_while_reading
+        first = await service.get_session_summaries("u")
+        service.chat_repo.get_current_session_metadata_by_user_id = get_metadata
+        return first, await service.get_session_summaries("u"), service.metrics()
+
+    first, second, metrics = run_snapshot(snapshot_repo, scenario)
+    assert [item.session_id for item in first] == ["s1"]
+    assert [item.session_id for item in second] == ["s2", "s1"]  # 오래된 스냅샷이 저장되지 않아 다시 만듦
+    assert metrics.conflicts == 1 and metrics.stale == 2
+
+
+def test_snapshot_built_with_other_settings_is_stale(snapshot_repo):
+    start_session(snapshot_repo, "s1", 1)
+    run_snapshot(snapshot_repo, lambda service: service.get_session_summaries("u"), window=1)
+
+    async def scenario(service):
+        await service.get_session_summaries("u")
+        return service.metrics()
+
+    metrics = run_snapshot(snapshot_repo, scenario, window=2)
+    assert metrics.stale == 1 and metrics.hits == 0
+
+
+def test_summary_lambda_refreshes_snapshot_for_the_api(snapshot_repo, dynamodb, monkeypatch):
+    monkeypatch.setattr(summary_lambda, "_clients", {})
+    monkeypatch.setattr(summary_lambda, "ContextSnapshotTableName", settings.DYNAMODB_CONTEXT_SNAPSHOT_TABLE)
+    monkeypatch.setattr(summary_lambda, "llm_available", lambda: True)
+    monkeypatch.setattr(summary_lambda, "call_llm", lambda system_prompt, content: "lambda summary")
+    start_session(snapshot_repo, "s1", 1)
+    dynamodb.Table(settings.DYNAMODB_MESSAGE_TABLE).put_item(Item={
+        "user_id": "u", "sort_key": "s1#1700000000000-0000-aaaa", "session_id": "s1",
+        "created_at": 1_700_000_000, "sender_type": "human", "content": "hello",
+    })
+    old_image = {"user_id": {"S": "u"}, "session_id": {"S": "s1"}, "created_at": {"N": "1"},
+                 "expired_at": {"N": str(int(time.time()))}, "updated_at": {"N": "1"}}
+
+    async def scenario(service):
+        await service.get_session_summaries("u")  # 요약 전 스냅샷
+        result = summary_lambda.lambda_handler({"Records": [{
+            "eventID": "1", "eventName": "REMOVE", "dynamodb": {"SequenceNumber": "1", "OldImage": old_image},
+        }]}, None)
+        assert result["batchItemFailures"] == []
+        return await service.get_session_summaries("u"), service.metrics()
+
+    summaries, metrics = run_snapshot(
+        snapshot_repo, scenario,
+        window=summary_lambda.SessionSummaryWindow, summary_token_budget=summary_lambda.ContextSummaryTokenBudget,
+    )
+    assert summaries_of(summaries) == [("s1", "lambda summary")]
+    assert metrics.hits == 1 and metrics.stale == 1  # lambda 가 다시 만든 스냅샷을 그대로 사용
@@ -0,0 +1,203 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.models.request import SendMessageRequest
+from app.models.response import ChatMessageResponse, ChatStreamEvent
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.chat_service import ChatService
+from app.services.idempotency_service import (
+    IdempotencyConflictError, IdempotencyInProgressError, IdempotencyService
+)
+
+
+def send(content="hello", idempotency_key="k1", user_id="u"):
+    return SendMessageRequest(user_id=user_id, content=content, idempotency_key=idempotency_key)
+
+
+def run_with_repo(repo, coroutine_factory):
+    async def main():
+        chat_repo = AsyncChatRepository(repo, ThreadPoolExecutor(max_workers=1), write_behind=False)
+        try:
+            return await coroutine_factory(chat_repo)
+        finally:
+            await chat_repo.close()
+            chat_repo.executor.shutdown(wait=True)
+
+    return asyncio.run(main())
+
+
+def counting_handler(calls, content="answer", delay_s=0.05):
+    async def handler():
+        calls.append(content)
+        index = len(calls)
+        await asyncio.sleep(delay_s)
+        return ChatMessageResponse(content=f"{content}-{index}", session_id="s")
+    return handler
+
+
+# user-019: 워커 내부 single-flight
+
+def test_concurrent_requests_with_same_key_are_processed_once(repo):
+    calls = []
+
+    async def scenario(chat_repo):
+        service = IdempotencyService(chat_repo, record_enabled=False)
+        responses = await asyncio.gather(*(service.run(send(), counting_handler(calls)) for _ in range(3)))
+        return responses, service.coalesced_requests
+
+    responses, coalesced = run_with_repo(repo, scenario)
+
+    assert len(calls) == 1 and coalesced == 2
+    assert {response.content for response in responses} == {"answer-1"}
+
+
+def test_waiter_retries_when_leader_is_cancelled(repo):
+    calls = []
+
+    async def scenario(chat_repo):
+        service = IdempotencyService(chat_repo, record_enabled=False)
+        leader = asyncio.create_task(service.run(send(), counting_handler(calls, "leader", delay_s=10)))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(service.run(send(), counting_handler(calls, "waiter")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    assert run_with_repo(repo, scenario).content == "waiter-2"
+    assert calls == ["leader", "waiter"]
+
+
+def test_waiter_retries_when_stream_generator_is_closed(repo):
+    """클라이언트 연결이 끊겨 스트리밍 generator 가 GeneratorExit 로 정리되어도 기다리던 요청은 다시 처리"""
+    calls = []
+
+    async def scenario(chat_repo):
+        service = ChatService(chat_repo)
+
+        async def stream(request, quota_checked):
+            yield ChatStreamEvent(event="token", content="partial", session_id="s")
+            await asyncio.sleep(10)
+
+        service._stream_user_message = stream
+        generator = service.stream_user_message(send())
+        assert (await generator.__anext__()).content == "partial"
+
+        waiter = asyncio.create_task(service.idempotency_service.run(send(), counting_handler(calls, "waiter")))
+        await asyncio.sleep(0.01)
+        await generator.aclose()
+        return await waiter
+
+    assert run_with_repo(repo, scenario).content == "waiter-1"
+    assert calls == ["waiter"]
+
+
+def test_handler_error_is_shared_with_waiters(repo):
+    async def scenario(chat_repo):
+        service = IdempotencyService(chat_repo, record_enabled=False)
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise RuntimeError("LLM failed")
+
+        return await asyncio.gather(*(service.run(send(), failing) for _ in range(2)), return_exceptions=True)
+
+    results = run_with_repo(repo, scenario)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_same_content_without_key_is_not_coalesced(repo):
+    calls = []
+
+    async def scenario(chat_repo):
+        service = IdempotencyService(chat_repo, record_enabled=False)
+        request = send("yes", idempotency_key=None)
+        return await asyncio.gather(*(service.run(request, counting_handler(calls)) for _ in range(2)))
+
+    responses = run_with_repo(repo, scenario)
+    assert len(calls) == 2 and {response.content for response in responses} == {"answer-1", "answer-2"}
+
+
+def test_same_content_is_coalesced_when_enabled(repo):
+    calls = []
+
+    async def scenario(chat_repo):
+        service = IdempotencyService(chat_repo, record_enabled=False, coalesce_by_content=True)
+        requests = [send("yes", idempotency_key=None), send("yes", idempotency_key=None), send("no", None)]
+        return await asyncio.gather(*(service.run(request, counting_handler(calls)) for request in requests))
+
+    responses = run_with_repo(repo, scenario)
+    assert len(calls) == 2 and responses[0] == responses[1] != responses[2]
+
+
+# user-019: 워커 간 DynamoDB 기록 (lease)
+
+def workers(chat_repo, count=2, **options):
+    """같은 테이블을 쓰는 서로 다른 워커의 IdempotencyService"""
+    options = {"record_enabled": True, "wait_timeout_s": 1, "poll_interval_s": 0.01, **options}
+    return [IdempotencyService(chat_repo, **options) for _ in range(count)]
+
+
+def test_completed_record_is_replayed_by_another_worker(repo):
+    calls = []
+
+    async def scenario(chat_repo):
+        first, second = workers(chat_repo)
+        response = await first.run(send(), counting_handler(calls))
+        return response, await second.run(send(), counting_handler(calls)), second.replayed_responses
+
+    response, replayed, replayed_count = run_with_repo(repo, scenario)
+    assert replayed == response and calls == ["answer"] and replayed_count == 1
+
+
+def test_other_worker_waits_for_in_progress_record(repo):
+    calls = []
+
+    async def scenario(chat_repo):
+        first, second = workers(chat_repo)
+        lease, _ = await first.acquire(send())
+        waiter = asyncio.create_task(second.run(send(), counting_handler(calls)))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        await first.complete(lease, ChatMessageResponse(content="from first", session_id="s"))
+        return await waiter
+
+    assert run_with_repo(repo, scenario).content == "from first"
+    assert calls == []
+
+
+def test_in_progress_record_times_out_with_retry_after(repo):
+    async def scenario(chat_repo):
+        first, second = workers(chat_repo, wait_timeout_s=0.05)
+        await first.acquire(send())
+        with pytest.raises(IdempotencyInProgressError) as error:
+            await second.run(send(), counting_handler([]))
+        return error.value.retry_after_s
+
+    assert 0 < run_with_repo(repo, scenario) <= 120
+
+
+def test_released_record_can_be_acquired_again(repo):
+    calls = []
+
+    async def scenario(chat_repo):
+        first, second = workers(chat_repo)
+        lease, _ = await first.acquire(send())
+        await first.release(lease, RuntimeError("LLM failed"))
+        return await second.run(send(), counting_handler(calls))
+
+    assert run_with_repo(repo, scenario).content == "answer-1" and calls == ["answer"]
+
+
+def test_same_key_with_different_content_is_a_conflict(repo):
+    async def scenario(chat_repo):
+        first, second = workers(chat_repo)
+        lease, _ = await first.acquire(send("hello"))
+        with pytest.raises(IdempotencyConflictError):
+            await first.acquire(send("different"))  # 같은 워커에서 처리 중
+        with pytest.raises(IdempotencyConflictError):
+            await second.acquire(send("different"))  # 다른 워커의 기록
+        await first.complete(lease, ChatMessageResponse(content="done", session_id="s"))
+
+    run_with_repo(repo, scenario)
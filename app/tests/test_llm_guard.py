@@ -0,0 +1,160 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.services.llm_guard import CircuitState, LLMGuard, LLMTimeoutError, LLMUnavailableError
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def status_error(status_code):
+    return openai.APIStatusError(
+        f"status {status_code}", response=httpx.Response(status_code, request=REQUEST), body=None
+    )
+
+
+def elapse_open_circuit(guard, seconds):
+    # time.monotonic 은 이벤트 루프도 사용하므로 바꾸지 않고, 회로가 열린 시각을 과거로 옮김
+    guard.circuit._opened_at -= seconds
+
+
+@pytest.fixture
+def guard():
+    return LLMGuard(max_concurrency=2, queue_timeout_s=0.05, timeout_s=0.2, first_token_timeout_s=0.2,
+                    circuit_failure_threshold=2, circuit_reset_seconds=30, hedge_enabled=False)
+
+
+async def succeed():
+    return "ok"
+
+
+def fail_with(error):
+    async def call():
+        raise error
+    return call
+
+
+async def hang():
+    await asyncio.sleep(10)
+
+
+def invoke(guard, call):
+    return asyncio.run(guard.ainvoke(call))
+
+
+def test_consecutive_failures_open_the_circuit(guard):
+    with pytest.raises(openai.APIStatusError):
+        invoke(guard, fail_with(status_error(500)))
+    assert guard.circuit.state is CircuitState.CLOSED
+
+    with pytest.raises(openai.APIConnectionError):
+        invoke(guard, fail_with(openai.APIConnectionError(request=REQUEST)))
+    assert guard.circuit.state is CircuitState.OPEN
+
+    with pytest.raises(LLMUnavailableError) as error:
+        invoke(guard, succeed)
+    assert error.value.retry_after_s == 30
+    assert guard.metrics().rejected == 1 and guard.metrics().circuit_opened == 1
+
+
+def test_success_resets_consecutive_failures(guard):
+    for _ in range(3):
+        with pytest.raises(openai.APIStatusError):
+            invoke(guard, fail_with(status_error(503)))
+        assert invoke(guard, succeed) == "ok"
+    assert guard.circuit.state is CircuitState.CLOSED
+
+
+def test_timeouts_count_as_failures(guard):
+    for _ in range(2):
+        with pytest.raises(LLMTimeoutError):
+            invoke(guard, hang)
+    assert guard.circuit.state is CircuitState.OPEN
+    assert guard.metrics().timeouts == 2
+
+
+def test_client_errors_do_not_open_the_circuit(guard):
+    for error in (status_error(400), status_error(429), ValueError("invalid input"), status_error(401)):
+        with pytest.raises(type(error)):
+            invoke(guard, fail_with(error))
+    assert guard.circuit.state is CircuitState.CLOSED
+    assert guard.metrics().client_errors == 4 and guard.metrics().failures == 0
+
+
+def test_half_open_probe_closes_the_circuit_on_success(guard):
+    for _ in range(2):
+        with pytest.raises(openai.APIStatusError):
+            invoke(guard, fail_with(status_error(502)))
+
+    elapse_open_circuit(guard, 30)
+    guard.check()  # 재시도 대기 시간이 지나면 시험 호출 허용
+
+    async def probe_with_concurrent_request():
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_success():
+            started.set()
+            await release.wait()
+            return "ok"
+
+        probe = asyncio.create_task(guard.ainvoke(slow_success))
+        await started.wait()
+        assert guard.circuit.state is CircuitState.HALF_OPEN
+        # 시험 호출이 진행 중이면 다른 요청은 거절
+        with pytest.raises(LLMUnavailableError):
+            await guard.ainvoke(succeed)
+        release.set()
+        return await probe
+
+    assert asyncio.run(probe_with_concurrent_request()) == "ok"
+    assert guard.circuit.state is CircuitState.CLOSED
+
+
+def test_half_open_probe_failure_reopens_the_circuit(guard):
+    for _ in range(2):
+        with pytest.raises(openai.APIStatusError):
+            invoke(guard, fail_with(status_error(500)))
+    elapse_open_circuit(guard, 30)
+
+    with pytest.raises(httpx.ConnectError):
+        invoke(guard, fail_with(httpx.ConnectError("connection refused")))
+    assert guard.circuit.state is CircuitState.OPEN
+    assert guard.metrics().circuit_opened == 2
+
+    elapse_open_circuit(guard, 29)
+    with pytest.raises(LLMUnavailableError):
+        invoke(guard, succeed)
+
+
+def test_cancelled_probe_lets_the_next_request_probe(guard):
+    for _ in range(2):
+        with pytest.raises(openai.APIStatusError):
+            invoke(guard, fail_with(status_error(500)))
+    elapse_open_circuit(guard, 30)
+
+    async def cancel_probe():
+        probe = asyncio.create_task(guard.ainvoke(hang))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(cancel_probe())
+    assert guard.circuit.state is CircuitState.HALF_OPEN
+    assert invoke(guard, succeed) == "ok"
+    assert guard.circuit.state is CircuitState.CLOSED
+
+
+def test_app_guard_metrics_are_exported():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    from app.core import telemetry
+    from app.services.chat_service import llm_guard
+
+    # 다른 테스트에서 만든 guard 가 아니라 앱이 사용하는 guard 가 등록되어 있어야 함
+    assert telemetry._metrics_sources["llm_guard"] == llm_guard.metrics
+    exposition = prometheus_client.generate_latest().decode()
+    assert 'app_llm_guard_circuit_state{value="closed"} 1.0' in exposition
+    assert "app_llm_guard_rejected " in exposition
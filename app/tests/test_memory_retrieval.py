@@ -0,0 +1,139 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services import memory_retrieval
+from app.services.chat_service import ChatService
+from app.services.context_builder import UNFINISHED_SESSION_SUMMARY
+from app.services.memory_retrieval import MemoryRetrievalService, hashing_vector
+from app.summary_lambda import summary_lambda
+
+TRIP = "we planned a spring trip to jeju island with the kids"
+DEADLOCK = "debugging a python asyncio deadlock in the worker pool"
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # 토크나이저 대신 단어 수를 토큰 수로 사용해 예산 계산을 결정적으로 만듦
+    monkeypatch.setattr(memory_retrieval, "count_tokens", lambda text: len(text.split()))
+
+
+def put_summary(dynamodb, session_id, summary, embedding=None, user_id="u"):
+    item = {"user_id": user_id, "session_id": session_id, "created_at": 1, "session_summary": summary}
+    if embedding is not None:
+        item["summary_embedding_model"], item["summary_embedding"] = embedding
+    dynamodb.Table(settings.DYNAMODB_SESSION_METADATA_TABLE).put_item(Item=item)
+
+
+def run_retrieval(repo, scenario, **options):
+    async def main():
+        chat_repo = AsyncChatRepository(repo, ThreadPoolExecutor(max_workers=1), write_behind=False)
+        service = MemoryRetrievalService(chat_repo, **{"mode": "retrieval", "top_k": 3, **options})
+        try:
+            return await scenario(service)
+        finally:
+            await chat_repo.close()
+            chat_repo.executor.shutdown(wait=True)
+
+    return asyncio.run(main())
+
+
+def session_ids(summaries):
+    return [metadata.session_id for metadata in summaries]
+
+
+# user-024: 세션 요약 검색 기반 장기 기억
+
+def test_lambda_and_api_hashing_embeddings_match():
+    model_id, embedding = summary_lambda.embed_summary(DEADLOCK)
+
+    assert model_id == f"hashing:{settings.SUMMARY_EMBEDDING_DIMENSIONS}"
+    assert np.allclose(np.frombuffer(embedding, dtype="<f4"), hashing_vector(DEADLOCK, 256), atol=1e-6)
+
+
+def test_relevant_summary_is_retrieved_first(repo, dynamodb):
+    put_summary(dynamodb, "s1", TRIP, summary_lambda.embed_summary(TRIP))
+    put_summary(dynamodb, "s2", DEADLOCK)  # 임베딩 이전의 요약은 API 에서 계산
+    put_summary(dynamodb, "s3", UNFINISHED_SESSION_SUMMARY)
+
+    async def scenario(service):
+        return await service.retrieve("u", "the asyncio deadlock is back"), service.metrics()
+
+    retrieved, metrics = run_retrieval(repo, scenario)
+    assert session_ids(retrieved)[0] == "s2" and "s3" not in session_ids(retrieved)
+    assert metrics.avg_candidates == 2
+
+
+def test_stored_embedding_of_the_same_model_is_used(repo, dynamodb):
+    # 저장된 임베딩이 쓰이는지 구분할 수 있도록 요약과 다른 글의 임베딩을 저장
+    put_summary(dynamodb, "s1", TRIP, summary_lambda.embed_summary(DEADLOCK))
+    _, trip_embedding = summary_lambda.embed_summary(TRIP)
+    put_summary(dynamodb, "s2", DEADLOCK, ("hashing:64", trip_embedding))  # 다른 모델의 임베딩은 무시하고 다시 계산
+
+    retrieved = run_retrieval(repo, lambda service: service.retrieve("u", DEADLOCK), min_similarity=0.5)
+
+    assert sorted(session_ids(retrieved)) == ["s1", "s2"]
+
+
+def test_long_summary_over_budget_is_skipped(repo, dynamodb):
+    put_summary(dynamodb, "s1", f"{DEADLOCK} {'again ' * 20}")
+    put_summary(dynamodb, "s2", DEADLOCK)
+
+    retrieved = run_retrieval(repo, lambda service: service.retrieve("u", DEADLOCK), summary_token_budget=15)
+
+    assert session_ids(retrieved) == ["s2"]
+
+
+def test_concurrent_retrievals_load_the_index_once(repo, dynamodb):
+    put_summary(dynamodb, "s1", DEADLOCK)
+
+    async def scenario(service):
+        await asyncio.gather(*(service.retrieve("u", DEADLOCK) for _ in range(3)))
+        await service.retrieve("u", TRIP)
+        return service.metrics()
+
+    metrics = run_retrieval(repo, scenario)
+    assert metrics.index_loads == 1 and metrics.retrievals == 4 and metrics.cached_users == 1
+
+
+def run_chat_service(repo, mode, scenario):
+    async def main():
+        chat_repo = AsyncChatRepository(repo, ThreadPoolExecutor(max_workers=1), write_behind=False)
+        retrieval = MemoryRetrievalService(chat_repo, mode=mode, top_k=1)
+        try:
+            return await scenario(ChatService(chat_repo, memory_retrieval_service=retrieval), retrieval)
+        finally:
+            await chat_repo.close()
+            chat_repo.executor.shutdown(wait=True)
+
+    return asyncio.run(main())
+
+
+def test_shadow_mode_uses_recent_summaries_and_records_recall(repo, dynamodb):
+    put_summary(dynamodb, "s1", DEADLOCK)
+    put_summary(dynamodb, "s2", TRIP)
+
+    async def scenario(service, retrieval):
+        return await service.get_session_summaries("u", DEADLOCK), retrieval.metrics()
+
+    summaries, metrics = run_chat_service(repo, "shadow", scenario)
+    assert session_ids(summaries) == ["s2", "s1"]  # 최근 요약 방식 그대로
+    assert metrics.recency_comparisons == 1 and metrics.recency_recall == 0.5
+
+
+def test_failed_retrieval_falls_back_to_recent_summaries(repo, dynamodb):
+    put_summary(dynamodb, "s1", DEADLOCK)
+
+    async def scenario(service, retrieval):
+        async def fail(user_id):
+            raise RuntimeError("throttled")
+
+        retrieval.chat_repo.get_session_summary_items = lambda user_id, max_sessions: fail(user_id)
+        return await service.get_session_summaries("u", DEADLOCK), retrieval.metrics()
+
+    summaries, metrics = run_chat_service(repo, "retrieval", scenario)
+    assert session_ids(summaries) == ["s1"] and metrics.failures == 1
@@ -0,0 +1,130 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Key
+
+from app.core.config import settings
+from app.core.message_key import make_message_sort_key
+from app.models.entity import Message
+from app.repositories import message_writer
+from app.repositories.message_writer import MessageWriter
+
+
+def message(index):
+    return Message(
+        user_id="u", sort_key=make_message_sort_key("s", f"{1_700_000_000_000 + index:013d}-0000-aaaa"),
+        session_id="s", created_at=1_700_000_000, sender_type="human", content=f"m{index}",
+    )
+
+
+def stored_contents(dynamodb):
+    items = dynamodb.Table(settings.DYNAMODB_MESSAGE_TABLE).query(KeyConditionExpression=Key("user_id").eq("u"))
+    return [item["content"] for item in items["Items"]]
+
+
+def unprocessed_first(repo, failures):
+    """처음 failures 번은 BatchWriteItem 이 아무것도 처리하지 못한 것처럼 동작"""
+    calls = []
+    batch_put_messages = repo.batch_put_messages
+
+    def flaky(messages):
+        calls.append(len(messages))
+        if len(calls) <= failures:
+            return list(messages)
+        return batch_put_messages(messages)
+
+    repo.batch_put_messages = flaky
+    return calls
+
+
+def run_writer(repo, scenario, **options):
+    async def main():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            writer = MessageWriter(repo, executor, **options)
+            writer.start()
+            await scenario(writer)
+            return writer.metrics()
+
+    return asyncio.run(main())
+
+
+# user-007: 종료 시 진행 중인 배치를 잃지 않고 저장
+
+def test_stop_drains_batch_waiting_for_retry_backoff(repo, dynamodb):
+    calls = unprocessed_first(repo, failures=1)
+
+    async def scenario(writer):
+        for index in range(3):
+            await writer.put(message(index))
+        while not calls:  # 첫 시도가 실패하고 재시도 대기 중
+            await asyncio.sleep(0.01)
+        assert [m.content for m in writer.pending_messages("u", "s")] == ["m0", "m1", "m2"]
+        await writer.stop()
+
+    metrics = run_writer(repo, scenario, max_batch_size=3, flush_interval_s=60, retry_backoff_base_s=0.2)
+
+    assert sorted(stored_contents(dynamodb)) == ["m0", "m1", "m2"]
+    assert metrics.dropped_items == 0 and metrics.retried_items == 3 and metrics.queue_depth == 0
+
+
+def test_stop_flushes_buffered_messages(repo, dynamodb):
+    async def scenario(writer):
+        await writer.put(message(0))
+        await writer.put(message(1))
+        await writer.stop()
+
+    metrics = run_writer(repo, scenario, max_batch_size=25, flush_interval_s=60)
+
+    assert sorted(stored_contents(dynamodb)) == ["m0", "m1"]
+    assert metrics.flushed_items == 2 and metrics.dropped_items == 0
+
+
+def test_failed_batch_is_requeued_and_saved_by_next_flush(repo, dynamodb):
+    unprocessed_first(repo, failures=2)
+
+    async def scenario(writer):
+        await writer.put(message(0))
+        await writer.flush()  # 재시도(max_retries=1)까지 실패하면 버퍼로 되돌림
+        assert writer.metrics().queue_depth == 1
+        await writer.stop()
+
+    metrics = run_writer(repo, scenario, flush_interval_s=60, max_retries=1, retry_backoff_base_s=0)
+
+    assert stored_contents(dynamodb) == ["m0"]
+    assert metrics.failed_items == 1 and metrics.dropped_items == 0
+    assert metrics.failed_batches == 1 and metrics.flushed_batches == 1  # stop 에서 저장한 배치만 성공
+
+
+def test_cancelled_flush_returns_in_flight_messages_to_buffer(repo, dynamodb, monkeypatch):
+    calls = unprocessed_first(repo, failures=1)
+    monkeypatch.setattr(message_writer.random, "uniform", lambda low, high: high)  # 재시도 대기 중에 취소
+
+    async def scenario(writer):
+        await writer.put(message(0))
+        await writer.put(message(1))
+        flush = asyncio.create_task(writer.flush())
+        while not calls:
+            await asyncio.sleep(0.01)
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        assert writer.metrics().queue_depth == 2
+        await writer.stop()
+
+    metrics = run_writer(repo, scenario, flush_interval_s=60, retry_backoff_base_s=1)
+
+    assert sorted(stored_contents(dynamodb)) == ["m0", "m1"]
+    assert metrics.dropped_items == 0
+
+
+def test_messages_that_cannot_be_saved_are_reported_as_dropped(repo, dynamodb):
+    unprocessed_first(repo, failures=100)
+
+    async def scenario(writer):
+        await writer.put(message(0))
+        await writer.stop()
+
+    metrics = run_writer(repo, scenario, flush_interval_s=60, max_retries=1, retry_backoff_base_s=0)
+
+    assert stored_contents(dynamodb) == []
+    assert metrics.dropped_items == 1 and metrics.queue_depth == 0
+    assert metrics.flushed_batches == 0 and metrics.failed_batches == 1
@@ -0,0 +1,113 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.quota_service import QuotaExceededError, QuotaService
+
+
+def run_with_repo(repo, coroutine_factory):
+    async def main():
+        chat_repo = AsyncChatRepository(repo, ThreadPoolExecutor(max_workers=1), write_behind=False)
+        try:
+            return await coroutine_factory(chat_repo)
+        finally:
+            await chat_repo.close()
+            chat_repo.executor.shutdown(wait=True)
+
+    return asyncio.run(main())
+
+
+def slow_adds(chat_repo, delay_s=0.05):
+    """ADD 가 DynamoDB 에 반영된 뒤 응답이 늦게 돌아오는 상황"""
+    add_user_token_usage = chat_repo.add_user_token_usage
+
+    async def slow(*args):
+        await add_user_token_usage(*args)
+        await asyncio.sleep(delay_s)
+
+    chat_repo.add_user_token_usage = slow
+
+
+# user-018: 로컬 사용량과 DynamoDB 사용량 reconcile
+
+def test_flushed_usage_is_seen_by_another_worker(repo):
+    async def scenario(chat_repo):
+        worker = QuotaService(chat_repo, daily_limit=100, monthly_limit=0)
+        worker.record("u", 60)
+        worker.record("u", 50)
+        await worker.flush()
+
+        other = QuotaService(chat_repo, daily_limit=100, monthly_limit=0)
+        with pytest.raises(QuotaExceededError) as error:
+            await other.check("u")
+        return error.value, worker.metrics()
+
+    error, metrics = run_with_repo(repo, scenario)
+    assert error.used == 110 and error.window == "daily" and error.retry_after_s > 0
+    assert metrics.flushed_updates == 2 and metrics.pending_users == 0
+
+
+def test_usage_loaded_during_flush_is_counted_once(repo):
+    async def scenario(chat_repo):
+        slow_adds(chat_repo)
+        quota = QuotaService(chat_repo, daily_limit=1000, monthly_limit=0, cache_ttl_seconds=60)
+        quota.record("u", 30)
+        flush = asyncio.create_task(quota.flush())
+        await asyncio.sleep(0)  # flush 가 사용량을 꺼내 ADD 를 시작한 뒤 캐시 미스로 조회
+        usage = await quota.check("u")
+        await flush
+        quota.record("u", 5)
+        return usage.daily_tokens, (await quota.check("u")).daily_tokens
+
+    assert run_with_repo(repo, scenario) == (30, 35)
+
+
+def test_unflushed_usage_is_added_to_loaded_usage(repo):
+    async def scenario(chat_repo):
+        quota = QuotaService(chat_repo, daily_limit=1000, monthly_limit=0)
+        quota.record("u", 10)
+        await quota.flush()
+        quota.record("u", 7)  # 아직 반영되지 않음
+        return (await quota.check("u")).daily_tokens
+
+    assert run_with_repo(repo, scenario) == 17
+
+
+def test_failed_flush_is_retried_without_double_counting(repo):
+    async def scenario(chat_repo):
+        add_user_token_usage = chat_repo.add_user_token_usage
+        failures = []
+
+        async def fail_once(user_id, window, tokens, expired_at):
+            if window not in failures:
+                failures.append(window)
+                raise RuntimeError("throttled")
+            await add_user_token_usage(user_id, window, tokens, expired_at)
+
+        chat_repo.add_user_token_usage = fail_once
+        quota = QuotaService(chat_repo, daily_limit=1000, monthly_limit=1000, cache_ttl_seconds=0)
+        quota.record("u", 40)
+        await quota.flush()
+        failed = quota.metrics()
+        await quota.flush()
+
+        other = QuotaService(chat_repo, daily_limit=1000, monthly_limit=1000)
+        return failed, quota.metrics(), await other.check("u")
+
+    failed, metrics, usage = run_with_repo(repo, scenario)
+    assert failed.failed_updates == 2 and failed.pending_users == 1
+    assert metrics.flushed_updates == 2 and metrics.pending_users == 0
+    assert usage.daily_tokens == 40 and usage.monthly_tokens == 40
+
+
+def test_close_flushes_pending_usage(repo):
+    async def scenario(chat_repo):
+        quota = QuotaService(chat_repo, daily_limit=1000, monthly_limit=0, flush_interval_s=60)
+        quota.start()
+        quota.record("u", 12)
+        await quota.close()
+        return (await QuotaService(chat_repo, daily_limit=1000, monthly_limit=0).check("u")).daily_tokens
+
+    assert run_with_repo(repo, scenario) == 12
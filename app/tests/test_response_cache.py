@@ -0,0 +1,113 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Key
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.core.config import settings
+from app.models.entity import SessionMetadata
+from app.models.request import SendMessageRequest
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.chat_service import ChatService
+from app.services.quota_service import QuotaService
+from app.services.response_cache import ResponseCache
+
+
+def run_with_repo(repo, coroutine_factory):
+    async def main():
+        chat_repo = AsyncChatRepository(repo, ThreadPoolExecutor(max_workers=1), write_behind=False)
+        try:
+            return await coroutine_factory(chat_repo)
+        finally:
+            await chat_repo.close()
+            chat_repo.executor.shutdown(wait=True)
+
+    return asyncio.run(main())
+
+
+def summary(text):
+    return SessionMetadata(user_id="u", session_id="s0", created_at=1, session_summary=text)
+
+
+# user-017: 컨텍스트별 응답 캐시
+
+def test_normalized_and_similar_questions_hit_in_the_same_context():
+    async def scenario():
+        cache = ResponseCache(namespace="test")
+        await cache.put(cache.make_key("What is DynamoDB?", [], []), "a database", 9)
+        exact = await cache.get(cache.make_key("  what is dynamodb ", [], []))
+        similar = await cache.get(cache.make_key("what is dynamodbb", [], []))
+        unrelated = await cache.get(cache.make_key("how do I bake bread", [], []))
+        return exact, similar, unrelated, cache.metrics()
+
+    exact, similar, unrelated, metrics = asyncio.run(scenario())
+    assert exact.content == similar.content == "a database" and exact.total_tokens == 9
+    assert unrelated is None
+    assert (metrics.exact_hits, metrics.similar_hits, metrics.misses, metrics.stores) == (1, 1, 1, 1)
+
+
+def test_different_context_misses():
+    async def scenario():
+        cache = ResponseCache(namespace="test")
+        history = [HumanMessage(content="hi"), AIMessage(content="hello")]
+        await cache.put(cache.make_key("and then?", [summary("talked about cats")], history), "more cats", 5)
+        return [
+            await cache.get(cache.make_key("and then?", [summary("talked about dogs")], history)),
+            await cache.get(cache.make_key("and then?", [summary("talked about cats")], history[:1])),
+            await cache.get(ResponseCache(namespace="other-model").make_key(
+                "and then?", [summary("talked about cats")], history)),
+            await cache.get(cache.make_key("and then?", [summary("talked about cats")], history)),
+        ]
+
+    results = asyncio.run(scenario())
+    assert results[:3] == [None, None, None] and results[3].content == "more cats"
+
+
+def test_shared_cache_is_used_by_another_worker(repo):
+    async def scenario(chat_repo):
+        key = ResponseCache(namespace="test").make_key("hi", [], [])
+        await ResponseCache(namespace="test", chat_repo=chat_repo).put(key, "hello", 7)
+        other = ResponseCache(namespace="test", chat_repo=chat_repo)
+        return await other.get(other.make_key("HI!", [], [])), other.metrics()
+
+    cached, metrics = run_with_repo(repo, scenario)
+    assert cached.content == "hello" and metrics.shared_hits == 1 and metrics.misses == 0
+
+
+def test_cache_hit_skips_llm_but_saves_and_charges_the_turn(repo, dynamodb, chat_model):
+    async def scenario(chat_repo):
+        quota = QuotaService(chat_repo, daily_limit=1000, monthly_limit=0)
+        service = ChatService(chat_repo, response_cache=ResponseCache(namespace="test"), quota_service=quota)
+        first = await service.handle_user_message(SendMessageRequest(user_id="u1", content="hi"))
+        # 새 세션의 다른 사용자: 세션 요약과 최근 대화가 없어 컨텍스트가 같음
+        second = await service.handle_user_message(SendMessageRequest(user_id="u2", content="Hi!"))
+        return first, second, (await quota.check("u2")).daily_tokens, service.response_cache.metrics()
+
+    first, second, charged, metrics = run_with_repo(repo, scenario)
+
+    assert second.content == first.content == "hello there" and len(chat_model.calls) == 1
+    assert metrics.misses == 1 and metrics.exact_hits == 1
+    items = dynamodb.Table(settings.DYNAMODB_MESSAGE_TABLE).query(KeyConditionExpression=Key("user_id").eq("u2"))
+    assert sorted(item["content"] for item in items["Items"]) == ["Hi!", "hello there"]
+    active_session = dynamodb.Table(settings.DYNAMODB_ACTIVE_SESSION_TABLE).get_item(Key={"user_id": "u2"})["Item"]
+    assert active_session["token_usage"] == chat_model.total_tokens and charged == chat_model.total_tokens
+
+
+def test_cache_miss_reads_history_once(repo, chat_model):
+    async def scenario(chat_repo):
+        service = ChatService(chat_repo, response_cache=ResponseCache(namespace="test"))
+        await service.handle_user_message(SendMessageRequest(user_id="u", content="hi"))
+        reads = []
+        get_recent_messages_of_session = chat_repo.get_recent_messages_of_session
+
+        async def counting(*args):
+            reads.append(args)
+            return await get_recent_messages_of_session(*args)
+
+        chat_repo.get_recent_messages_of_session = counting
+        await service.handle_user_message(SendMessageRequest(user_id="u", content="and then?"))
+        return reads
+
+    assert len(run_with_repo(repo, scenario)) == 1
+    # 두 번째 턴의 프롬프트에는 첫 턴의 대화가 들어감
+    assert [message.content for message in chat_model.calls[1]][1:] == ["hi", "hello there", "and then?"]
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.repositories.chat_repository import ChatRepository
+
+TTL = 600
+LIMIT = 200
+
+
+@pytest.fixture
+def cached_repo(dynamodb) -> ChatRepository:
+    return ChatRepository(dynamodb, cache_enabled=True)
+
+
+def set_token_usage(dynamodb, token_usage, user_id="u"):
+    """캐시를 거치지 않고 (다른 워커처럼) 활성 세션의 토큰 사용량을 바꿈"""
+    dynamodb.Table(settings.DYNAMODB_ACTIVE_SESSION_TABLE).update_item(
+        Key={"user_id": user_id}, UpdateExpression="SET token_usage = :t",
+        ExpressionAttributeValues={":t": token_usage},
+    )
+
+
+# user-010: 워커 단위 TTL/LRU 캐시
+
+def test_least_recently_used_item_is_evicted():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a 를 최근 사용으로 만듦
+    cache.set("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    metrics = cache.metrics()
+    assert (metrics.size, metrics.hits, metrics.misses, metrics.evictions) == (2, 3, 1, 1)
+
+
+def test_expired_item_is_a_miss():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1, ttl_seconds=0)
+
+    assert cache.get("a") is None
+    metrics = cache.metrics()
+    assert (metrics.size, metrics.misses, metrics.expirations) == (0, 1, 1)
+
+
+def test_active_session_is_read_from_cache_and_written_through(cached_repo, dynamodb):
+    now = int(time.time())
+    assert cached_repo.rollover_active_session("u", "s1", now, TTL, LIMIT)
+    set_token_usage(dynamodb, 50)  # 캐시가 모르는 변경
+
+    assert cached_repo.get_active_session("u").token_usage == 0
+    cached_repo.update_active_session_token_usage("u", 10)
+    assert cached_repo.get_active_session("u").token_usage == 60  # 쓰기 응답으로 캐시 갱신
+    assert cached_repo.active_session_cache.metrics().hits == 2
+
+
+def test_stale_over_limit_cache_falls_back_to_dynamodb(cached_repo, dynamodb):
+    now = int(time.time())
+    assert cached_repo.rollover_active_session("u", "s1", now, TTL, LIMIT)
+    cached_repo.update_active_session_token_usage("u", LIMIT + 1)
+    set_token_usage(dynamodb, 0)  # 캐시상으로는 한도 초과지만 실제로는 여유가 있음
+
+    # 캐시만 보고 조건부 쓰기를 생략하지만, 교체 트랜잭션의 조건식이 실제 세션을 보호
+    assert cached_repo.touch_active_session("u", now + 1, TTL, LIMIT) is None
+    assert not cached_repo.rollover_active_session("u", "s2", now + 1, TTL, LIMIT)
+
+    # 실패한 트랜잭션이 캐시를 비워 다음 시도는 DynamoDB 기준으로 판단
+    touched = cached_repo.touch_active_session("u", now + 2, TTL, LIMIT)
+    assert touched.session_id == "s1" and touched.expired_at == now + 2 + TTL
+
+
+def test_session_metadata_cache_is_invalidated_by_rollover(cached_repo):
+    now = int(time.time())
+    assert cached_repo.rollover_active_session("u", "s1", now, TTL, LIMIT)
+    assert [item.session_id for item in cached_repo.get_current_session_metadata_by_user_id("u", 5)] == ["s1"]
+    cached_repo.update_active_session_token_usage("u", LIMIT + 1)
+
+    assert cached_repo.rollover_active_session("u", "s2", now + 1, TTL, LIMIT)
+    assert [item.session_id for item in cached_repo.get_current_session_metadata_by_user_id("u", 1)] == ["s2"]
+    # 같은 개수 이하의 조회는 캐시된 목록에서 반환
+    assert [item.session_id for item in cached_repo.get_current_session_metadata_by_user_id("u", 1)] == ["s2"]
+    assert cached_repo.session_metadata_cache.metrics().hits == 1
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.repositories.async_chat_repository import AsyncChatRepository
+from app.services.session_expiry_scheduler import SessionExpiryScheduler
+
+TTL = 10
+LIMIT = 200
+
+
+def run_scheduler(repo, scenario):
+    async def main():
+        chat_repo = AsyncChatRepository(repo, ThreadPoolExecutor(max_workers=1), write_behind=False)
+        scheduler = SessionExpiryScheduler(chat_repo, grace_seconds=0)
+        scheduler.start()
+        try:
+            await scenario(scheduler)
+            return scheduler.metrics()
+        finally:
+            await scheduler.close()
+            await chat_repo.close()
+            chat_repo.executor.shutdown(wait=True)
+
+    return asyncio.run(main())
+
+
+async def until(predicate, timeout_s=2.0):
+    deadline = time.monotonic() + timeout_s
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def active_session(dynamodb, user_id="u"):
+    return dynamodb.Table(settings.DYNAMODB_ACTIVE_SESSION_TABLE).get_item(Key={"user_id": user_id}).get("Item")
+
+
+def expired_session(repo, session_id, user_id="u"):
+    """이미 만료 시각이 지났지만 TTL 로 삭제되지 않은 활성 세션, 만료 시각 반환"""
+    created_at = int(time.time()) - TTL - 5
+    assert repo.rollover_active_session(user_id, session_id, created_at, TTL, LIMIT)
+    return created_at + TTL
+
+
+# user-022: 만료 시각에 조건부 삭제로 활성 세션 종료
+
+def test_expired_session_is_deleted(repo, dynamodb):
+    expired_at = expired_session(repo, "s1")
+
+    async def scenario(scheduler):
+        scheduler.schedule("u", "s1", expired_at)
+        await until(lambda: scheduler.metrics().expired == 1)
+
+    metrics = run_scheduler(repo, scenario)
+    assert active_session(dynamodb) is None
+    assert metrics.scheduled == 0 and metrics.heap_size == 0 and metrics.failures == 0
+
+
+def test_session_extended_by_another_worker_is_not_deleted(repo, dynamodb):
+    expired_at = expired_session(repo, "s1")
+    # 만료 직전에 다른 워커가 세션을 연장 (이 워커는 이전 만료 시각만 알고 있음)
+    dynamodb.Table(settings.DYNAMODB_ACTIVE_SESSION_TABLE).update_item(
+        Key={"user_id": "u"}, UpdateExpression="SET expired_at = :e",
+        ExpressionAttributeValues={":e": int(time.time()) + 60},
+    )
+
+    async def scenario(scheduler):
+        scheduler.schedule("u", "s1", expired_at)
+        await until(lambda: scheduler.metrics().skipped == 1)
+
+    metrics = run_scheduler(repo, scenario)
+    assert active_session(dynamodb)["session_id"] == "s1" and metrics.expired == 0
+
+
+def test_replaced_session_is_not_deleted(repo, dynamodb):
+    expired_at = expired_session(repo, "s1")
+    assert repo.rollover_active_session("u", "s2", int(time.time()), TTL, LIMIT)
+
+    async def scenario(scheduler):
+        scheduler.schedule("u", "s1", expired_at)
+        await until(lambda: scheduler.metrics().skipped == 1)
+
+    run_scheduler(repo, scenario)
+    assert active_session(dynamodb)["session_id"] == "s2"
+
+
+def test_rescheduled_deadline_supersedes_earlier_one(repo, dynamodb):
+    expired_at = expired_session(repo, "s1")
+
+    async def scenario(scheduler):
+        scheduler.schedule("u", "s1", expired_at)
+        scheduler.schedule("u", "s1", int(time.time()) + 60)  # 이 워커가 연장
+        await asyncio.sleep(0.05)
+
+    metrics = run_scheduler(repo, scenario)
+    assert active_session(dynamodb)["session_id"] == "s1"
+    assert metrics.expired == 0 and metrics.skipped == 0
+    assert metrics.scheduled == 1 and metrics.heap_size == 1  # 무효가 된 항목은 꺼내면서 버림
+
+
+def test_failed_delete_is_counted(repo):
+    expired_at = expired_session(repo, "s1")
+
+    async def scenario(scheduler):
+        async def fail(*args):
+            raise RuntimeError("throttled")
+
+        scheduler.chat_repo.expire_active_session = fail
+        scheduler.schedule("u", "s1", expired_at)
+        await until(lambda: scheduler.metrics().failures == 1)
+
+    assert run_scheduler(repo, scenario).expired == 0
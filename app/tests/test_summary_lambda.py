@@ -0,0 +1,145 @@
+import pytest
+
+from app.summary_lambda import summary_lambda
+
+
+@pytest.fixture
+def lambda_env(dynamodb, monkeypatch):
+    """moto 테이블을 쓰고, LLM 호출은 입력을 기록한 뒤 결정적인 요약을 반환"""
+    monkeypatch.setattr(summary_lambda, "_clients", {})
+    monkeypatch.setattr(summary_lambda, "ContextSnapshotTableName", "")
+    monkeypatch.setattr(summary_lambda, "llm_available", lambda: True)
+    calls = []
+
+    def call_llm(system_prompt, content):
+        calls.append(content)
+        if "explode" in content:
+            raise RuntimeError("LLM is down")
+        return f"summary({len(calls)})"
+
+    monkeypatch.setattr(summary_lambda, "call_llm", call_llm)
+    return dynamodb, calls
+
+
+def start_session(dynamodb, session_id, user_id="u"):
+    dynamodb.Table(summary_lambda.SessionMetadataTableName).put_item(Item={
+        "user_id": user_id, "session_id": session_id, "created_at": 1,
+        "session_summary": summary_lambda.UNFINISHED_SESSION_SUMMARY,
+    })
+
+
+def add_message(dynamodb, session_id, index, content, user_id="u"):
+    dynamodb.Table(summary_lambda.MessageTableName).put_item(Item={
+        "user_id": user_id, "sort_key": f"{session_id}#{1_700_000_000_000 + index:013d}-0000-aaaa",
+        "session_id": session_id, "created_at": 1_700_000_000, "sender_type": "human", "content": content,
+    })
+
+
+def removed(session_id, sequence_number, user_id="u", **overrides):
+    old_image = {
+        "user_id": {"S": user_id}, "session_id": {"S": session_id}, "created_at": {"N": "1"},
+        "expired_at": {"N": "2"}, "updated_at": {"N": "3"}, **overrides,
+    }
+    return {"eventID": sequence_number, "eventName": "REMOVE",
+            "dynamodb": {"SequenceNumber": sequence_number, "OldImage": old_image}}
+
+
+def metadata(dynamodb, session_id, user_id="u"):
+    return dynamodb.Table(summary_lambda.SessionMetadataTableName).get_item(
+        Key={"user_id": user_id, "session_id": session_id}
+    )["Item"]
+
+
+def failures(result):
+    return sorted(failure["itemIdentifier"] for failure in result["batchItemFailures"])
+
+
+# user-011/012: watermark 기반 멱등 처리
+
+def test_redelivered_record_is_not_summarized_again(lambda_env):
+    dynamodb, calls = lambda_env
+    start_session(dynamodb, "s1")
+    add_message(dynamodb, "s1", 1, "hello")
+    add_message(dynamodb, "s1", 2, "world")
+
+    assert failures(summary_lambda.lambda_handler({"Records": [removed("s1", "1")]}, None)) == []
+    item = metadata(dynamodb, "s1")
+    assert item["session_summary"] == "summary(1)"
+    assert item["summary_watermark"].endswith("1700000000002-0000-aaaa")
+    assert item["summary_embedding_model"] == "hashing:256"
+
+    # 같은 레코드가 다시 전달되어도 새 메시지가 없으므로 LLM 을 호출하지 않음
+    assert failures(summary_lambda.lambda_handler({"Records": [removed("s1", "1")]}, None)) == []
+    assert len(calls) == 1
+    assert metadata(dynamodb, "s1")["session_summary"] == "summary(1)"
+
+
+def test_only_messages_after_watermark_are_summarized(lambda_env):
+    dynamodb, calls = lambda_env
+    start_session(dynamodb, "s1")
+    add_message(dynamodb, "s1", 1, "first")
+    summary_lambda.lambda_handler({"Records": [removed("s1", "1")]}, None)
+
+    add_message(dynamodb, "s1", 2, "second")
+    assert failures(summary_lambda.lambda_handler({"Records": [removed("s1", "2")]}, None)) == []
+
+    assert "first" not in calls[1] and "second" in calls[1] and "summary(1)" in calls[1]
+    item = metadata(dynamodb, "s1")
+    assert item["session_summary"] == "summary(2)"
+    assert item["summary_watermark"].endswith("1700000000002-0000-aaaa")
+
+
+def test_stale_watermark_does_not_overwrite_newer_summary(lambda_env):
+    dynamodb, _ = lambda_env
+    start_session(dynamodb, "s1")
+    assert summary_lambda.update_session_metadata("u", "s1", "newer", 3, "s1#2", None)
+    # 같은 watermark 에서 시작한 다른 실행은 갱신하지 못함
+    assert not summary_lambda.update_session_metadata("u", "s1", "older", 3, "s1#1", None)
+    assert not summary_lambda.update_session_metadata("u", "s1", "older", 3, "s1#3", "s1#1")
+    assert metadata(dynamodb, "s1")["session_summary"] == "newer"
+
+
+# user-011: 배치 일부 실패
+
+def test_partial_batch_failure_reports_only_failed_records(lambda_env):
+    dynamodb, _ = lambda_env
+    for session_id, content in [("ok1", "fine"), ("boom", "explode"), ("ok2", "also fine")]:
+        start_session(dynamodb, session_id)
+        add_message(dynamodb, session_id, 1, content)
+    records = [
+        removed("ok1", "10"),
+        removed("boom", "11"),
+        removed("ok2", "12"),
+        removed("bad", "13", updated_at={"N": "not-a-number"}),
+        {"eventID": "no-sequence", "eventName": "REMOVE", "dynamodb": {}},
+        {"eventID": "insert", "eventName": "INSERT", "dynamodb": {"SequenceNumber": "14"}},
+    ]
+
+    result = summary_lambda.lambda_handler({"Records": records}, None)
+
+    assert failures(result) == ["11", "13"]
+    assert metadata(dynamodb, "ok1")["session_summary"].startswith("summary(")
+    assert metadata(dynamodb, "ok2")["session_summary"].startswith("summary(")
+    assert metadata(dynamodb, "boom")["session_summary"] == summary_lambda.UNFINISHED_SESSION_SUMMARY
+
+
+def test_retried_failed_record_is_summarized(lambda_env, monkeypatch):
+    dynamodb, _ = lambda_env
+    start_session(dynamodb, "s1")
+    add_message(dynamodb, "s1", 1, "explode")
+    assert failures(summary_lambda.lambda_handler({"Records": [removed("s1", "1")]}, None)) == ["1"]
+
+    monkeypatch.setattr(summary_lambda, "call_llm", lambda system_prompt, content: "recovered")
+    assert failures(summary_lambda.lambda_handler({"Records": [removed("s1", "1")]}, None)) == []
+    assert metadata(dynamodb, "s1")["session_summary"] == "recovered"
+
+
+def test_messages_of_other_sessions_are_not_included(lambda_env):
+    dynamodb, calls = lambda_env
+    start_session(dynamodb, "s1")
+    add_message(dynamodb, "s1", 1, "mine")
+    add_message(dynamodb, "s10", 1, "not mine")
+
+    summary_lambda.lambda_handler({"Records": [removed("s1", "1")]}, None)
+
+    assert calls == ["human: mine"]
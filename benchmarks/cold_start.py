@@ -0,0 +1,100 @@
+"""
+Cold start 벤치마크
+
+API 프로세스(app.main:app)와 요약 Lambda(lambda_handler)의 import 시간과
+첫 요청 준비까지 걸리는 시간을 새 인터프리터에서 반복 측정하여 JSON 으로 출력합니다.
+
+    python -m benchmarks.cold_start --repeat 5 --max-api-ms 3000 --max-lambda-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 각 스크립트는 새 프로세스에서 실행되며 마지막 줄에 측정값(JSON)을 출력
+API_SCRIPT = """
+import asyncio, json, time
+start = time.perf_counter()
+from app.main import app, lifespan
+imported = time.perf_counter()
+
+async def startup():
+    async with lifespan(app):
+        return time.perf_counter()
+
+ready = asyncio.run(startup())
+print(json.dumps({"import_ms": (imported - start) * 1000, "ready_ms": (ready - start) * 1000}))
+"""
+
+LAMBDA_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from app.summary_lambda.summary_lambda import lambda_handler
+imported = time.perf_counter()
+lambda_handler({"Records": []}, None)
+ready = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "ready_ms": (ready - start) * 1000}))
+"""
+
+ENTRY_POINTS = {
+    "api": API_SCRIPT,
+    "lambda": LAMBDA_SCRIPT,
+}
+
+
+def run_once(script: str) -> Dict[str, float]:
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "ap-northeast-2")
+    env.setdefault("OPENAI_API_KEY", "sk-cold-start-benchmark")
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(script: str, repeat: int) -> Dict[str, float]:
+    runs: List[Dict[str, float]] = [run_once(script) for _ in range(repeat)]
+    summary: Dict[str, float] = {}
+    for key in ("import_ms", "ready_ms"):
+        values = [run[key] for run in runs]
+        summary[f"{key}_median"] = round(statistics.median(values), 1)
+        summary[f"{key}_max"] = round(max(values), 1)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold start time of the API and the summary Lambda")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-api-ms", type=float, default=None, help="api ready_ms 중앙값 상한")
+    parser.add_argument("--max-lambda-ms", type=float, default=None, help="lambda ready_ms 중앙값 상한")
+    parser.add_argument("--output", type=Path, default=None, help="결과 JSON 저장 경로")
+    args = parser.parse_args(argv)
+
+    results = {name: measure(script, args.repeat) for name, script in ENTRY_POINTS.items()}
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n")
+
+    thresholds = {"api": args.max_api_ms, "lambda": args.max_lambda_ms}
+    failed = False
+    for name, limit in thresholds.items():
+        if limit is not None and results[name]["ready_ms_median"] > limit:
+            print(f"{name} cold start {results[name]['ready_ms_median']}ms exceeds {limit}ms", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+/history 응답 직렬화 마이크로 벤치마크
+
+기존 경로(Message 검증 → MessageResponse 검증 → response_model 재검증 후 JSON)와
+fast path(DynamoDB 아이템 → model_construct → orjson)를 같은 아이템으로 비교합니다.
+
+    python -m benchmarks.history_serialization --limit 100 --number 2000
+"""
+import argparse
+import json
+import time
+import timeit
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from app.api.responses import ORJSONResponse
+from app.models.entity import Message
+from app.models.response import ChatHistoryResponse, MessageResponse
+from app.services.chat_service import build_history_response
+
+
+def make_items(limit: int) -> List[Dict[str, Any]]:
+    # boto3 resource 가 반환하는 형태 그대로 (숫자는 Decimal)
+    now = int(time.time())
+    return [
+        {
+            'user_id': 'bench-user',
+            'sort_key': f"session#{(now - i) * 1000:013d}-0000-ab12",
+            'session_id': 'session',
+            'created_at': Decimal(now - i),
+            'sender_type': 'human' if i % 2 else 'ai',
+            'content': f"message {i} " * 20,
+            'token_count': Decimal(40),
+        }
+        for i in range(limit)
+    ]
+
+
+def validated_path(items: List[Dict[str, Any]], cursor: Optional[str]) -> bytes:
+    messages = [Message(**item) for item in items]
+    response = ChatHistoryResponse(
+        messages=[
+            MessageResponse(
+                content=message.content,
+                type=message.sender_type,
+                timestamp=time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(message.created_at)) + 'Z',
+            )
+            for message in messages
+        ],
+        cursor=cursor,
+    )
+    # FastAPI 가 response_model 로 다시 검증한 뒤 JSON 으로 인코딩하는 과정
+    validated = ChatHistoryResponse.model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def fast_path(items: List[Dict[str, Any]], cursor: Optional[str]) -> bytes:
+    return ORJSONResponse(build_history_response(items, cursor)).body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare /history serialization paths")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    items = make_items(args.limit)
+    assert json.loads(validated_path(items, "cursor")) == json.loads(fast_path(items, "cursor"))
+
+    results = {}
+    for name, path in (("validated", validated_path), ("fast", fast_path)):
+        seconds = min(timeit.repeat(lambda: path(items, "cursor"), number=args.number, repeat=3))
+        results[name] = {"us_per_response": round(seconds / args.number * 1e6, 1)}
+    results["speedup"] = round(results["validated"]["us_per_response"] / results["fast"]["us_per_response"], 1)
+    print(json.dumps({"limit": args.limit, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+End-to-end 부하/지연 시간 벤치마크
+
+FastAPI 앱(lifespan 포함)을 로컬 DynamoDB 대체물(moto 또는 DynamoDB Local) 과
+지연 시간/토큰 사용량을 설정할 수 있는 결정적 가짜 채팅 모델 위에서 실행하고,
+/send_message 와 /history 를 지정한 동시성으로 호출합니다.
+
+단계(phase) 별로 처리량, p50/p95/p99 지연 시간, 요청 당 DynamoDB 호출 수,
+이벤트 루프 블로킹 시간을 측정하여 커밋별 JSON 으로 저장하고, 이전 결과와 비교할 수 있습니다.
+
+    python -m benchmarks.load --requests 200 --concurrency 16 --llm-latency-ms 50
+    python -m benchmarks.load --compare benchmarks/results/<이전 커밋>.json --max-regression-pct 20
+
+DynamoDB Local 을 사용하려면 AWS_ENDPOINT_URL_DYNAMODB=http://localhost:8000 을 설정하고 --backend local 로 실행합니다.
+moto 는 같은 프로세스에서 GIL 을 나누어 쓰므로 이벤트 루프 블로킹 시간이 실제보다 크게 나옵니다.
+절대값보다는 같은 backend 로 측정한 커밋 간 비교에 사용하세요.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# 비교 시 회귀로 보는 지표와 방향 (True: 클수록 좋음)
+COMPARED_METRICS = {
+    "throughput_rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "dynamodb_calls_per_request": False,
+    "loop_blocked_ms_per_request": False,
+}
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """app 모듈을 import 하기 전에 호출 (Settings 는 import 시점에 환경 변수를 읽음)"""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-2")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-load-benchmark")
+    os.environ["LLM_WARMUP_ON_STARTUP"] = "true"
+    for assignment in args.setting:
+        name, _, value = assignment.partition("=")
+        os.environ[name] = value
+
+
+def create_tables() -> None:
+    """Settings 의 테이블 이름으로 앱이 사용하는 테이블 생성 (이미 있으면 건너뜀)"""
+    import boto3  # 외부 라이브러리
+    from app.core.config import settings  # 내부 모듈
+
+    key_schemas = {
+        settings.DYNAMODB_SESSION_METADATA_TABLE: ("user_id", "session_id"),
+        settings.DYNAMODB_MESSAGE_TABLE: ("user_id", "sort_key"),
+        settings.DYNAMODB_ACTIVE_SESSION_TABLE: ("user_id", None),
+        settings.DYNAMODB_LANGCHAIN_TABLE: ("session_id", None),
+        settings.DYNAMODB_RESPONSE_CACHE_TABLE: ("cache_key", None),
+        settings.DYNAMODB_USER_TOKEN_USAGE_TABLE: ("user_id", "window"),
+        settings.DYNAMODB_IDEMPOTENCY_TABLE: ("idempotency_key", None),
+        settings.DYNAMODB_CONTEXT_SNAPSHOT_TABLE: ("user_id", None),
+    }
+    client = boto3.client("dynamodb", region_name=settings.AWS_REGION)
+    existing = set(client.list_tables()["TableNames"])
+    for table_name, (hash_key, range_key) in key_schemas.items():
+        if table_name in existing:
+            continue
+        keys = [(hash_key, "HASH")] + ([(range_key, "RANGE")] if range_key else [])
+        client.create_table(
+            TableName=table_name,
+            KeySchema=[{"AttributeName": name, "KeyType": key_type} for name, key_type in keys],
+            AttributeDefinitions=[{"AttributeName": name, "AttributeType": "S"} for name, _ in keys],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+def build_fake_chat_model(latency_ms: float, output_tokens: int):
+    """
+    ChatOpenAI 대신 사용할 결정적 채팅 모델.
+    latency_ms 만큼 (비동기로) 기다린 뒤 질문을 되돌려주는 답변과 usage_metadata 를 반환합니다.
+    """
+    from langchain_core.language_models.chat_models import BaseChatModel  # 외부 라이브러리
+    from langchain_core.messages import AIMessage, AIMessageChunk  # 외부 라이브러리
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult  # 외부 라이브러리
+
+    def reply_words(messages) -> List[str]:
+        question = str(messages[-1].content) if messages else ""
+        return [f"echo:{question[:32]}"] + ["token"] * max(output_tokens - 1, 0)
+
+    def usage(messages) -> Dict[str, int]:
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    class FakeChatModel(BaseChatModel):
+        @property
+        def _llm_type(self) -> str:
+            return "fake-benchmark"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(latency_ms / 1000)
+            message = AIMessage(content=" ".join(reply_words(messages)), usage_metadata=usage(messages))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            await asyncio.sleep(latency_ms / 1000)
+            message = AIMessage(content=" ".join(reply_words(messages)), usage_metadata=usage(messages))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            words = reply_words(messages)
+            for word in words:
+                await asyncio.sleep(latency_ms / 1000 / len(words))
+                yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage(messages)))
+
+    return FakeChatModel()
+
+
+class DynamoDBCallCounter:
+    """boto3 기본 세션의 모든 DynamoDB API 호출 수를 작업별로 집계 (재시도는 한 번으로 셈)"""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+
+    def install(self) -> None:
+        import boto3  # 외부 라이브러리
+
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+        boto3.DEFAULT_SESSION.events.register("before-call.dynamodb", self._count)
+
+    def _count(self, model, **kwargs) -> None:
+        self.calls[model.name] += 1
+
+    def snapshot(self) -> Counter:
+        return Counter(self.calls)
+
+
+class LoopLagMonitor:
+    """
+    짧은 주기로 sleep 하여, 예정보다 늦게 깨어난 시간을 이벤트 루프가 블로킹된 시간으로 집계
+    """
+
+    def __init__(self, interval_s: float = 0.005, threshold_s: float = 0.001):
+        self.interval_s = interval_s
+        self.threshold_s = threshold_s
+        self.blocked_s = 0.0
+        self.max_lag_s = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.blocked_s = 0.0
+        self.max_lag_s = 0.0
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(self.interval_s)
+            lag = loop.time() - started_at - self.interval_s
+            if lag > self.threshold_s:
+                self.blocked_s += lag
+                self.max_lag_s = max(self.max_lag_s, lag)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def run_phase(name: str, total: int, concurrency: int, make_request: Callable[[int], Awaitable[int]],
+                    counter: DynamoDBCallCounter, monitor: LoopLagMonitor,
+                    after: Optional[Callable[[], Awaitable[None]]] = None) -> Dict[str, Any]:
+    """total 개의 요청을 concurrency 개의 worker 로 나누어 보내고 지표 계산"""
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    next_index = iter(range(total))
+
+    async def worker() -> None:
+        for index in next_index:
+            started_at = time.perf_counter()
+            try:
+                status_code = await make_request(index)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started_at)
+            if status_code >= 400:
+                errors[str(status_code)] += 1
+
+    calls_before = counter.snapshot()
+    monitor.start()
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    if after is not None:
+        # write-behind 처럼 요청 이후에 일어나는 DynamoDB 호출까지 이 단계에 포함
+        await after()
+    await monitor.stop()
+    calls = counter.snapshot() - calls_before
+
+    latencies.sort()
+    completed = len(latencies)
+    return {
+        "phase": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": dict(errors),
+        "throughput_rps": round(completed / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "dynamodb_calls_per_request": round(sum(calls.values()) / total, 2) if total else 0.0,
+        "dynamodb_calls": dict(sorted(calls.items())),
+        "loop_blocked_ms": round(monitor.blocked_s * 1000, 1),
+        "loop_blocked_ms_per_request": round(monitor.blocked_s * 1000 / total, 3) if total else 0.0,
+        "loop_max_lag_ms": round(monitor.max_lag_s * 1000, 1),
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx  # 외부 라이브러리
+    import app.services.chat_service as chat_service  # 내부 모듈
+    from app.main import app, lifespan  # 내부 모듈
+
+    # 체인을 만들기 전에 모델을 바꿔야 lifespan 의 warm-up 에서 가짜 모델로 체인이 생성됨
+    fake_model = build_fake_chat_model(args.llm_latency_ms, args.output_tokens)
+    chat_service.build_chat_model = lambda: fake_model
+    chat_service.get_chain.cache_clear()
+    chat_service.get_chain_with_history.cache_clear()
+
+    counter = DynamoDBCallCounter()
+    counter.install()
+    monitor = LoopLagMonitor()
+    users = [f"bench-user-{i}" for i in range(args.users)]
+
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            chat_repo = app.state.chat_repo
+
+            async def flush_writes() -> None:
+                if chat_repo.message_writer:
+                    await chat_repo.message_writer.flush()
+
+            async def send_message(index: int) -> int:
+                response = await client.post("/api/v1/send_message", json={
+                    "user_id": users[index % len(users)], "content": f"benchmark question {index}",
+                }, timeout=None)
+                return response.status_code
+
+            async def send_message_stream(index: int) -> int:
+                async with client.stream("POST", "/api/v1/send_message/stream", json={
+                    "user_id": users[index % len(users)], "content": f"benchmark stream question {index}",
+                }, timeout=None) as response:
+                    async for _ in response.aiter_bytes():
+                        pass
+                    return response.status_code
+
+            async def history(index: int) -> int:
+                response = await client.get(
+                    f"/api/v1/history/{users[index % len(users)]}", params={"limit": args.history_limit},
+                    timeout=None,
+                )
+                return response.status_code
+
+            phases = {"send_message": send_message, "send_message_stream": send_message_stream, "history": history}
+            if args.warmup:
+                for make_request in phases.values():
+                    await asyncio.gather(*(make_request(index) for index in range(args.warmup)))
+                await flush_writes()
+
+            return [
+                await run_phase(name, args.requests, args.concurrency, phases[name], counter, monitor,
+                                after=flush_writes)
+                for name in args.phases
+            ]
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{revision}-dirty" if dirty else revision
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], max_regression_pct: Optional[float]) -> bool:
+    """기준 결과 대비 변화율 출력. max_regression_pct 를 넘는 회귀가 있으면 False"""
+    baseline_phases = {phase["phase"]: phase for phase in baseline["phases"]}
+    ok = True
+    print(f"\ncompared with {baseline['revision']}:")
+    for phase in results["phases"]:
+        base = baseline_phases.get(phase["phase"])
+        if base is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = base.get(metric), phase.get(metric)
+            if not before or after is None:
+                continue
+            change_pct = (after - before) / before * 100
+            regression_pct = -change_pct if higher_is_better else change_pct
+            regressed = max_regression_pct is not None and regression_pct > max_regression_pct
+            ok = ok and not regressed
+            print(f"  {phase['phase']:>20} {metric:<28} {before:>10} -> {after:<10} "
+                  f"({change_pct:+.1f}%){'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load/latency benchmark for /send_message and /history")
+    parser.add_argument("--backend", choices=("moto", "local"), default="moto",
+                        help="moto: 프로세스 내 mock, local: AWS_ENDPOINT_URL_DYNAMODB 의 DynamoDB Local")
+    parser.add_argument("--phases", nargs="+", default=["send_message", "send_message_stream", "history"],
+                        choices=("send_message", "send_message_stream", "history"))
+    parser.add_argument("--requests", type=int, default=200, help="단계별 요청 수")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5, help="측정 전 단계별로 보내는 요청 수")
+    parser.add_argument("--history-limit", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--output-tokens", type=int, default=20)
+    parser.add_argument("--setting", action="append", default=[], metavar="NAME=VALUE",
+                        help="Settings 환경 변수 덮어쓰기 (예: MESSAGE_WRITE_BEHIND_ENABLED=false)")
+    parser.add_argument("--results-dir", type=Path, default=RESULTS_DIR, help="커밋별 결과 JSON 저장 위치")
+    parser.add_argument("--compare", type=Path, default=None, help="비교할 이전 결과 JSON")
+    parser.add_argument("--max-regression-pct", type=float, default=None,
+                        help="--compare 대비 이 비율(%%) 이상 나빠진 지표가 있으면 실패")
+    args = parser.parse_args(argv)
+
+    configure_environment(args)
+    sys.path.insert(0, str(ROOT))
+    with ExitStack() as stack:
+        if args.backend == "moto":
+            try:
+                from moto import mock_aws  # 벤치마크 전용 의존성
+            except ImportError:
+                print("moto is required for --backend moto (pip install moto)", file=sys.stderr)
+                return 2
+            stack.enter_context(mock_aws())
+        create_tables()
+        phases = asyncio.run(run_benchmark(args))
+
+    revision = git_revision()
+    results = {
+        "revision": revision,
+        "timestamp": int(time.time()),
+        "backend": args.backend,
+        "python": sys.version.split()[0],
+        "parameters": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "llm_latency_ms": args.llm_latency_ms,
+            "output_tokens": args.output_tokens,
+            "settings": args.setting,
+        },
+        "phases": phases,
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    args.results_dir.mkdir(parents=True, exist_ok=True)
+    output_path = args.results_dir / f"{revision}.json"
+    output_path.write_text(output + "\n")
+    print(f"results saved to {output_path}", file=sys.stderr)
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if not compare(results, baseline, args.max_regression_pct):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())